@@ -0,0 +1,124 @@
+# amortization.py
+
+from datetime import date
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+
+# Inputs may be scalars or arrays (one element per loan) unless noted; they broadcast.
+# Rates are annual percentages and payments are monthly, the first one month after the start date.
+
+
+def monthly_rate(annual_rate):
+    return np.asarray(annual_rate, dtype=np.float64) / 12 / 100
+
+
+def emi(principal, annual_rate, tenure_months):
+    """Equated monthly instalment. Interest-free loans are repaid in equal parts."""
+    principal = np.asarray(principal, dtype=np.float64)
+    r = monthly_rate(annual_rate)
+    n = np.asarray(tenure_months, dtype=np.float64)
+    growth = (1 + r) ** n
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(r > 0, principal * r * growth / (growth - 1), principal / n)
+
+
+def payments_made(start_date, tenure_months, on_date=None):
+    """Instalments paid by `on_date` (default today): whole calendar months since the start, capped at the tenure."""
+    on_date = on_date or date.today()
+    start_dates = np.atleast_1d(np.asarray(start_date, dtype='datetime64[M]'))
+    months = (np.datetime64(on_date, 'M') - start_dates).astype(np.int64)
+    months = np.clip(months, 0, tenure_months)
+    return months if np.ndim(start_date) else months[0]
+
+
+def balance_after(principal, annual_rate, tenure_months, payments):
+    """Outstanding principal after `payments` instalments."""
+    principal = np.asarray(principal, dtype=np.float64)
+    r = monthly_rate(annual_rate)
+    n = np.asarray(tenure_months, dtype=np.float64)
+    k = np.clip(payments, 0, n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        balance = np.where(r > 0, principal * ((1 + r) ** n - (1 + r) ** k) / ((1 + r) ** n - 1),
+                           principal * (1 - k / n))
+    return np.maximum(balance, 0.0)
+
+
+def interest_paid(principal, annual_rate, tenure_months, payments):
+    """Total interest in the first `payments` instalments."""
+    k = np.clip(payments, 0, tenure_months)
+    principal = np.asarray(principal, dtype=np.float64)
+    return np.maximum(k * emi(principal, annual_rate, tenure_months)
+                      - (principal - balance_after(principal, annual_rate, tenure_months, k)), 0.0)
+
+
+def balance_at(principal, annual_rate, tenure_months, start_date, on_date=None):
+    """Outstanding principal on a date (default today)."""
+    return balance_after(principal, annual_rate, tenure_months, payments_made(start_date, tenure_months, on_date))
+
+
+def schedules(principal, annual_rate, tenure_months):
+    """
+    Full amortization schedules for many loans at once, as (loans x months)
+    arrays padded to the longest tenure: payment, interest, principal and the
+    balance after each instalment. Months past a loan's tenure are zero.
+    """
+    principal = np.atleast_1d(np.asarray(principal, dtype=np.float64))
+    annual_rate = np.broadcast_to(annual_rate, principal.shape)
+    tenure_months = np.broadcast_to(np.asarray(tenure_months, dtype=np.int64), principal.shape)
+    k = np.arange(1, tenure_months.max() + 1)
+    active = k[None, :] <= tenure_months[:, None]
+
+    balance = balance_after(principal[:, None], annual_rate[:, None], tenure_months[:, None], k[None, :])
+    previous = np.concatenate([principal[:, None], balance[:, :-1]], axis=1)
+    interest = np.where(active, previous * monthly_rate(annual_rate)[:, None], 0.0)
+    principal_paid = np.where(active, previous - balance, 0.0)
+    return {'month': k, 'payment': interest + principal_paid, 'interest': interest,
+            'principal': principal_paid, 'balance': np.where(active, balance, 0.0)}
+
+
+def simulate(principal, annual_rate, tenure_months, prepayments=None, rate_changes=None, reduce='tenure'):
+    """
+    Month-by-month schedule of one loan with prepayments ({month: amount}, paid
+    after that month's instalment) and rate changes ({month: annual rate}, from
+    that month's instalment on). With reduce='tenure' the instalment stays the
+    same and the loan ends sooner; with reduce='emi' the instalment is
+    recomputed over the remaining months after each change.
+    """
+    prepayments = prepayments or {}
+    rate_changes = rate_changes or {}
+    balance = float(principal)
+    rate = float(annual_rate)
+    instalment = float(emi(balance, rate, tenure_months))
+    rows = []
+
+    # Stops once repaid; a rate rise with a fixed instalment can stretch the loan past its tenure
+    month = 0
+    while balance > 0.005 and month < tenure_months * 3:
+        month += 1
+        if month in rate_changes:
+            rate = float(rate_changes[month])
+            if reduce == 'emi':
+                instalment = float(emi(balance, rate, max(tenure_months - month + 1, 1)))
+        interest = balance * float(monthly_rate(rate))
+        payment = min(instalment, balance + interest)
+        balance = balance + interest - payment
+        extra = min(float(prepayments.get(month, 0.0)), balance)
+        balance -= extra
+        if extra and reduce == 'emi' and month < tenure_months:
+            instalment = float(emi(balance, rate, tenure_months - month))
+        rows.append((month, payment, interest, payment - interest, extra, balance))
+
+    columns = np.array(rows, dtype=np.float64).reshape(-1, 6).T
+    result = dict(zip(('month', 'payment', 'interest', 'principal', 'prepayment', 'balance'), columns))
+    result['month'] = result['month'].astype(np.int64)
+    return result
+
+
+def payment_dates(start_date, months):
+    return [start_date + relativedelta(months=int(m)) for m in months]
+
+
+def schedule_summary(schedule):
+    return {'months': int(len(schedule['month'])), 'total_interest': float(schedule['interest'].sum()),
+            'total_paid': float(schedule['payment'].sum() + schedule.get('prepayment', np.zeros(1)).sum())}
@@ -0,0 +1,105 @@
+# anomaly.py
+
+import json
+
+import numpy as np
+
+from models import db, AnomalyStats, Transaction, BusinessTransaction
+
+WINDOW_SIZE = 200       # most recent expense amounts kept per stats row
+MIN_HISTORY = 20        # same minimum the old IsolationForest checks used
+ANOMALY_THRESHOLD = 3.5 # modified z-score above which spending is flagged
+ALL_CATEGORIES = 0
+
+LEDGER_MODELS = {'personal': Transaction, 'business': BusinessTransaction}
+
+
+def robust_stats(amounts):
+    """Median and median absolute deviation of a window of amounts."""
+    values = np.asarray(amounts, dtype=np.float64)
+    if not len(values):
+        return 0.0, 0.0
+    median = float(np.median(values))
+    return median, float(np.median(np.abs(values - median)))
+
+
+def robust_score(amount, median, mad):
+    """
+    Modified z-score (Iglewicz & Hoaglin). When more than half the window is the
+    same amount MAD is zero, so fall back to a scale of 1% of the median (or 1).
+    """
+    scale = mad / 0.6745 if mad > 0 else max(abs(median) * 0.01, 1.0)
+    return (amount - median) / scale
+
+
+def is_anomalous(score):
+    return score is not None and score > ANOMALY_THRESHOLD
+
+
+def _stats_row(user_id, ledger, category_id, exclude_id):
+    stats = AnomalyStats.query.filter_by(user_id=user_id, ledger=ledger, category_id=category_id).first()
+    if stats:
+        return stats
+    # First time we see this user/category: seed the window from their recent history in one query
+    model = LEDGER_MODELS[ledger]
+    query = db.session.query(model.amount).filter(model.user_id == user_id, model.type == 'expense', model.id != exclude_id)
+    if category_id != ALL_CATEGORIES:
+        query = query.filter(model.category_id == category_id)
+    amounts = [a for a, in query.order_by(model.date.desc(), model.id.desc()).limit(WINDOW_SIZE)][::-1]
+    median, mad = robust_stats(amounts)
+    stats = AnomalyStats(user_id=user_id, ledger=ledger, category_id=category_id, sample_count=len(amounts),
+                         median=median, mad=mad, window=json.dumps(amounts))
+    db.session.add(stats)
+    return stats
+
+
+def _absorb(stats, amount):
+    window = json.loads(stats.window)
+    window.append(amount)
+    window = window[-WINDOW_SIZE:]
+    stats.median, stats.mad = robust_stats(window)
+    stats.window = json.dumps(window)
+    stats.sample_count += 1
+
+
+def score_transaction(transaction, ledger):
+    """
+    Scores a newly saved expense against the user's stored statistics for its
+    category (or all their expenses, while the category is still too sparse),
+    stores the score on the row and folds the amount into the statistics.
+    Returns the score, or None for income or when there isn't enough history.
+    The caller commits.
+    """
+    if transaction.type != 'expense':
+        return None
+
+    category_stats = _stats_row(transaction.user_id, ledger, int(transaction.category_id), transaction.id)
+    overall_stats = _stats_row(transaction.user_id, ledger, ALL_CATEGORIES, transaction.id)
+
+    score = None
+    for stats in (category_stats, overall_stats):
+        if stats.sample_count >= MIN_HISTORY:
+            score = robust_score(transaction.amount, stats.median, stats.mad)
+            break
+
+    _absorb(category_stats, transaction.amount)
+    _absorb(overall_stats, transaction.amount)
+    transaction.anomaly_score = score
+    return score
+
+
+def reset_stats(user_id=None, ledger=None, category_ids=None):
+    """
+    Drops stored statistics so they are re-seeded from history on next use (after
+    edits/deletes). With `category_ids`, only those categories' rows and the
+    all-categories row (which every expense feeds) are dropped. The caller commits,
+    so the reset lands in the same transaction as the edit.
+    """
+    query = AnomalyStats.query
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+    if ledger is not None:
+        query = query.filter_by(ledger=ledger)
+    if category_ids is not None:
+        query = query.filter(AnomalyStats.category_id.in_({int(c) for c in category_ids if c is not None} | {ALL_CATEGORIES}))
+    return query.delete(synchronize_session=False)
@@ -1,6 +1,6 @@
 # app.py
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from models import db, User, Transaction, FixedScheme, Salary, Investment, SoldInvestment, Loan
@@ -9,48 +9,62 @@ import json
 from flask_migrate import Migrate
 from dateutil.relativedelta import relativedelta
 from dateutil import parser as dateparser # ADDED THIS LINE
-import yfinance as yf
-from pycoingecko import CoinGeckoAPI
 import os
 import cloudinary
 import cloudinary.uploader
 from dotenv import load_dotenv
 from flask_wtf.csrf import CSRFProtect
-import pandas as pd
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.naive_bayes import MultinomialNB
-from sklearn.pipeline import make_pipeline
-from sklearn.ensemble import IsolationForest
-from prophet import Prophet
-import joblib
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.ensemble import IsolationForest
 from models import BusinessTransaction
 from models import BusinessClient
 from models import BusinessInvestment
 from models import BusinessLoan
-from models import BusinessMetrics
 from models import Category
 from models import Budget
-from fpdf import FPDF
+from models import InsightNarrative
+from models import ReportArtifact
 from flask import Response
 from sqlalchemy import func
-import io
-import csv
 import uuid
 from werkzeug.utils import secure_filename
 from flask import send_from_directory
+from flask import send_file
 import re
 import easyocr
 import json
 from transformers import AutoModelForCausalLM, AutoProcessor, pipeline
 from PIL import Image
 import requests
-from huggingface_hub import InferenceClient
 from huggingface_hub.inference._generated.types import TextGenerationOutput
 from huggingface_hub.utils import HfHubHTTPError
 import traceback
+import queue
+from price_stream import PriceStreamHub
+from market_data import provider_from_config, USD_INR_SYMBOL, DEFAULT_USD_TO_INR_RATE
+from valuation import load_holdings, value_portfolio, fifo_sale
+from gains_ledger import record_gain, gains_for_year, ledger_years, rebuild_ledger, current_financial_year, fy_label
+import click
+from model_store import ModelStore, OnlineModels
+from category_model import OnlineCategoryClassifier, GLOBAL_MIN_USERS, PERSONAL_MIN_SAMPLES, suggest_category
+from category_training import CATEGORY_SOURCES, USER_MIN_ROWS, train_user_model, train_global_model, users_below
+from job_scheduler import DebouncedJobScheduler
+import time
+from snapshots import compute_net_worth, latest_snapshot, snapshot_history, snapshot_all_users
+from anomaly import score_transaction, is_anomalous, reset_stats
+from functools import partial
+from insights import personal_insights
+from insight_narrative import month_payload, request_narrative, generate_narrative
+from report_artifacts import (request_report, render_artifact, artifact_path, download_name, validate_report,
+                              month_end_statements, MIMETYPES, REPORT_LEDGERS, REPORT_TYPES)
+from tax_engine import (calculate_new_regime_tax, calculate_old_regime_tax, capital_gains_tax, compare_regimes,
+                        break_even_deductions, table_year, valid_fy, MAX_SCENARIOS, MAX_AMOUNT)
+import amortization
+from depreciation import depreciation_schedule
+from scheme_valuation import scheme_rows, load_scheme_rows, value_schemes, interest_for_fy
+from parquet_export import export_all, EXPORTS as PARQUET_EXPORTS, ROW_GROUP_SIZE as PARQUET_ROW_GROUP_SIZE
+from business_metrics import current_metrics, repair_metrics
+from ledger_version import current_version as current_ledger_version
+from forecasting import FORECAST_KINDS, refresh_forecast, stored_forecast, inline_forecast, batch_refresh_forecasts
 # NEW: Advanced Document AI Libraries
 from transformers import DonutProcessor, VisionEncoderDecoderModel
 import torch
@@ -77,6 +91,29 @@ app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif'}
+app.config['PRICE_STREAM_INTERVAL'] = int(os.getenv('PRICE_STREAM_INTERVAL', 60))
+app.config['MODEL_STORE_DIR'] = os.getenv('MODEL_STORE_DIR', 'model_store')
+app.config['MODEL_CACHE_MAX_MB'] = float(os.getenv('MODEL_CACHE_MAX_MB', 64))
+# Retraining runs off the request path: triggers are coalesced for this long, with at most N jobs at once
+app.config['BACKGROUND_JOB_DEBOUNCE_SECONDS'] = float(os.getenv('BACKGROUND_JOB_DEBOUNCE_SECONDS', 30))
+app.config['BACKGROUND_JOB_WORKERS'] = int(os.getenv('BACKGROUND_JOB_WORKERS', 2))
+app.config['CATEGORY_MODEL_COMPACT_EVERY'] = int(os.getenv('CATEGORY_MODEL_COMPACT_EVERY', 50))
+app.config['FORECAST_BATCH_WORKERS'] = int(os.getenv('FORECAST_BATCH_WORKERS', os.cpu_count() or 2))
+# Forecast model choice: requests compute within the inline budget; Prophet only runs where the background budget allows
+app.config['FORECAST_INLINE_BUDGET_MS'] = float(os.getenv('FORECAST_INLINE_BUDGET_MS', 10))
+app.config['FORECAST_BACKGROUND_BUDGET_MS'] = float(os.getenv('FORECAST_BACKGROUND_BUDGET_MS', 5000))
+# Business insight narratives: a text-generation endpoint URL (e.g. scripts/stub_inference_server.py), else the hosted model
+app.config['INSIGHT_LLM_ENDPOINT'] = os.getenv('INSIGHT_LLM_ENDPOINT', '')
+app.config['INSIGHT_LLM_MODEL'] = os.getenv('INSIGHT_LLM_MODEL', 'mistralai/Mistral-7B-Instruct-v0.2')
+app.config['INSIGHT_LLM_TIMEOUT'] = float(os.getenv('INSIGHT_LLM_TIMEOUT', 60))
+app.config['REPORT_ARTIFACT_DIR'] = os.getenv('REPORT_ARTIFACT_DIR', 'report_artifacts')
+app.config['STATEMENT_BATCH_WORKERS'] = int(os.getenv('STATEMENT_BATCH_WORKERS', os.cpu_count() or 2))
+# Market data source: 'live', 'record' (live + write fixture), 'replay' (fixture only) or 'synthetic'
+app.config['MARKET_DATA_PROVIDER'] = os.getenv('MARKET_DATA_PROVIDER', 'live')
+app.config['MARKET_DATA_FIXTURE'] = os.getenv('MARKET_DATA_FIXTURE', 'market_data_fixture.json')
+app.config['MARKET_DATA_REPLAY_LATENCY'] = os.getenv('MARKET_DATA_REPLAY_LATENCY', '').lower() in ('1', 'true', 'yes')
+app.config['MARKET_DATA_SEED'] = int(os.getenv('MARKET_DATA_SEED', 0))
+app.config['MARKET_DATA_LATENCY_MS'] = float(os.getenv('MARKET_DATA_LATENCY_MS', 0))
 
 # --- CONFIGURE CLOUDINARY USING ENVIRONMENT VARIABLES ---
 cloudinary.config(
@@ -107,6 +144,12 @@ classifier = pipeline("zero-shot-classification", model="facebook/bart-large-mnl
 print("Text Classification model initialized.")
 
 
+model_store = ModelStore(app.config['MODEL_STORE_DIR'], cache_max_bytes=int(app.config['MODEL_CACHE_MAX_MB'] * 1024 * 1024))
+# Online updates to per-user category models stay in memory until a background flush saves them
+online_category_models = OnlineModels(model_store)
+background_jobs = DebouncedJobScheduler(app, max_workers=app.config['BACKGROUND_JOB_WORKERS'], debounce_seconds=app.config['BACKGROUND_JOB_DEBOUNCE_SECONDS'])
+
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
@@ -123,44 +166,11 @@ def load_user(user_id):
     return db.session.get(User, int(user_id))
 
 # --- Tax Helper Functions ---
-def calculate_new_regime_tax(gross_income):
-    standard_deduction = 50000
-    taxable_income = gross_income - standard_deduction
-    if taxable_income < 0: taxable_income = 0
-    tax = 0
-    if taxable_income <= 300000: tax = 0
-    elif taxable_income <= 600000: tax = (taxable_income - 300000) * 0.05
-    elif taxable_income <= 900000: tax = 15000 + (taxable_income - 600000) * 0.10
-    elif taxable_income <= 1200000: tax = 45000 + (taxable_income - 900000) * 0.15
-    elif taxable_income <= 1500000: tax = 90000 + (taxable_income - 1200000) * 0.20
-    else: tax = 150000 + (taxable_income - 1500000) * 0.30
-    cess = tax * 0.04
-    total_tax = tax + cess
-    return {'regime': 'New', 'gross_income': gross_income, 'taxable_income': taxable_income, 'total_deductions': 0, 'standard_deduction': standard_deduction, 'income_tax': tax, 'cess': cess, 'total_tax': total_tax}
-
-def calculate_old_regime_tax(gross_income, total_deductions, age):
-    standard_deduction = 50000
-    taxable_income = gross_income - total_deductions - standard_deduction
-    if taxable_income < 0: taxable_income = 0
-    tax = 0
-    if age < 60:
-        if taxable_income <= 250000: tax = 0
-        elif taxable_income <= 500000: tax = (taxable_income - 250000) * 0.05
-        elif taxable_income <= 1000000: tax = 12500 + (taxable_income - 500000) * 0.20
-        else: tax = 112500 + (taxable_income - 1000000) * 0.30
-    elif age < 80:
-        if taxable_income <= 300000: tax = 0
-        elif taxable_income <= 500000: tax = (taxable_income - 300000) * 0.05
-        elif taxable_income <= 1000000: tax = 10000 + (taxable_income - 500000) * 0.20
-        else: tax = 110000 + (taxable_income - 1000000) * 0.30
-    else:
-        if taxable_income <= 500000: tax = 0
-        elif taxable_income <= 1000000: tax = (taxable_income - 500000) * 0.20
-        else: tax = 100000 + (taxable_income - 1000000) * 0.30
-    if taxable_income <= 500000: tax = 0
-    cess = tax * 0.04
-    total_tax = tax + cess
-    return {'regime': 'Old', 'gross_income': gross_income, 'taxable_income': taxable_income, 'total_deductions': total_deductions, 'standard_deduction': standard_deduction, 'income_tax': tax, 'cess': cess, 'total_tax': total_tax}
+def user_age(user):
+    if not user.dob:
+        return 0
+    today = date.today()
+    return today.year - user.dob.year - ((today.month, today.day) < (user.dob.month, user.dob.day))
 
 reader = easyocr.Reader(['en'])
 
@@ -356,46 +366,19 @@ def business_insights():
             start_date = date(year, month, 1)
             end_date = start_date + relativedelta(months=1) - relativedelta(days=1)
 
-            transactions = BusinessTransaction.query.filter(
-                BusinessTransaction.user_id == current_user.id,
-                BusinessTransaction.date.between(start_date, end_date)
-            ).all()
-
-            if not transactions:
+            # Aggregate data for the AI
+            payload = month_payload(current_user.id, start_date, end_date)
+            if payload is None:
                 flash('No transactions found for the selected period.', 'info')
                 return redirect(url_for('business_insights'))
 
-            # Aggregate data for the AI
-            total_revenue = sum(t.amount for t in transactions if t.type == 'revenue')
-            total_expenses = sum(t.amount for t in transactions if t.type == 'expense')
-            net_profit = total_revenue - total_expenses
-            
-            expenses_by_category = {}
-            for t in transactions:
-                if t.type == 'expense':
-                    expenses_by_category[t.category.name] = expenses_by_category.get(t.category.name, 0) + t.amount
-            
-            # Find the top expense category
-            top_expense_category = max(expenses_by_category, key=expenses_by_category.get) if expenses_by_category else "N/A"
-
-            # --- AI Prompt Engineering ---
-            prompt = f"""
-            As a friendly financial analyst, analyze the following monthly data for a small business owner and provide a concise, easy-to-understand summary in bullet points. Focus on key takeaways.
+            # Served from cache when this month's figures were summarised before; otherwise written in the background
+            narrative = request_narrative(current_user.id, payload)
+            if narrative.status == 'pending':
+                background_jobs.mark_dirty('insight_narrative', narrative.id, delay=0)
 
-            DATA FOR {start_date.strftime('%B %Y')}:
-            - Total Revenue: {total_revenue:.2f}
-            - Total Expenses: {total_expenses:.2f}
-            - Net Profit/Loss: {net_profit:.2f}
-            - Total Number of Transactions: {len(transactions)}
-            - Top Expense Category: {top_expense_category} with an amount of {expenses_by_category.get(top_expense_category, 0):.2f}
-
-            Based on this data, generate a short summary.
-            """
-
-            client = InferenceClient()
-            response_text = client.text_generation(prompt, model="mistralai/Mistral-7B-Instruct-v0.2", max_new_tokens=250)
-            
-            return render_template('business/insights.html', insights=response_text, selected_month=month, selected_year=year)
+            return render_template('business/insights.html', insights=narrative.narrative, narrative=narrative,
+                                   selected_month=month, selected_year=year)
 
         except Exception as e:
             print(f"Error generating insights: {e}")
@@ -405,38 +388,27 @@ def business_insights():
     today = date.today()
     return render_template('business/insights.html', insights=None, selected_month=today.month, selected_year=today.year)
 
+@app.route('/business/insights/narrative/<int:narrative_id>')
+@login_required
+def business_insight_narrative(narrative_id):
+    """Polled by the insights page while a narrative is being generated."""
+    narrative = db.session.get(InsightNarrative, narrative_id)
+    if not narrative or narrative.user_id != current_user.id:
+        return jsonify({'status': 'missing'}), 404
+    if narrative.status == 'pending':
+        # Re-queue in case the worker that had it went away; coalesced if it's already scheduled
+        background_jobs.mark_dirty('insight_narrative', narrative.id, delay=0)
+    return jsonify({'status': narrative.status, 'narrative': narrative.narrative})
+
 def check_transaction_anomaly(new_transaction, user_id):
     """
-    Checks if a new transaction is an anomaly based on historical data.
+    Scores a newly saved business transaction against the user's stored
+    robust statistics and saves the score on the row.
     Returns True if it's an anomaly, False otherwise.
     """
-    # We only check expenses for anomalies for now
-    if new_transaction.type != 'expense':
-        return False
-
-    # Fetch historical expenses for the user
-    historical_expenses = BusinessTransaction.query.filter_by(
-        user_id=user_id, 
-        type='expense'
-    ).order_by(BusinessTransaction.date.desc()).limit(200).all()
-
-    # Need at least 20 historical data points to make a sensible model
-    if len(historical_expenses) < 20:
-        return False
-
-    # Prepare data for the model
-    df = pd.DataFrame([{'amount': t.amount} for t in historical_expenses])
-    
-    # Train the Isolation Forest model
-    # Contamination defines the expected proportion of anomalies (e.g., 5%)
-    model = IsolationForest(contamination=0.05, random_state=42)
-    model.fit(df[['amount']])
-    
-    # Predict if the new transaction is an anomaly (-1 for anomalies, 1 for inliers)
-    new_amount_df = pd.DataFrame([{'amount': new_transaction.amount}])
-    prediction = model.predict(new_amount_df[['amount']])
-    
-    return prediction[0] == -1
+    score = score_transaction(new_transaction, 'business')
+    db.session.commit()
+    return is_anomalous(score)
 # --- Routes ---
 # -------------------
 # Login Route
@@ -599,15 +571,16 @@ def dashboard():
             db.session.commit()
             flash(f"Auto-debited EMI of ₹{loan.emi_amount} for {loan.loan_name}.", "info")
 
-    # --- YOUR EXISTING ANOMALY DETECTION LOGIC (UNCHANGED) ---
-    all_expenses = Transaction.query.filter_by(user_id=current_user.id, type='expense').all()
-    if len(all_expenses) > 20:
-        df = pd.DataFrame([(t.amount, t.description) for t in all_expenses], columns=['amount', 'description'])
-        model = IsolationForest(contamination=0.05) 
-        df['anomaly'] = model.fit_predict(df[['amount']])
-        last_transaction = all_expenses[-1]
-        if df.iloc[-1]['anomaly'] == -1:
-             flash(f"Unusual spending detected: ₹{last_transaction.amount} for '{last_transaction.description}'. Please review.", "warning")
+    # Category models are built by background jobs; make sure users without one get it trained,
+    # unless the last attempt found too little data and nothing has been written since
+    if model_store.current_version(f'user_{current_user.id}/category') is None and \
+            category_training_skipped.get(('category', current_user.id)) != current_ledger_version(current_user.id, 'personal'):
+        background_jobs.mark_dirty('category', current_user.id)
+
+    # --- ANOMALY DETECTION (score stored on the row when the expense was added) ---
+    last_transaction = Transaction.query.filter_by(user_id=current_user.id, type='expense').order_by(Transaction.id.desc()).first()
+    if last_transaction and is_anomalous(last_transaction.anomaly_score):
+        flash(f"Unusual spending detected: ₹{last_transaction.amount} for '{last_transaction.description}'. Please review.", "warning")
 
     # --- YOUR EXISTING MONTHLY TOTALS LOGIC (UNCHANGED) ---
     monthly_transactions = Transaction.query.filter(
@@ -675,13 +648,13 @@ def business_dashboard():
     monthly_expenses = sum(t.amount for t in transactions_this_month if t.type == 'expense')
     net_profit = monthly_revenue - monthly_expenses
     
-    investments = BusinessInvestment.query.filter_by(user_id=current_user.id).all()
-    loans = BusinessLoan.query.filter_by(user_id=current_user.id).all()
-    
     summary_data = {
         'active_clients': BusinessClient.query.filter_by(user_id=current_user.id, status='Active').count(),
-        'total_investment_value': sum(inv.current_value for inv in investments),
-        'total_outstanding_loans': sum(loan.remaining_balance for loan in loans)
+        # Depreciated values summed in the database
+        'total_investment_value': db.session.query(func.coalesce(func.sum(BusinessInvestment.current_value), 0.0))
+                                    .filter(BusinessInvestment.user_id == current_user.id).scalar(),
+        'total_outstanding_loans': db.session.query(func.coalesce(func.sum(BusinessLoan.remaining_balance), 0.0))
+                                     .filter(BusinessLoan.user_id == current_user.id).scalar()
     }
 
     chart_data = {"labels": ["Revenue", "Expenses"], "values": [monthly_revenue, monthly_expenses]}
@@ -832,13 +805,7 @@ def business_transactions():
                 db.session.add(new_trans)
                 db.session.commit()
                 flash('Business transaction added successfully!', 'success')
-
-                # Retraining counter
-                session['new_business_transactions_count'] = session.get('new_business_transactions_count', 0) + 1
-                if session['new_business_transactions_count'] >= 20:
-                    if retrain_business_model(current_user.id):
-                        flash('AI model was automatically updated in the background with your new data.', 'info')
-                    session['new_business_transactions_count'] = 0
+                learn_transaction_category(current_user.id, 'business_category', desc, new_trans.category.name)
 
                 # Anomaly detection
                 if check_transaction_anomaly(new_trans, current_user.id):
@@ -883,32 +850,8 @@ def business_transactions():
 @app.route('/business/financials')
 @login_required
 def business_financials():
-    # This route now calculates and displays data, no manual entry.
-    today = date.today()
-    start_of_month = today.replace(day=1)
-
-    transactions_this_month = BusinessTransaction.query.filter(
-        BusinessTransaction.user_id == current_user.id,
-        BusinessTransaction.date >= start_of_month
-    ).all()
-
-    revenue = sum(t.amount for t in transactions_this_month if t.type == 'revenue')
-    expenses = sum(t.amount for t in transactions_this_month if t.type == 'expense')
-    net_profit = revenue - expenses
-    profit_margin = (net_profit / revenue) * 100 if revenue > 0 else 0
-    
-    # Update metrics for dashboard
-    metrics = BusinessMetrics.query.filter_by(user_id=current_user.id).first()
-    if not metrics:
-        metrics = BusinessMetrics(user_id=current_user.id)
-        db.session.add(metrics)
-    
-    metrics.monthly_revenue = revenue
-    metrics.monthly_expenses = expenses
-    metrics.net_profit = net_profit
-    metrics.profit_margin = profit_margin
-    db.session.commit()
-
+    # Totals are kept current by the business transaction write paths (see business_metrics.py)
+    metrics = current_metrics(current_user.id)
     return render_template('business/financials.html', metrics=metrics)
 
 @app.route('/business/investments', methods=['GET', 'POST'])
@@ -934,10 +877,19 @@ def business_investments():
             flash('Invalid data provided.', 'danger')
         return redirect(url_for('business_investments'))
 
-    investments = BusinessInvestment.query.filter_by(user_id=current_user.id).all()
+    investments = BusinessInvestment.query.filter_by(user_id=current_user.id) \
+        .order_by(BusinessInvestment.current_value.desc()).all()
     return render_template('business/investments.html', investments=investments, today=date.today().strftime('%Y-%m-%d'))
 
 
+@app.route('/api/business/investments/depreciation')
+@login_required
+def investment_depreciation():
+    """Book value of every business asset, month by month for `?months=` (default 60)."""
+    months = max(1, min(request.args.get('months', 60, type=int), 600))
+    return jsonify(depreciation_schedule(current_user.id, months))
+
+
 @app.route('/business/loans', methods=['GET', 'POST'])
 @login_required
 def business_loans():
@@ -952,9 +904,7 @@ def business_loans():
             if not name or principal <= 0 or rate <= 0 or tenure <= 0:
                 flash('All fields are required with positive numbers.', 'danger')
             else:
-                # Calculate EMI
-                r = (rate / 12) / 100
-                emi = (principal * r * (1 + r)**tenure) / (((1 + r)**tenure) - 1)
+                emi = float(amortization.emi(principal, rate, tenure))
                 new_loan = BusinessLoan(user_id=current_user.id, loan_name=name, principal_amount=principal, interest_rate=rate, tenure_months=tenure, start_date=s_date, emi=emi)
                 db.session.add(new_loan)
                 db.session.commit()
@@ -993,6 +943,7 @@ def edit_business_transaction(transaction_id):
         return redirect(url_for('business_transactions'))
     
     if request.method == 'POST':
+        previous_category_id = trans.category_id
         try:
             trans.description = request.form.get('description')
             trans.amount = float(request.form.get('amount'))
@@ -1002,7 +953,9 @@ def edit_business_transaction(transaction_id):
             if not trans.description or trans.amount <= 0:
                 flash('Valid description and positive amount are required.', 'danger')
             else:
+                reset_stats(current_user.id, 'business', {previous_category_id, trans.category_id})
                 db.session.commit()
+                background_jobs.mark_dirty('business_category', current_user.id)
                 flash('Transaction updated successfully!', 'success')
                 return redirect(url_for('business_transactions'))
         except (ValueError, TypeError):
@@ -1022,8 +975,10 @@ def delete_business_transaction(transaction_id):
             except OSError as e:
                 print(f"Error deleting file {trans.receipt_filename}: {e}")
 
+        reset_stats(current_user.id, 'business', {trans.category_id})
         db.session.delete(trans)
         db.session.commit()
+        background_jobs.mark_dirty('business_category', current_user.id)
         flash('Business transaction deleted.', 'success')
     else:
         flash('Transaction not found or unauthorized.', 'danger')
@@ -1081,10 +1036,7 @@ def edit_business_loan(loan_id):
             loan.tenure_months = int(request.form.get('tenure_months'))
             loan.start_date = datetime.strptime(request.form.get('start_date'), '%Y-%m-%d').date()
             
-            # Recalculate EMI
-            r = (loan.interest_rate / 12) / 100
-            tenure = loan.tenure_months
-            loan.emi = (loan.principal_amount * r * (1 + r)**tenure) / (((1 + r)**tenure) - 1)
+            loan.emi = float(amortization.emi(loan.principal_amount, loan.interest_rate, loan.tenure_months))
             
             db.session.commit()
             flash(f'Loan updated successfully! New EMI is ₹{loan.emi:.2f}', 'success')
@@ -1106,171 +1058,120 @@ def delete_business_loan(loan_id):
         flash('Loan not found or unauthorized.', 'danger')
     return redirect(url_for('business_loans'))
 
-def retrain_business_model(user_id):
+# (kind, user_id) -> ledger version at which a rebuild last found too little data; not retried until the ledger changes
+category_training_skipped = {}
+
+def retrain_user_category_model(kind, user_id):
     """
-    A helper function to retrain and save the business category prediction model.
-    Returns True on success, False on failure.
+    Full rebuild of a user's category model; kind is 'category' (personal expenses) or
+    'business_category'. Also serves as the periodic compaction for the online model
+    that learn_transaction_category keeps updating. Once a shared model exists, users
+    with fewer than PERSONAL_MIN_SAMPLES labelled transactions get no model of their
+    own and are served by the shared one alone. Returns True if a model was saved.
     """
-    user = db.session.get(User, user_id)
-    transactions = user.business_transactions # Assumes backref is set up
-    
-    if len(transactions) < 15:
-        # Not enough data to train, but not an error.
+    key = f'user_{user_id}/{kind}'
+    version = current_ledger_version(user_id, CATEGORY_SOURCES[kind][2])
+    shared = model_store.current_version(f'global/{kind}') is not None
+    model = train_user_model(kind, user_id, PERSONAL_MIN_SAMPLES if shared else USER_MIN_ROWS[kind])
+    if model is None:
+        # Not enough data to train, but not an error
+        category_training_skipped[(kind, user_id)] = version
+        online_category_models.delete(key)
         return False
-
-    df = pd.DataFrame([(t.description, t.category.name) for t in transactions], columns=['description', 'category'])
-    model = make_pipeline(TfidfVectorizer(), MultinomialNB())
-    model.fit(df['description'], df['category'])
-    joblib.dump(model, f'user_{user_id}_business_category_model.pkl')
+    online_category_models.save(key, model)
     return True
 
+def retrain_global_category_model(kind, batch_size=5000):
+    """Trains and saves the shared category model for `kind`. Returns the number of training rows used."""
+    classifier = train_global_model(kind, batch_size)
+    if classifier is None:
+        return 0
+    model_store.save(f'global/{kind}', classifier)
+    return classifier.n_samples
+
+def predict_user_category(user_id, kind, description):
+    """Category id suggested for a description: the shared model, personalized by the user's own."""
+    categories = Category.query.filter_by(user_id=user_id).all()
+    name = suggest_category(description, [c.name for c in categories],
+                            user_model=online_category_models.load(f'user_{user_id}/{kind}'),
+                            global_model=model_store.load(f'global/{kind}'))
+    return next((c.id for c in categories if c.name == name), None)
+
+def learn_transaction_category(user_id, kind, description, category_name):
+    """
+    Folds one newly labelled transaction into the user's online category model.
+    kind is 'category' (personal) or 'business_category'. The update stays in
+    memory and a debounced job saves it, so requests never write the model file.
+    Anything the online model can't absorb (no model yet, unseen category) or
+    enough accumulated updates schedules a full rebuild in the background instead.
+    """
+    key = f'user_{user_id}/{kind}'
+    learned = online_category_models.update(
+        key, lambda model: isinstance(model, OnlineCategoryClassifier) and model.learn_one(description, category_name))
+    if learned:
+        background_jobs.mark_dirty(f'{kind}_flush', user_id)
+        if online_category_models.load(key).online_updates < app.config['CATEGORY_MODEL_COMPACT_EVERY']:
+            return
+    background_jobs.mark_dirty(kind, user_id)
+
+def flush_category_model(kind, user_id):
+    """Saves the in-memory online updates to a user's category model."""
+    online_category_models.flush(f'user_{user_id}/{kind}')
+
+for category_kind in CATEGORY_SOURCES:
+    background_jobs.register(category_kind, partial(retrain_user_category_model, category_kind))
+    background_jobs.register(f'{category_kind}_flush', partial(flush_category_model, category_kind))
+# Keyed by narrative id rather than user: one job per distinct month summary
+background_jobs.register('insight_narrative', partial(generate_narrative, endpoint=app.config['INSIGHT_LLM_ENDPOINT'] or None,
+                                                      model=app.config['INSIGHT_LLM_MODEL'],
+                                                      timeout=app.config['INSIGHT_LLM_TIMEOUT']))
+background_jobs.register('report_artifact', partial(render_artifact, directory=app.config['REPORT_ARTIFACT_DIR']))
+for forecast_kind in FORECAST_KINDS:
+    background_jobs.register(f'forecast_{forecast_kind}', partial(refresh_forecast, forecast_kind,
+                                                                  budget_ms=app.config['FORECAST_BACKGROUND_BUDGET_MS']))
+
+
+def cached_forecast(kind, user_id):
+    """
+    Returns the user's forecast payload. Missing or stale forecasts are recomputed
+    in the request when a lightweight model is all the history calls for;
+    otherwise the stored (or a lightweight stopgap) forecast is returned and a
+    background job refits it right away.
+    """
+    payload, stale = stored_forecast(kind, user_id)
+    if stale:
+        fresh, complete = inline_forecast(kind, user_id, app.config['FORECAST_INLINE_BUDGET_MS'],
+                                          app.config['FORECAST_BACKGROUND_BUDGET_MS'])
+        if not complete:
+            background_jobs.mark_dirty(f'forecast_{kind}', user_id, delay=0)
+        if complete or payload is None:
+            payload, stale = fresh, not complete
+    payload['stale'] = stale
+    return payload
+
 @app.route('/train_business_model')
 @login_required
 def train_business_model():
     # This route now just calls the helper function.
-    if retrain_business_model(current_user.id):
+    if retrain_user_category_model('business_category', current_user.id):
         flash('Successfully trained the AI category model on your business data!', 'success')
     else:
-        flash('You need at least 15 business transactions to train the AI category model.', 'info')
+        flash('You need more categorized business transactions to train your own AI category model.', 'info')
     return redirect(url_for('business_transactions'))
 
 @app.route('/predict_business_category', methods=['POST'])
 @login_required
 def predict_business_category():
     description = request.json['description']
-    model_path = f'user_{current_user.id}_business_category_model.pkl'
-
-    try:
-        # Load the user's trained model
-        model = joblib.load(model_path)
-        prediction_name = model.predict([description])[0]
-        
-        # Find the category ID for the predicted name
-        predicted_category = Category.query.filter_by(user_id=current_user.id, name=prediction_name).first()
-        
-        if predicted_category:
-            return jsonify({'category_id': predicted_category.id})
-        else:
-            return jsonify({'category_id': None}) # Predicted category name doesn't exist
-            
-    except FileNotFoundError:
-        return jsonify({'category_id': None}) # Model hasn't been trained yet
+    return jsonify({'category_id': predict_user_category(current_user.id, 'business_category', description)})
 # app.py (Add this new route at the end of the file)
 
 @app.route('/predict_business_cashflow')
 @login_required
 def predict_business_cashflow():
-    try:
-        # Fetch all business transactions for the user
-        transactions = BusinessTransaction.query.filter_by(user_id=current_user.id).order_by(BusinessTransaction.date.asc()).all()
-
-        if not transactions or len(transactions) < 2:
-            return jsonify({"error": "Not enough data for a forecast."})
-
-        # Prepare DataFrame for Prophet
-        df = pd.DataFrame([{
-            'date': t.date,
-            'amount': t.amount if t.type == 'revenue' else -t.amount
-        } for t in transactions])
-        
-        # Group by date to get daily net cash flow
-        df_daily_net = df.groupby('date').sum().reset_index()
-        
-        # Prophet requires columns 'ds' (datestamp) and 'y' (value)
-        df_prophet = df_daily_net.rename(columns={"date": "ds", "amount": "y"})
-        
-        if len(df_prophet) < 2:
-            return jsonify({"error": "Not enough distinct data points for a forecast."})
-
-        # Initialize and fit the Prophet model
-        model = Prophet(daily_seasonality=True)
-        model.fit(df_prophet)
-
-        # Create a future dataframe for the next 60 days
-        future = model.make_future_dataframe(periods=60)
-        forecast = model.predict(future)
-        
-        # Return the forecast data as JSON
-        # We only need the data from today onwards
-        today = pd.to_datetime(date.today())
-        future_forecast = forecast[forecast['ds'] >= today]
-
-        response_data = {
-            'dates': future_forecast['ds'].dt.strftime('%Y-%m-%d').tolist(),
-            'predicted_flow': future_forecast['yhat'].tolist(),
-            'lower_bound': future_forecast['yhat_lower'].tolist(),
-            'upper_bound': future_forecast['yhat_upper'].tolist()
-        }
-        return jsonify(response_data)
-
-    except Exception as e:
-        # Return a generic error if anything goes wrong
-        return jsonify({"error": f"An error occurred: {str(e)}"})
-    
-    
-# --- BUSINESS REPORTING HELPERS ---
-
-def generate_business_pdf_report(data):
-    pdf = FPDF()
-    pdf.add_page()
-    
-    # Title
-    pdf.set_font('Helvetica', 'B', 18)
-    pdf.cell(0, 10, 'Profit & Loss Statement', 0, 1, 'C')
-    pdf.set_font('Helvetica', '', 12)
-    pdf.cell(0, 10, f"For the period: {data['start_date']} to {data['end_date']}", 0, 1, 'C')
-    pdf.ln(10)
-
-    # Summary Section
-    pdf.set_font('Helvetica', 'B', 14)
-    pdf.cell(0, 10, 'Financial Summary', 0, 1)
-    pdf.set_font('Helvetica', '', 12)
-    pdf.cell(95, 10, 'Total Revenue:', 1, 0)
-    pdf.cell(95, 10, f"Rs. {data['total_revenue']:.2f}", 1, 1, 'R')
-    pdf.cell(95, 10, 'Total Expenses:', 1, 0)
-    pdf.cell(95, 10, f"Rs. {data['total_expenses']:.2f}", 1, 1, 'R')
-    pdf.set_font('Helvetica', 'B', 12)
-    pdf.cell(95, 10, 'Net Profit / (Loss):', 1, 0)
-    pdf.cell(95, 10, f"Rs. {data['net_profit']:.2f}", 1, 1, 'R')
-    pdf.ln(10)
-
-    # Expense Breakdown
-    if data['expenses_by_category']:
-        pdf.set_font('Helvetica', 'B', 14)
-        pdf.cell(0, 10, 'Expense Breakdown by Category', 0, 1)
-        pdf.set_font('Helvetica', 'B', 12)
-        pdf.cell(95, 10, 'Category', 1, 0)
-        pdf.cell(95, 10, 'Amount', 1, 1, 'C')
-        pdf.set_font('Helvetica', '', 12)
-        for category, amount in data['expenses_by_category'].items():
-            pdf.cell(95, 10, f"  {category}", 1, 0)
-            pdf.cell(95, 10, f"Rs. {amount:.2f}", 1, 1, 'R')
-
-    # FPDF.output returns bytes, encode to latin-1 for Flask Response
-    return pdf.output(dest='S').encode('latin-1')
-
-def generate_business_csv_report(data):
-    output = io.StringIO()
-    writer = csv.writer(output)
+    return jsonify(cached_forecast('business_cashflow', current_user.id))
     
-    # Write summary
-    writer.writerow(['Profit & Loss Statement'])
-    writer.writerow(['Period', f"{data['start_date']} to {data['end_date']}"])
-    writer.writerow([]) # Spacer
-    writer.writerow(['Metric', 'Amount (Rs.)'])
-    writer.writerow(['Total Revenue', data['total_revenue']])
-    writer.writerow(['Total Expenses', data['total_expenses']])
-    writer.writerow(['Net Profit / (Loss)', data['net_profit']])
-    writer.writerow([]) # Spacer
     
-    # Write expense breakdown
-    writer.writerow(['Expense Breakdown by Category'])
-    writer.writerow(['Category', 'Amount (Rs.)'])
-    for category, amount in data['expenses_by_category'].items():
-        writer.writerow([category, amount])
-        
-    return output.getvalue()
-
 @app.route('/business/reports', methods=['GET', 'POST'])
 @login_required
 def business_reports():
@@ -1279,46 +1180,25 @@ def business_reports():
             start_date = datetime.strptime(request.form.get('start_date'), '%Y-%m-%d').date()
             end_date = datetime.strptime(request.form.get('end_date'), '%Y-%m-%d').date()
             report_format = request.form.get('format')
+            report_type = request.form.get('report_type', 'summary')
 
-            if start_date > end_date:
-                flash('Start date cannot be after end date.', 'danger')
+            error = validate_report(report_type, report_format, start_date, end_date)
+            if error:
+                flash(error, 'danger')
                 return redirect(url_for('business_reports'))
-            
-            # Query transactions in the date range
-            transactions = BusinessTransaction.query.filter(
-                BusinessTransaction.user_id == current_user.id,
-                BusinessTransaction.date.between(start_date, end_date)
-            ).all()
-
-            # Calculate metrics
-            total_revenue = sum(t.amount for t in transactions if t.type == 'revenue')
-            total_expenses = sum(t.amount for t in transactions if t.type == 'expense')
-            
-            expenses_by_category = {}
-            for t in transactions:
-                if t.type == 'expense':
-                    expenses_by_category[t.category.name] = expenses_by_category.get(t.category.name, 0) + t.amount
-
-            report_data = {
-                'start_date': start_date.strftime('%d %b %Y'),
-                'end_date': end_date.strftime('%d %b %Y'),
-                'total_revenue': total_revenue,
-                'total_expenses': total_expenses,
-                'net_profit': total_revenue - total_expenses,
-                'expenses_by_category': expenses_by_category
-            }
-
-            if report_format == 'pdf':
-                pdf_data = generate_business_pdf_report(report_data)
-                return Response(pdf_data, mimetype='application/pdf', headers={'Content-Disposition': 'attachment;filename=business_report.pdf'})
-            elif report_format == 'csv':
-                csv_data = generate_business_csv_report(report_data)
-                return Response(csv_data, mimetype='text/csv', headers={'Content-Disposition': 'attachment;filename=business_report.csv'})
+
+            # Rendered in the background; an unchanged ledger reuses the file from last time
+            artifact = request_report(app.config['REPORT_ARTIFACT_DIR'], current_user.id, 'business',
+                                      start_date, end_date, report_format, report_type)
+            if artifact.status == 'pending':
+                background_jobs.mark_dirty('report_artifact', artifact.id, delay=0)
+            return render_template('business/reports.html', today=date.today().strftime('%Y-%m-%d'),
+                                   report_types=REPORT_TYPES, artifact=artifact)
 
         except Exception as e:
             flash(f'An error occurred while generating the report: {e}', 'danger')
     
-    return render_template('business/reports.html', today=date.today().strftime('%Y-%m-%d'))
+    return render_template('business/reports.html', today=date.today().strftime('%Y-%m-%d'), report_types=REPORT_TYPES)
 
 @app.route('/add_transaction', methods=['POST'])
 @login_required
@@ -1348,6 +1228,10 @@ def add_transaction():
     new_transaction = Transaction(description=description, amount=amount, type=ttype, date=datetime.utcnow().date(), user_id=current_user.id, category_id=category_id)
     db.session.add(new_transaction)
     db.session.commit()
+    if ttype == 'expense':
+        score_transaction(new_transaction, 'personal')
+        db.session.commit()
+        learn_transaction_category(current_user.id, 'category', description, new_transaction.category.name)
     flash('Transaction added successfully!', 'success')
     return redirect(url_for('dashboard'))
 
@@ -1379,26 +1263,25 @@ def view_transactions():
 def delete_transaction(transaction_id):
     transaction = db.session.get(Transaction, transaction_id)
     if not transaction or transaction.user_id != current_user.id: flash('Not authorized.', 'error'); return redirect(url_for('view_transactions'))
+    reset_stats(current_user.id, 'personal', {transaction.category_id})
     db.session.delete(transaction); db.session.commit()
+    background_jobs.mark_dirty('category', current_user.id)
     flash('Transaction deleted.', 'success'); return redirect(url_for('view_transactions'))
 
 @app.route('/schemes')
 @login_required
 def schemes():
-    user_schemes = FixedScheme.query.filter_by(user_id=current_user.id).all()
-    schemes_with_details = []
-    for scheme in user_schemes:
-        years_elapsed = (date.today() - scheme.start_date).days / 365.25
-        if years_elapsed < 0: years_elapsed = 0
-        tenure_years = scheme.tenure_months / 12
-        maturity_amount = scheme.principal_amount * ((1 + (scheme.interest_rate / 100)) ** tenure_years)
-        current_value = scheme.principal_amount * ((1 + (scheme.interest_rate / 100)) ** years_elapsed)
-        penalized_rate = scheme.interest_rate - scheme.penalty_rate
-        if penalized_rate < 0: penalized_rate = 0
-        early_withdrawal_value = scheme.principal_amount * ((1 + (penalized_rate / 100)) ** years_elapsed)
-        maturity_date = scheme.start_date + relativedelta(months=+scheme.tenure_months)
-        schemes_with_details.append({'scheme': scheme, 'maturity_date': maturity_date, 'maturity_amount': maturity_amount, 'current_value': current_value, 'early_withdrawal_value': early_withdrawal_value})
-    return render_template('schemes.html', schemes_data=schemes_with_details)
+    user_schemes = FixedScheme.query.filter_by(user_id=current_user.id).order_by(FixedScheme.id).all()
+    rows = scheme_rows(user_schemes)
+    values = value_schemes(rows)
+    fy_interest = interest_for_fy(rows, current_financial_year())
+    schemes_with_details = [
+        {'scheme': scheme, 'maturity_date': values['maturity_date'][i], 'maturity_amount': values['maturity_amount'][i],
+         'current_value': values['current_value'][i], 'early_withdrawal_value': values['early_withdrawal_value'][i],
+         'interest_this_fy': fy_interest[i]}
+        for i, scheme in enumerate(user_schemes)
+    ]
+    return render_template('schemes.html', schemes_data=schemes_with_details, fy_label=fy_label(current_financial_year()))
 
 @app.route('/add_scheme', methods=['POST'])
 @login_required
@@ -1465,140 +1348,134 @@ def delete_investment(investment_id):
     db.session.delete(investment); db.session.commit()
     flash('Investment removed from portfolio.', 'success'); return redirect(url_for('investments'))
 
+# --- Market Price Helpers ---
+market_data_provider = provider_from_config(app.config)
+
+price_hub = PriceStreamHub(market_data_provider.get_quotes, interval=app.config['PRICE_STREAM_INTERVAL'])
+
 @app.route('/refresh_prices')
 @login_required
 def refresh_prices():
-    user_investments = Investment.query.filter_by(user_id=current_user.id).all()
-    refreshed_data = []
-    cg = CoinGeckoAPI()
-    try:
-        rates = cg.get_price(ids='tether', vs_currencies='inr')
-        usd_to_inr_rate = rates['tether']['inr']
-    except Exception as e:
-        print(f"Could not fetch exchange rate, falling back. Error: {e}")
-        usd_to_inr_rate = 83.5
-    for investment in user_investments:
-        current_price_display = 0; total_value_inr = 0; profit_loss_display = 0
+    holdings = load_holdings(current_user.id)
+    quotes = market_data_provider.get_quotes(set(holdings.symbols) | {USD_INR_SYMBOL})
+    valuation = value_portfolio(holdings, quotes)
+    return jsonify({'data': valuation.rows(), 'exchange_rate': valuation.exchange_rate})
+
+@app.route('/stream_prices')
+@login_required
+def stream_prices():
+    """
+    Server-sent events feed for the portfolio page. The first 'snapshot' event carries every
+    holding, later 'quotes' events only the holdings whose price (or the exchange rate) changed.
+    Every event also says when prices were last refreshed, whether that is too long ago and which
+    holdings have no quote; 'heartbeat' events repeat that in between.
+    """
+    holdings = load_holdings(current_user.id)
+
+    def sse(event, payload):
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+    def generate():
+        if not len(holdings):
+            yield sse('snapshot', {'data': [], 'exchange_rate': DEFAULT_USD_TO_INR_RATE})
+            return
+        feed, subscriber = price_hub.subscribe(set(holdings.symbols) | {USD_INR_SYMBOL})
+        quotes = {}
+        event = 'snapshot'
+
+        def status():
+            return {'as_of': feed.refreshed_at, 'stale': price_hub.is_stale(feed),
+                    'missing': [ticker.upper() for asset_type, ticker in holdings.symbols
+                                if (asset_type, ticker) not in quotes]}
+
         try:
-            if investment.asset_type == 'Stock':
-                stock = yf.Ticker(investment.ticker_symbol)
-                todays_data = stock.history(period='1d')
-                if not todays_data.empty:
-                    current_price_display = todays_data['Close'][0]
-                    total_value_inr = investment.quantity * current_price_display
-                    investment_cost_inr = investment.purchase_price * investment.quantity
-                    profit_loss_display = total_value_inr - investment_cost_inr
-            elif investment.asset_type == 'Crypto':
-                price_data = cg.get_price(ids=investment.ticker_symbol, vs_currencies='usd')
-                if price_data and price_data.get(investment.ticker_symbol):
-                    current_price_display = price_data[investment.ticker_symbol].get('usd', 0)
-                    total_value_inr = (investment.quantity * current_price_display) * usd_to_inr_rate
-                    investment_cost_usd = investment.purchase_price * investment.quantity
-                    if investment.purchase_currency == 'INR':
-                        investment_cost_usd /= usd_to_inr_rate
-                    profit_loss_display = (investment.quantity * current_price_display) - investment_cost_usd
-        except Exception as e:
-            print(f"Could not fetch price for {investment.ticker_symbol}: {e}")
-        refreshed_data.append({'investment': {'id': investment.id, 'ticker_symbol': investment.ticker_symbol.upper(), 'asset_type': investment.asset_type, 'quantity': investment.quantity, 'purchase_price': investment.purchase_price, 'purchase_currency': investment.purchase_currency}, 'current_price_display': current_price_display, 'total_value_inr': total_value_inr, 'profit_loss_display': profit_loss_display})
-    return jsonify({'data': refreshed_data, 'exchange_rate': usd_to_inr_rate})
+            while True:
+                try:
+                    changed = subscriber.get(timeout=15)
+                except queue.Empty:
+                    # Doubles as the keep-alive; lets the page notice a feed that has stopped refreshing
+                    yield sse('heartbeat', status())
+                    continue
+                quotes.update(changed)
+                valuation = value_portfolio(holdings, quotes)
+                # The exchange rate moves every crypto lot, so it forces a full refresh too
+                mask = None if event == 'snapshot' or USD_INR_SYMBOL in changed else valuation.symbol_mask(changed)
+                rows = valuation.rows(mask)
+                if rows or event == 'snapshot':
+                    yield sse(event, {'data': rows, 'exchange_rate': valuation.exchange_rate, **status()})
+                    event = 'quotes'
+        finally:
+            price_hub.unsubscribe(feed, subscriber)
+
+    return Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/net_worth')
 @login_required
 def net_worth():
-    transactions = Transaction.query.filter_by(user_id=current_user.id).all()
-    cash_balance = sum(t.amount for t in transactions if t.type == 'income') - sum(t.amount for t in transactions if t.type == 'expense')
-    user_schemes = FixedScheme.query.filter_by(user_id=current_user.id).all()
-    total_schemes_value = 0
-    for scheme in user_schemes:
-        years_elapsed = (date.today() - scheme.start_date).days / 365.25
-        if years_elapsed > 0:
-            total_schemes_value += scheme.principal_amount * ((1 + (scheme.interest_rate / 100)) ** years_elapsed)
-    user_investments = Investment.query.filter_by(user_id=current_user.id).all()
-    total_investments_value = 0
-    cg = CoinGeckoAPI()
-    try:
-        rates = cg.get_price(ids='tether', vs_currencies='inr')
-        usd_to_inr_rate = rates['tether']['inr']
-    except Exception:
-        usd_to_inr_rate = 83.5
-    for investment in user_investments:
-        try:
-            if investment.asset_type == 'Stock':
-                stock = yf.Ticker(investment.ticker_symbol)
-                todays_data = stock.history(period='1d')
-                if not todays_data.empty:
-                    total_investments_value += investment.quantity * todays_data['Close'][0]
-            elif investment.asset_type == 'Crypto':
-                price_data = cg.get_price(ids=investment.ticker_symbol, vs_currencies='usd')
-                if price_data and price_data.get(investment.ticker_symbol):
-                    current_price_usd = price_data[investment.ticker_symbol].get('usd', 0)
-                    total_investments_value += (investment.quantity * current_price_usd) * usd_to_inr_rate
-        except Exception as e:
-            print(f"Net Worth: Could not fetch price for {investment.ticker_symbol}: {e}")
-    total_assets = cash_balance + total_schemes_value + total_investments_value
-    user_loans = Loan.query.filter_by(user_id=current_user.id).all()
-    total_liabilities = 0
-    loans_with_details = []
-    for loan in user_loans:
-        r = (loan.interest_rate / 12) / 100
-        n = loan.tenure_months
-        payments_made = (date.today().year - loan.start_date.year) * 12 + (date.today().month - loan.start_date.month)
-        if payments_made < 0: payments_made = 0
-        if payments_made > n: payments_made = n
-        outstanding_balance = loan.principal * (((1 + r)**n) - ((1 + r)**payments_made)) / (((1 + r)**n) - 1) if (((1 + r)**n) - 1) != 0 else 0
-        total_liabilities += outstanding_balance
-        loans_with_details.append({'loan_name': loan.loan_name, 'outstanding': outstanding_balance})
-    total_net_worth = total_assets - total_liabilities
-    chart_data = {'labels': ['Cash', 'Fixed Schemes', 'Investments'], 'data': [cash_balance, total_schemes_value, total_investments_value]}
+    # Render the last nightly snapshot straight away (live prices are fetched by the page afterwards).
+    # Users without a snapshot yet get a live computation.
+    snapshot = latest_snapshot(current_user.id)
+    if snapshot:
+        figures = {'cash': snapshot.cash, 'schemes': snapshot.schemes, 'investments': snapshot.investments,
+                   'assets': snapshot.cash + snapshot.schemes + snapshot.investments,
+                   'liabilities': snapshot.liabilities, 'net_worth': snapshot.net_worth, 'loans': []}
+    else:
+        figures = compute_net_worth(current_user.id, market_data_provider)
+    chart_data = {'labels': ['Cash', 'Fixed Schemes', 'Investments'], 'data': [figures['cash'], figures['schemes'], figures['investments']]}
     return render_template('net_worth.html', 
-                           net_worth=total_net_worth, 
-                           assets=total_assets,
-                           liabilities=total_liabilities,
-                           cash=cash_balance, 
-                           schemes=total_schemes_value, 
-                           investments=total_investments_value,
-                           loans=loans_with_details,
-                           chart_data=json.dumps(chart_data))
+                           net_worth=figures['net_worth'], 
+                           assets=figures['assets'],
+                           liabilities=figures['liabilities'],
+                           cash=figures['cash'], 
+                           schemes=figures['schemes'], 
+                           investments=figures['investments'],
+                           loans=figures['loans'],
+                           chart_data=json.dumps(chart_data),
+                           snapshot_date=snapshot.snapshot_date if snapshot else None)
+
+@app.route('/api/net_worth/live')
+@login_required
+def net_worth_live():
+    return jsonify(compute_net_worth(current_user.id, market_data_provider))
+
+@app.route('/api/net_worth/history')
+@login_required
+def net_worth_history():
+    days = request.args.get('days', 365, type=int)
+    return jsonify(snapshot_history(current_user.id, days=max(1, min(days, 3660))))
 
 @app.route('/tax_estimator')
 @login_required
 def tax_estimator():
-    age = 0
-    if current_user.dob:
-        today = date.today()
-        age = today.year - current_user.dob.year - ((today.month, today.day) < (current_user.dob.month, current_user.dob.day))
+    age = user_age(current_user)
     salary_details = Salary.query.filter_by(user_id=current_user.id).first()
     gross_salary_income = 0
     deductions = 0
     if salary_details:
         gross_salary_income = salary_details.monthly_gross * 12
         deductions = salary_details.deductions_80c + salary_details.hra_exemption
-    user_schemes = FixedScheme.query.filter_by(user_id=current_user.id).all()
-    total_interest_income = 0
-    for scheme in user_schemes:
-        years_elapsed = (date.today() - scheme.start_date).days / 365.25
-        if years_elapsed > 0:
-            interest = scheme.principal_amount * ((1 + (scheme.interest_rate / 100)) ** years_elapsed) - scheme.principal_amount
-            total_interest_income += interest
-    sold_investments = SoldInvestment.query.filter_by(user_id=current_user.id).all()
-    stcg_stocks = sum(s.capital_gain for s in sold_investments if s.asset_type == 'Stock' and s.gain_type == 'STCG')
-    ltcg_stocks = sum(s.capital_gain for s in sold_investments if s.asset_type == 'Stock' and s.gain_type == 'LTCG')
-    crypto_gains = sum(s.capital_gain for s in sold_investments if s.asset_type == 'Crypto')
-    stcg_tax = stcg_stocks * 0.15
-    ltcg_taxable = max(0, ltcg_stocks - 100000)
-    ltcg_tax = ltcg_taxable * 0.10
-    crypto_tax = crypto_gains * 0.30
-    total_capital_gains_tax = stcg_tax + ltcg_tax + crypto_tax
+    # Realised gains come from the pre-aggregated per-FY ledger, not the full sales history
+    financial_year = request.args.get('fy', current_financial_year(), type=int)
+    if not valid_fy(financial_year):
+        flash(f'Unsupported financial year {financial_year}; showing the current one.', 'warning')
+        financial_year = current_financial_year()
+    # Scheme interest is taxed in the year it accrues
+    total_interest_income = sum(interest_for_fy(load_scheme_rows(current_user.id), financial_year))
+    gains = gains_for_year(current_user.id, financial_year)
+    stcg_stocks = gains.get(('Stock', 'STCG'), 0.0)
+    ltcg_stocks = gains.get(('Stock', 'LTCG'), 0.0)
+    crypto_gains = sum(total for (asset_type, _), total in gains.items() if asset_type == 'Crypto')
+    gains_tax = {key: float(value) for key, value in capital_gains_tax(stcg_stocks, ltcg_stocks, crypto_gains, financial_year).items()}
     total_regular_income = gross_salary_income + total_interest_income
-    new_regime_details = calculate_new_regime_tax(total_regular_income)
-    old_regime_details = calculate_old_regime_tax(total_regular_income, deductions, age)
-    new_regime_details['total_tax'] += total_capital_gains_tax
-    old_regime_details['total_tax'] += total_capital_gains_tax
+    new_regime_details = calculate_new_regime_tax(total_regular_income, financial_year)
+    old_regime_details = calculate_old_regime_tax(total_regular_income, deductions, age, financial_year)
+    new_regime_details['total_tax'] += gains_tax['total_tax']
+    old_regime_details['total_tax'] += gains_tax['total_tax']
     capital_gains_summary = {
-        'stcg_stocks': stcg_stocks, 'stcg_tax': stcg_tax,
-        'ltcg_stocks': ltcg_stocks, 'ltcg_tax': ltcg_tax,
-        'crypto_gains': crypto_gains, 'crypto_tax': crypto_tax,
-        'total_tax': total_capital_gains_tax
+        'stcg_stocks': stcg_stocks, 'stcg_tax': gains_tax['stcg_tax'],
+        'ltcg_stocks': ltcg_stocks, 'ltcg_tax': gains_tax['ltcg_tax'],
+        'crypto_gains': crypto_gains, 'crypto_tax': gains_tax['crypto_tax'],
+        'total_tax': gains_tax['total_tax']
     }
     return render_template('tax_estimator.html', 
                            new_regime=new_regime_details, 
@@ -1606,7 +1483,73 @@ def tax_estimator():
                            salary_setup=(salary_details is not None), 
                            user_age=age,
                            capital_gains=capital_gains_summary,
-                           interest_income=total_interest_income)
+                           interest_income=total_interest_income,
+                           financial_year=financial_year,
+                           fy_label=fy_label(financial_year),
+                           available_years=sorted(set(ledger_years(current_user.id)) | {current_financial_year(), financial_year}, reverse=True))
+
+@app.route('/api/tax/what_if', methods=['POST'])
+@login_required
+def tax_what_if():
+    """
+    Both regimes for a batch of scenarios. Each field is a number or a list
+    (lists broadcast against each other): gross_income, deductions, stcg, ltcg,
+    crypto, age; plus fy. Missing fields default to the user's own figures.
+    """
+    params = request.get_json(silent=True) or {}
+    salary = Salary.query.filter_by(user_id=current_user.id).first()
+    try:
+        fy = int(params.get('fy', current_financial_year()))
+        inputs = {
+            'gross_income': params.get('gross_income', salary.monthly_gross * 12 if salary else 0),
+            'deductions': params.get('deductions', salary.deductions_80c + salary.hra_exemption if salary else 0),
+            'stcg': params.get('stcg', 0), 'ltcg': params.get('ltcg', 0), 'crypto': params.get('crypto', 0),
+            'age': params.get('age', user_age(current_user)),
+        }
+        inputs = dict(zip(inputs, np.broadcast_arrays(*(np.asarray(value, dtype=np.float64) for value in inputs.values()))))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid scenario: {e}'}), 400
+    if inputs['gross_income'].size > MAX_SCENARIOS:
+        return jsonify({'error': f'At most {MAX_SCENARIOS} scenarios per request.'}), 400
+    if not valid_fy(fy):
+        return jsonify({'error': f'Unsupported financial year {fy}.'}), 400
+    if not all(np.isfinite(value).all() and (np.abs(value) <= MAX_AMOUNT).all() for value in inputs.values()):
+        return jsonify({'error': f'Amounts must be finite and at most {MAX_AMOUNT}.'}), 400
+
+    result = compare_regimes(fy=fy, **inputs)
+    return jsonify({'financial_year': fy, 'tax_table_fy': table_year(fy), **{key: np.atleast_1d(value).tolist() for key, value in {**inputs, **result}.items()}})
+
+@app.route('/api/tax/break_even')
+@login_required
+def tax_break_even():
+    """Deductions the old regime needs to match the new one across a range of incomes, for the estimator chart."""
+    salary = Salary.query.filter_by(user_id=current_user.id).first()
+    try:
+        fy = int(request.args.get('fy', current_financial_year()))
+        income = float(request.args.get('income', salary.monthly_gross * 12 if salary else 0))
+        deductions = float(request.args.get('deductions', salary.deductions_80c + salary.hra_exemption if salary else 0))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid parameters: {e}'}), 400
+    if not valid_fy(fy):
+        return jsonify({'error': f'Unsupported financial year {fy}.'}), 400
+    if not (np.isfinite(income) and np.isfinite(deductions)):
+        return jsonify({'error': 'Income and deductions must be finite.'}), 400
+    income = float(np.clip(income, 0, MAX_AMOUNT))
+    deductions = float(np.clip(deductions, 0, MAX_AMOUNT))
+    age = user_age(current_user)
+
+    incomes = np.linspace(300000, max(3000000, income * 2), 120).round(-3)
+    break_even = break_even_deductions(incomes, age, fy)
+    at_income = break_even_deductions(income, age, fy)[0] if income > 0 else np.nan
+    comparison = compare_regimes(incomes, deductions, age=age, fy=fy)
+    return jsonify({
+        'financial_year': fy, 'tax_table_fy': table_year(fy), 'income': income, 'deductions': deductions,
+        'break_even_at_income': None if np.isnan(at_income) else float(at_income),
+        'incomes': incomes.tolist(),
+        'break_even_deductions': [None if np.isnan(value) else float(value) for value in break_even],
+        'new_regime_tax': comparison['new_regime_tax'].tolist(),
+        'old_regime_tax': comparison['old_regime_tax'].tolist(),
+    })
 
 @app.route('/profile', methods=['GET', 'POST'])
 @login_required
@@ -1632,40 +1575,43 @@ def sell_investment(investment_id):
     sell_quantity = float(request.form.get('sell_quantity'))
     sell_date = datetime.strptime(request.form.get('sell_date'), '%Y-%m-%d').date()
 
-    if sell_quantity > investment.quantity or sell_quantity <= 0:
+    # Sales are matched against every lot of this ticker, oldest purchase first (FIFO)
+    lots = Investment.query.filter_by(
+        user_id=current_user.id, asset_type=investment.asset_type, ticker_symbol=investment.ticker_symbol
+    ).order_by(Investment.purchase_date, Investment.id).all()
+    total_quantity = sum(lot.quantity for lot in lots)
+
+    if sell_quantity > total_quantity + 0.000001 or sell_quantity <= 0:
         flash('Invalid quantity to sell.', 'error')
         return redirect(url_for('investments'))
 
-    holding_period_days = (sell_date - investment.purchase_date).days
-    
-    gain_type = 'STCG'
-    if investment.asset_type == 'Stock' and holding_period_days > 365:
-        gain_type = 'LTCG'
-
-    purchase_cost = investment.purchase_price * sell_quantity
-    sell_value = sell_price * sell_quantity
-    capital_gain = sell_value - purchase_cost
-    
-    new_sale = SoldInvestment(
-        asset_type=investment.asset_type,
-        ticker_symbol=investment.ticker_symbol,
-        quantity=sell_quantity,
-        purchase_price=investment.purchase_price,
-        purchase_date=investment.purchase_date,
-        sell_price=sell_price,
-        sell_date=sell_date,
-        capital_gain=capital_gain,
-        gain_type=gain_type,
-        user_id=current_user.id
-    )
-    db.session.add(new_sale)
-
-    investment.quantity -= sell_quantity
-    if investment.quantity <= 0.000001:
-        db.session.delete(investment)
-    
+    consumed, capital_gains, gain_types = fifo_sale(
+        [lot.purchase_price for lot in lots], [lot.purchase_date for lot in lots], [lot.quantity for lot in lots],
+        investment.asset_type, sell_quantity, sell_price, sell_date)
+
+    for lot, quantity, capital_gain, gain_type in zip(lots, consumed, capital_gains, gain_types):
+        if quantity <= 0:
+            continue
+        db.session.add(SoldInvestment(
+            asset_type=lot.asset_type,
+            ticker_symbol=lot.ticker_symbol,
+            quantity=float(quantity),
+            purchase_price=lot.purchase_price,
+            purchase_date=lot.purchase_date,
+            sell_price=sell_price,
+            sell_date=sell_date,
+            capital_gain=float(capital_gain),
+            gain_type=str(gain_type),
+            user_id=current_user.id
+        ))
+        record_gain(current_user.id, sell_date, lot.asset_type, str(gain_type), float(capital_gain))
+        lot.quantity -= float(quantity)
+        if lot.quantity <= 0.000001:
+            db.session.delete(lot)
+
+    ticker = investment.ticker_symbol.upper()
     db.session.commit()
-    flash(f'Successfully sold {sell_quantity} units of {investment.ticker_symbol.upper()}.', 'success')
+    flash(f'Successfully sold {sell_quantity} units of {ticker}.', 'success')
     return redirect(url_for('investments'))
 
 @app.route('/loans')
@@ -1683,8 +1629,7 @@ def add_loan():
     tenure = int(request.form.get('tenure_months'))
     start_date = datetime.strptime(request.form.get('start_date'), '%Y-%m-%d').date()
 
-    r = (rate / 12) / 100
-    emi = (principal * r * (1 + r)**tenure) / ((1 + r)**tenure - 1)
+    emi = float(amortization.emi(principal, rate, tenure))
 
     new_loan = Loan(
         loan_name=loan_name,
@@ -1727,12 +1672,15 @@ def edit_transaction(transaction_id):
         return redirect(url_for('view_transactions'))
     
     if request.method == 'POST':
+        previous_category_id = transaction.category_id
         transaction.description = request.form.get('description')
         transaction.amount = float(request.form.get('amount'))
         transaction.type = request.form.get('type')
         transaction.category = request.form.get('category')
         transaction.date = datetime.strptime(request.form.get('date'), '%Y-%m-%d').date()
+        reset_stats(current_user.id, 'personal', {previous_category_id, transaction.category_id})
         db.session.commit()
+        background_jobs.mark_dirty('category', current_user.id)
         flash('Transaction updated successfully!', 'success')
         return redirect(url_for('view_transactions'))
         
@@ -1774,10 +1722,7 @@ def edit_loan(loan_id):
         loan.tenure_months = int(request.form.get('tenure_months'))
         loan.start_date = datetime.strptime(request.form.get('start_date'), '%Y-%m-%d').date()
         
-        # Recalculate EMI
-        r = (loan.interest_rate / 12) / 100
-        tenure = loan.tenure_months
-        loan.emi_amount = (loan.principal * r * (1 + r)**tenure) / ((1 + r)**tenure - 1)
+        loan.emi_amount = float(amortization.emi(loan.principal, loan.interest_rate, loan.tenure_months))
         
         db.session.commit()
         flash('Loan updated successfully!', 'success')
@@ -1785,130 +1730,76 @@ def edit_loan(loan_id):
 
     return render_template('edit_loan.html', loan=loan)
 
-@app.route('/ai_insights')
-@login_required
-def ai_insights():
-    transactions = Transaction.query.filter_by(user_id=current_user.id).order_by(Transaction.date.asc()).all()
-    if not transactions:
-        return jsonify({'insights': ["No data available to generate insights."]})
-
-    df = pd.DataFrame(
-        [(t.date, t.amount if t.type == 'income' else -t.amount, t.category) for t in transactions],
-        columns=['date', 'amount', 'category']
-    )
-
-    insights = []
-
-    # --- 1. Anomaly Detection (Expenses Only) ---
-    try:
-        expense_data = df[df['amount'] < 0]
-        if len(expense_data) > 10:
-            model = IsolationForest(contamination=0.15, random_state=42)
-            expense_data['score'] = model.fit_predict(expense_data[['amount']])
-            anomalies = expense_data[expense_data['score'] == -1]
-            if not anomalies.empty:
-                latest_anomaly = anomalies.iloc[-1]
-                insights.append(
-                    f"Alert: Unusual spending detected on {latest_anomaly['date'].strftime('%d %b')} "
-                    f"in {latest_anomaly['category']} (₹{abs(latest_anomaly['amount']):.2f})."
-                )
-    except Exception as e:
-        insights.append("Anomaly detection could not be performed.")
+def _owned_loan_terms(kind, loan_id):
+    """(name, principal, annual rate, tenure, start date) of the current user's personal or business loan, or None."""
+    model = {'personal': Loan, 'business': BusinessLoan}.get(kind)
+    loan = db.session.get(model, loan_id) if model else None
+    if not loan or loan.user_id != current_user.id:
+        return None
+    principal = loan.principal if kind == 'personal' else loan.principal_amount
+    return loan.loan_name, principal, loan.interest_rate, loan.tenure_months, loan.start_date
 
-    # --- 2. Savings Goal Predictor ---
-    try:
-        balance = df['amount'].sum()
-        target = 100000  # example savings goal
-        daily_avg = df['amount'].mean()
-        if daily_avg > 0:
-            days_needed = (target - balance) / daily_avg
-            if days_needed > 0:
-                reach_date = datetime.now() + timedelta(days=int(days_needed))
-                insights.append(f"At current rate, you may reach ₹{target:,.0f} savings by {reach_date.strftime('%d %b %Y')}.")
-    except:
-        insights.append("Could not predict savings goal timeline.")
-
-    # --- 3. Category-wise Spending Forecast ---
+@app.route('/api/loans/<kind>/<int:loan_id>/schedule')
+@login_required
+def loan_schedule(kind, loan_id):
+    """Amortization schedule of a loan, with its balance and interest paid as of `?on=YYYY-MM-DD` (default today)."""
+    terms = _owned_loan_terms(kind, loan_id)
+    if terms is None:
+        return jsonify({'error': 'Loan not found'}), 404
+    name, principal, rate, tenure, start_date = terms
     try:
-        expense_categories = df[df['amount'] < 0].groupby('category')['amount'].sum().abs()
-
-        # Fetch EMI total from Loan model (correct field name: emi_amount)
-        from models import Loan
-        loans = Loan.query.filter_by(user_id=current_user.id).all()
-        emi_total = sum([loan.emi_amount for loan in loans])
-        if emi_total > 0:
-            expense_categories['EMI'] = emi_total
-
-        if not expense_categories.empty:
-            top_category = expense_categories.sort_values(ascending=False).index[0]
-            top_value = expense_categories.max()
-            insights.append(f"Next month's largest expense is likely to be '{top_category}' at around ₹{top_value:.2f}.")
-    except Exception as e:
-        insights.append("Spending forecast unavailable.")
-
-    # --- 4. Financial Health Indicator ---
+        on_date = datetime.strptime(request.args['on'], '%Y-%m-%d').date() if request.args.get('on') else date.today()
+    except ValueError:
+        return jsonify({'error': 'Invalid date; use YYYY-MM-DD'}), 400
+
+    schedule = {key: value[0] if value.ndim > 1 else value for key, value in amortization.schedules(principal, rate, tenure).items()}
+    paid = int(amortization.payments_made(start_date, tenure, on_date))
+    return jsonify({
+        'loan_name': name, 'emi': float(amortization.emi(principal, rate, tenure)),
+        'as_of': {'date': on_date.isoformat(), 'payments_made': paid,
+                  'balance': float(amortization.balance_after(principal, rate, tenure, paid)),
+                  'interest_paid': float(amortization.interest_paid(principal, rate, tenure, paid))},
+        'dates': [d.isoformat() for d in amortization.payment_dates(start_date, schedule['month'])],
+        **{key: schedule[key].tolist() for key in ('payment', 'interest', 'principal', 'balance')},
+    })
+
+@app.route('/api/loans/<kind>/<int:loan_id>/simulate', methods=['POST'])
+@login_required
+def simulate_loan(kind, loan_id):
+    """
+    What-if for a loan: `prepayments` and `rate_changes` as {month number: amount
+    or annual rate}, and `reduce` ('tenure' or 'emi'). Returns the simulated
+    schedule and what it saves against the loan as it stands.
+    """
+    terms = _owned_loan_terms(kind, loan_id)
+    if terms is None:
+        return jsonify({'error': 'Loan not found'}), 404
+    name, principal, rate, tenure, start_date = terms
+    params = request.get_json(silent=True) or {}
     try:
-        income_total = df[df['amount'] > 0]['amount'].sum()
-        expense_total = abs(df[df['amount'] < 0]['amount'].sum())
-        expense_ratio = expense_total / (income_total + 1e-5)
-        if expense_ratio < 0.5:
-            health = "Good"
-        elif expense_ratio < 0.8:
-            health = "Moderate"
-        else:
-            health = "Risky"
-        insights.append(f"AI Financial Health: {health}.")
-    except:
-        insights.append("Could not assess financial health.")
-
-    return jsonify({'insights': insights})
-
-def generate_personal_pdf_report(data):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font('Helvetica', 'B', 18)
-    pdf.cell(0, 10, 'Income & Expense Report', 0, 1, 'C')
-    pdf.set_font('Helvetica', '', 12)
-    pdf.cell(0, 10, f"For the period: {data['start_date']} to {data['end_date']}", 0, 1, 'C')
-    pdf.ln(10)
-    pdf.set_font('Helvetica', 'B', 14)
-    pdf.cell(0, 10, 'Summary', 0, 1)
-    pdf.set_font('Helvetica', '', 12)
-    pdf.cell(95, 10, 'Total Income:', 1, 0)
-    pdf.cell(95, 10, f"Rs. {data['total_income']:.2f}", 1, 1, 'R')
-    pdf.cell(95, 10, 'Total Expense:', 1, 0)
-    pdf.cell(95, 10, f"Rs. {data['total_expense']:.2f}", 1, 1, 'R')
-    pdf.set_font('Helvetica', 'B', 12)
-    pdf.cell(95, 10, 'Net Savings:', 1, 0)
-    pdf.cell(95, 10, f"Rs. {data['net_savings']:.2f}", 1, 1, 'R')
-    pdf.ln(10)
-    if data['expenses_by_category']:
-        pdf.set_font('Helvetica', 'B', 14)
-        pdf.cell(0, 10, 'Expense Breakdown by Category', 0, 1)
-        pdf.set_font('Helvetica', 'B', 12)
-        pdf.cell(95, 10, 'Category', 1, 0)
-        pdf.cell(95, 10, 'Amount', 1, 1, 'C')
-        pdf.set_font('Helvetica', '', 12)
-        for category, amount in data['expenses_by_category'].items():
-            pdf.cell(95, 10, f"  {category}", 1, 0)
-            pdf.cell(95, 10, f"Rs. {amount:.2f}", 1, 1, 'R')
-    return pdf.output(dest='S').encode('latin-1')
-
-def generate_personal_csv_report(data):
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Income & Expense Report'])
-    writer.writerow(['Period', f"{data['start_date']} to {data['end_date']}"])
-    writer.writerow([]); writer.writerow(['Metric', 'Amount (Rs.)'])
-    writer.writerow(['Total Income', data['total_income']])
-    writer.writerow(['Total Expense', data['total_expense']])
-    writer.writerow(['Net Savings', data['net_savings']])
-    writer.writerow([]); writer.writerow(['Expense Breakdown by Category'])
-    writer.writerow(['Category', 'Amount (Rs.)'])
-    for category, amount in data['expenses_by_category'].items():
-        writer.writerow([category, amount])
-    return output.getvalue()
+        prepayments = {int(month): float(amount) for month, amount in (params.get('prepayments') or {}).items()}
+        rate_changes = {int(month): float(new_rate) for month, new_rate in (params.get('rate_changes') or {}).items()}
+    except (AttributeError, TypeError, ValueError):
+        return jsonify({'error': 'prepayments and rate_changes must map month numbers to numbers'}), 400
+    reduce = params.get('reduce', 'tenure')
+    if reduce not in ('tenure', 'emi'):
+        return jsonify({'error': "reduce must be 'tenure' or 'emi'"}), 400
+
+    baseline = amortization.schedule_summary(amortization.simulate(principal, rate, tenure))
+    schedule = amortization.simulate(principal, rate, tenure, prepayments, rate_changes, reduce)
+    simulated = amortization.schedule_summary(schedule)
+    return jsonify({
+        'loan_name': name, 'baseline': baseline, 'simulated': simulated,
+        'interest_saved': baseline['total_interest'] - simulated['total_interest'],
+        'months_saved': baseline['months'] - simulated['months'],
+        'dates': [d.isoformat() for d in amortization.payment_dates(start_date, schedule['month'])],
+        **{key: schedule[key].tolist() for key in ('payment', 'interest', 'principal', 'prepayment', 'balance')},
+    })
 
+@app.route('/ai_insights')
+@login_required
+def ai_insights():
+    return jsonify({'insights': personal_insights(current_user.id)})
 
 # app.py (REPLACE your old /reports route)
 @app.route('/reports', methods=['GET', 'POST'])
@@ -1919,138 +1810,189 @@ def reports():
             start_date = datetime.strptime(request.form.get('start_date'), '%Y-%m-%d').date()
             end_date = datetime.strptime(request.form.get('end_date'), '%Y-%m-%d').date()
             report_format = request.form.get('format')
+            report_type = request.form.get('report_type', 'summary')
 
-            transactions = Transaction.query.filter(
-                Transaction.user_id == current_user.id,
-                Transaction.date.between(start_date, end_date)
-            ).all()
-
-            total_income = sum(t.amount for t in transactions if t.type == 'income')
-            total_expense = sum(t.amount for t in transactions if t.type == 'expense')
-            expenses_by_category = {}
-            for t in transactions:
-                if t.type == 'expense':
-                    expenses_by_category[t.category.name] = expenses_by_category.get(t.category.name, 0) + t.amount
-
-            report_data = {
-                'start_date': start_date.strftime('%d %b %Y'), 'end_date': end_date.strftime('%d %b %Y'),
-                'total_income': total_income, 'total_expense': total_expense,
-                'net_savings': total_income - total_expense, 'expenses_by_category': expenses_by_category
-            }
-
-            if report_format == 'pdf':
-                pdf_data = generate_personal_pdf_report(report_data)
-                return Response(pdf_data, mimetype='application/pdf', headers={'Content-Disposition': 'attachment;filename=personal_report.pdf'})
-            elif report_format == 'csv':
-                csv_data = generate_personal_csv_report(report_data)
-                return Response(csv_data, mimetype='text/csv', headers={'Content-Disposition': 'attachment;filename=personal_report.csv'})
+            error = validate_report(report_type, report_format, start_date, end_date)
+            if error:
+                flash(error, 'danger')
+                return redirect(url_for('reports'))
+
+            # Rendered in the background; an unchanged ledger reuses the file from last time
+            artifact = request_report(app.config['REPORT_ARTIFACT_DIR'], current_user.id, 'personal',
+                                      start_date, end_date, report_format, report_type)
+            if artifact.status == 'pending':
+                background_jobs.mark_dirty('report_artifact', artifact.id, delay=0)
+            return render_template('reports.html', today=date.today().strftime('%Y-%m-%d'),
+                                   report_types=REPORT_TYPES, artifact=artifact)
 
         except Exception as e:
             flash(f'An error occurred: {e}', 'danger')
 
-    return render_template('reports.html', today=date.today().strftime('%Y-%m-%d'))
+    return render_template('reports.html', today=date.today().strftime('%Y-%m-%d'), report_types=REPORT_TYPES)
+
+@app.route('/reports/artifact/<int:artifact_id>')
+@login_required
+def report_artifact_status(artifact_id):
+    """Polled by the report pages while a report renders."""
+    artifact = db.session.get(ReportArtifact, artifact_id)
+    if not artifact or artifact.user_id != current_user.id:
+        return jsonify({'status': 'missing'}), 404
+    if artifact.status == 'pending':
+        # Re-queue in case the worker that had it went away; coalesced if it's already scheduled
+        background_jobs.mark_dirty('report_artifact', artifact.id, delay=0)
+    return jsonify({'status': artifact.status, 'error': artifact.error,
+                    'download_url': url_for('download_report', artifact_id=artifact.id) if artifact.status == 'ready' else None})
+
+@app.route('/reports/download/<int:artifact_id>')
+@login_required
+def download_report(artifact_id):
+    artifact = db.session.get(ReportArtifact, artifact_id)
+    if not artifact or artifact.user_id != current_user.id or artifact.status != 'ready':
+        flash('Report not found or not ready yet.', 'danger')
+        return redirect(url_for('business_reports' if artifact and artifact.ledger == 'business' else 'reports'))
+    path = os.path.abspath(artifact_path(app.config['REPORT_ARTIFACT_DIR'], artifact))
+    return send_file(path, mimetype=MIMETYPES[artifact.format], as_attachment=True, download_name=download_name(artifact))
 
 # --- AI/ML Routes ---
 
 @app.route('/train_model')
 @login_required
 def train_model():
-    transactions = Transaction.query.filter_by(user_id=current_user.id, type='expense').all()
-    if len(transactions) < 10: # Need enough data to train
-        return jsonify({'status': 'not_enough_data'})
-
-    df = pd.DataFrame([(t.description, t.category) for t in transactions], columns=['description', 'category'])
-    
-    model = make_pipeline(TfidfVectorizer(), MultinomialNB())
-    model.fit(df['description'], df['category'])
-    
-    # Save the trained model for the user
-    joblib.dump(model, f'user_{current_user.id}_category_model.pkl')
-    
-    return jsonify({'status': 'success'})
+    # Retraining is a background job; this only asks for it to run soon
+    background_jobs.mark_dirty('category', current_user.id)
+    return jsonify({'status': 'scheduled'}), 202
 
 @app.route('/predict_category', methods=['POST'])
 @login_required
 def predict_category():
     description = request.json['description']
-    try:
-        model = joblib.load(f'user_{current_user.id}_category_model.pkl')
-        prediction_name = model.predict([description])[0]
-        
-        # New logic: Find the category ID for the predicted name
-        predicted_category = Category.query.filter_by(user_id=current_user.id, name=prediction_name).first()
-        
-        if predicted_category:
-            return jsonify({'category_id': predicted_category.id})
-        else:
-            # Fallback if the predicted category name doesn't exist for the user
-            return jsonify({'category_id': None})
-            
-    except FileNotFoundError:
-        return jsonify({'category_id': None}) # Default if model doesn't exist
+    return jsonify({'category_id': predict_user_category(current_user.id, 'category', description)})
 
 @app.route('/predict_balance')
 @login_required
 def predict_balance():
-    try:
-        # Fetch user's transaction data
-        transactions = Transaction.query.filter_by(user_id=current_user.id).order_by(Transaction.date.asc()).all()
-
-        # If no transactions, return empty prediction
-        if not transactions:
-            return jsonify({"prediction": [], "model": "No data available"})
-
-        # Prepare DataFrame
-        df = pd.DataFrame([{
-            "date": t.date,
-            "balance": t.amount if t.type == 'income' else -t.amount
-        } for t in transactions])
-
-        # Convert to datetime for consistency
-        df['date'] = pd.to_datetime(df['date'], errors='coerce')
-        df = df.groupby('date').sum().reset_index()  # daily balance sum
-
-        # Prophet requires columns ds (date) and y (value)
-        df_prophet = df.rename(columns={"date": "ds", "balance": "y"})
+    return jsonify(cached_forecast('balance', current_user.id))
+
+
+# --- CLI Commands ---
+
+@app.cli.command('rebuild-gains-ledger')
+@click.option('--user-id', type=int, default=None, help='Only rebuild this user (default: everyone).')
+def rebuild_gains_ledger_command(user_id):
+    """Rebuilds the per-FY capital gains ledger from sold investment history."""
+    rows = rebuild_ledger(user_id)
+    click.echo(f"Capital gains ledger rebuilt: {rows} rows written.")
+
+
+@app.cli.command('snapshot-net-worth')
+def snapshot_net_worth_command():
+    """Writes today's net worth snapshot for every user. Meant to run nightly (e.g. from cron)."""
+    def progress(done, total):
+        if done == total or done % 100 == 0:
+            click.echo(f"  {done}/{total} users")
+    count = snapshot_all_users(market_data_provider, progress=progress)
+    click.echo(f"Net worth snapshots written for {count} users.")
+
+
+@app.cli.command('forecast-all')
+@click.option('--workers', type=int, default=None, help='Worker processes (default: FORECAST_BATCH_WORKERS).')
+@click.option('--kind', type=click.Choice(['all'] + list(FORECAST_KINDS)), default='all')
+@click.option('--force', is_flag=True, help='Refit every user, not only those whose forecasts are missing or stale.')
+def forecast_all_command(workers, kind, force):
+    """Refreshes stored forecasts for all users across a process pool."""
+    workers = workers or app.config['FORECAST_BATCH_WORKERS']
+    kinds = list(FORECAST_KINDS) if kind == 'all' else [kind]
+
+    def progress(done, elapsed):
+        if done % 100 == 0:
+            click.echo(f"  {done} forecasts, {done / elapsed:.1f}/s")
+
+    click.echo(f"Refreshing {', '.join(kinds)} forecasts with {workers} workers...")
+    stats = batch_refresh_forecasts(kinds, workers, budget_ms=app.config['FORECAST_BACKGROUND_BUDGET_MS'],
+                                    force=force, progress=progress)
+    models_used = ', '.join(f"{name}: {count}" for name, count in sorted(stats['by_model'].items())) or 'none'
+    click.echo(f"Done: {stats['fitted']} forecasts in {stats['elapsed']:.1f}s "
+               f"({stats['per_second']:.2f}/s, {stats['errors']} errors). Models: {models_used}.")
+    if stats['fitted']:
+        click.echo(f"Mean fit time {stats['fit_seconds'] / stats['fitted']:.2f}s per forecast, "
+                   f"parallel speed-up {stats['fit_seconds'] / stats['elapsed']:.1f}x.")
+
+
+@app.cli.command('export-parquet')
+@click.option('--out', 'directory', default='exports', show_default=True, help='Directory to write the files to.')
+@click.option('--table', type=click.Choice(['all'] + list(PARQUET_EXPORTS)), default='all')
+@click.option('--user-id', type=int, default=None, help='Only export this user (default: everyone).')
+@click.option('--row-group-size', type=int, default=PARQUET_ROW_GROUP_SIZE, show_default=True)
+def export_parquet_command(directory, table, user_id, row_group_size):
+    """Exports transactions, business transactions, sold investments and budgets as Parquet files."""
+    started = time.perf_counter()
+    written = export_all(directory, tables=None if table == 'all' else [table], user_id=user_id,
+                         row_group_size=row_group_size,
+                         progress=lambda name, path, rows: click.echo(f"  {name}: {rows} rows -> {path}"))
+    click.echo(f"Exported {sum(rows for _, rows in written.values())} rows in {time.perf_counter() - started:.1f}s.")
+
+
+@app.cli.command('month-end-statements')
+@click.option('--month', default=None, help='Statement month as YYYY-MM (default: last month).')
+@click.option('--workers', type=int, default=None, help='Worker processes (default: STATEMENT_BATCH_WORKERS).')
+@click.option('--ledger', type=click.Choice(['all'] + list(REPORT_LEDGERS)), default='all')
+@click.option('--format', 'formats', type=click.Choice(['pdf', 'csv', 'json']), multiple=True,
+              help='Formats to render; repeatable (default: pdf and csv).')
+def month_end_statements_command(month, workers, ledger, formats):
+    """Renders month-end statements for every user across a process pool. Safe to re-run after an interruption."""
+    if month:
+        year, month = (int(part) for part in month.split('-'))
+    else:
+        last_month = date.today().replace(day=1) - timedelta(days=1)
+        year, month = last_month.year, last_month.month
+    workers = workers or app.config['STATEMENT_BATCH_WORKERS']
+
+    def progress(stats, elapsed):
+        if (stats['rendered'] + stats['errors']) % 100 == 0:
+            click.echo(f"  {stats['rendered']} rendered, {stats['skipped']} already done, "
+                       f"{stats['errors']} errors, {stats['rendered'] / elapsed:.1f}/s")
+
+    click.echo(f"Rendering {year}-{month:02d} statements with {workers} workers...")
+    stats = month_end_statements(app.config['REPORT_ARTIFACT_DIR'], year, month, workers,
+                                 ledgers=None if ledger == 'all' else [ledger], formats=formats or ('pdf', 'csv'),
+                                 progress=progress)
+    click.echo(f"Done: {stats['rendered']} statements in {stats['elapsed']:.1f}s ({stats['per_second']:.2f}/s), "
+               f"{stats['skipped']} already up to date, {stats['errors']} errors.")
+
+
+@app.cli.command('train-global-category-model')
+@click.option('--kind', type=click.Choice(['all'] + list(CATEGORY_SOURCES)), default='all')
+def train_global_category_model_command(kind):
+    """Trains the shared category model(s) used for new users and blended into personal predictions."""
+    for model_kind in (CATEGORY_SOURCES if kind == 'all' else [kind]):
+        started = time.perf_counter()
+        rows = retrain_global_category_model(model_kind)
+        if rows:
+            click.echo(f"global/{model_kind}: trained on {rows} transactions in {time.perf_counter() - started:.1f}s.")
+            # Users this small are now served by the shared model alone
+            dropped = sum(online_category_models.delete(f'user_{user_id}/{model_kind}')
+                          for user_id in users_below(model_kind, PERSONAL_MIN_SAMPLES))
+            if dropped:
+                click.echo(f"global/{model_kind}: removed {dropped} personal models below {PERSONAL_MIN_SAMPLES} transactions.")
+        else:
+            click.echo(f"global/{model_kind}: no category is shared by {GLOBAL_MIN_USERS}+ users yet; nothing trained.")
 
-        prediction = []
-        used_model = ""
 
-        # --- Try Prophet ---
-        try:
-            if len(df_prophet) >= 2:
-                model = Prophet()
-                model.fit(df_prophet)
-                future = model.make_future_dataframe(periods=30)
-                forecast = model.predict(future)
-                prediction = forecast['yhat'][-30:].tolist()
-                used_model = "Prophet"
-            else:
-                raise ValueError("Insufficient data for Prophet")
-
-        # --- Fallback: RandomForest ---
-        except Exception:
-            df['date'] = pd.to_datetime(df['date'], errors='coerce')
-            df = df.dropna(subset=['date'])
-
-            if len(df) >= 2:
-                df['days'] = (df['date'] - df['date'].min()).dt.days
-                X = df[['days']]
-                y = df['balance']
-                rf = RandomForestRegressor(n_estimators=100, random_state=42)
-                rf.fit(X, y)
-
-                future_days = np.arange(df['days'].max() + 1, df['days'].max() + 31).reshape(-1, 1)
-                prediction = rf.predict(future_days).tolist()
-                used_model = "RandomForest"
-            else:
-                prediction = []
-                used_model = "Insufficient data"
+@app.cli.command('repair-business-metrics')
+@click.option('--user-id', type=int, default=None, help='Only repair this user (default: everyone).')
+def repair_business_metrics_command(user_id):
+    """Recomputes this month's business metrics from the transactions, should the stored totals ever drift."""
+    count = repair_metrics(user_id)
+    click.echo(f"Business metrics recomputed for {count} users.")
 
-        return jsonify({"prediction": prediction, "model": used_model})
 
-    except Exception as e:
-        return jsonify({"prediction": [], "model": f"Error: {str(e)}"})
+@app.cli.command('rebuild-anomaly-stats')
+@click.option('--user-id', type=int, default=None, help='Only reset this user (default: everyone).')
+def rebuild_anomaly_stats_command(user_id):
+    """Drops stored anomaly statistics; they are re-seeded from history on the next scored transaction."""
+    count = reset_stats(user_id)
+    db.session.commit()
+    click.echo(f"Anomaly statistics reset: {count} rows removed.")
 
 
 if __name__ == '__main__':
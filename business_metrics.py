@@ -0,0 +1,164 @@
+# business_metrics.py
+
+from calendar import monthrange
+from datetime import date
+
+from sqlalchemy import case, event, func, inspect, update
+from sqlalchemy.orm import Session
+
+from models import db, BusinessMetrics, BusinessTransaction
+
+# Columns whose changes move a transaction's contribution to the monthly totals
+TRACKED_COLUMNS = ('user_id', 'type', 'amount', 'date')
+TOTAL_COLUMN = {'revenue': 'monthly_revenue', 'expense': 'monthly_expenses'}
+
+_TOUCHED_KEY = 'business_metrics_touched'
+
+
+def current_period(today=None):
+    today = today or date.today()
+    return today.year, today.month
+
+
+def month_totals(session, user_id, year, month):
+    """(revenue, expenses) of the user's business transactions in the month, from the database."""
+    totals = dict(session.query(BusinessTransaction.type, func.sum(BusinessTransaction.amount)).filter(
+        BusinessTransaction.user_id == user_id,
+        BusinessTransaction.date.between(date(year, month, 1), date(year, month, monthrange(year, month)[1])),
+    ).group_by(BusinessTransaction.type).all())
+    return totals.get('revenue') or 0.0, totals.get('expense') or 0.0
+
+
+def _set_totals(metrics, revenue, expenses, period):
+    metrics.period_year, metrics.period_month = period
+    metrics.monthly_revenue = revenue
+    metrics.monthly_expenses = expenses
+    metrics.net_profit = revenue - expenses
+    metrics.profit_margin = (revenue - expenses) / revenue * 100 if revenue > 0 else 0
+
+
+def recompute_metrics(user_id, today=None):
+    """Rebuilds the user's metrics row for the current month from their transactions. The caller commits."""
+    period = current_period(today)
+    metrics = BusinessMetrics.query.filter_by(user_id=user_id).first()
+    if metrics is None:
+        metrics = BusinessMetrics(user_id=user_id)
+        db.session.add(metrics)
+    _set_totals(metrics, *month_totals(db.session, user_id, *period), period)
+    return metrics
+
+
+def current_metrics(user_id):
+    """
+    The user's metrics for this month. Normally a single-row read; the row is
+    only rebuilt (and committed) when it is missing or still holds last month.
+    """
+    metrics = BusinessMetrics.query.filter_by(user_id=user_id).first()
+    if metrics is None or (metrics.period_year, metrics.period_month) != current_period():
+        metrics = recompute_metrics(user_id)
+        db.session.commit()
+    return metrics
+
+
+def repair_metrics(user_id=None):
+    """Recomputes metrics rows from the transactions (one user, or everyone with business data). Commits."""
+    if user_id is not None:
+        user_ids = [user_id]
+    else:
+        user_ids = {uid for uid, in db.session.query(BusinessTransaction.user_id).distinct()}
+        user_ids |= {uid for uid, in db.session.query(BusinessMetrics.user_id)}
+    for uid in sorted(user_ids):
+        recompute_metrics(uid)
+    db.session.commit()
+    return len(user_ids)
+
+
+# --- Write-through from the transaction write paths ---
+
+def _committed(session, obj):
+    """Values of the tracked columns as last flushed, before pending changes."""
+    state = inspect(obj)
+    values = {}
+    for key in TRACKED_COLUMNS:
+        history = state.attrs[key].history
+        if history.deleted:
+            values[key] = history.deleted[0]
+        elif history.unchanged:
+            values[key] = history.unchanged[0]
+        elif key not in state.unloaded and not history.added:
+            values[key] = getattr(obj, key)
+    if len(values) < len(TRACKED_COLUMNS):
+        # Set without having been loaded first: the old values are only in the database
+        with session.no_autoflush:
+            row = session.query(*(getattr(BusinessTransaction, key) for key in TRACKED_COLUMNS)) \
+                .filter(BusinessTransaction.id == state.identity[0]).one()
+        values = dict(zip(TRACKED_COLUMNS, row))
+    return values
+
+
+def _contribution(deltas, values, sign):
+    if values['type'] in TOTAL_COLUMN and values['date'] is not None and values['amount'] is not None:
+        key = (values['user_id'], values['date'].year, values['date'].month)
+        totals = deltas.setdefault(key, {'monthly_revenue': 0.0, 'monthly_expenses': 0.0})
+        totals[TOTAL_COLUMN[values['type']]] += sign * values['amount']
+
+
+@event.listens_for(Session, 'before_flush')
+def _apply_metric_deltas(session, flush_context, instances):
+    """
+    Moves this month's BusinessMetrics totals by what the flush adds, removes
+    or changes, so the financials page never has to scan transactions.
+    """
+    deltas = {}
+    for obj in session.new:
+        if isinstance(obj, BusinessTransaction):
+            _contribution(deltas, {key: getattr(obj, key) for key in TRACKED_COLUMNS}, +1)
+    for obj in session.deleted:
+        if isinstance(obj, BusinessTransaction):
+            _contribution(deltas, _committed(session, obj), -1)
+    for obj in session.dirty:
+        if isinstance(obj, BusinessTransaction) and any(inspect(obj).attrs[key].history.has_changes()
+                                                        for key in TRACKED_COLUMNS):
+            _contribution(deltas, _committed(session, obj), -1)
+            _contribution(deltas, {key: getattr(obj, key) for key in TRACKED_COLUMNS}, +1)
+
+    # Only the current month is stored; other months are picked up if they are ever rebuilt
+    period = current_period()
+    deltas = {user_id: totals for (user_id, year, month), totals in deltas.items()
+              if user_id is not None and (year, month) == period}
+    if not deltas:
+        return
+
+    with session.no_autoflush:
+        for user_id, totals in deltas.items():
+            metrics = session.query(BusinessMetrics).filter_by(user_id=user_id).first()
+            if metrics is None or (metrics.period_year, metrics.period_month) != period:
+                # Missing or last month's row: rebuild from what is already in the database, plus this flush
+                if metrics is None:
+                    metrics = BusinessMetrics(user_id=user_id)
+                    session.add(metrics)
+                revenue, expenses = month_totals(session, user_id, *period)
+                _set_totals(metrics, revenue + totals['monthly_revenue'], expenses + totals['monthly_expenses'], period)
+            else:
+                # Increment in SQL so concurrent writers can't lose an update
+                metrics.monthly_revenue = BusinessMetrics.monthly_revenue + totals['monthly_revenue']
+                metrics.monthly_expenses = BusinessMetrics.monthly_expenses + totals['monthly_expenses']
+                session.info.setdefault(_TOUCHED_KEY, set()).add(user_id)
+
+
+@event.listens_for(Session, 'after_flush')
+def _refresh_derived_metrics(session, flush_context):
+    """Net profit and margin follow the incremented totals, computed from them in the same statement."""
+    user_ids = session.info.pop(_TOUCHED_KEY, None)
+    if not user_ids:
+        return
+    revenue, expenses = BusinessMetrics.monthly_revenue, BusinessMetrics.monthly_expenses
+    session.execute(
+        update(BusinessMetrics).where(BusinessMetrics.user_id.in_(user_ids)).values(
+            net_profit=revenue - expenses,
+            profit_margin=case((revenue > 0, (revenue - expenses) / revenue * 100), else_=0.0),
+        ).execution_options(synchronize_session=False)
+    )
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, BusinessMetrics) and obj.user_id in user_ids:
+            session.expire(obj, ['net_profit', 'profit_margin'])
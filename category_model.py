@@ -0,0 +1,113 @@
+# category_model.py
+
+import re
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.naive_bayes import MultinomialNB
+
+
+# The shared model only learns categories at least this many users have, so it never
+# carries one user's custom category names, and its size stays bounded
+GLOBAL_MIN_USERS = 3
+GLOBAL_MAX_CLASSES = 100
+# How many of their own examples a user needs before their model counts as much as the shared one
+PERSONALIZATION_PRIOR = 20
+# Without a personal model, only suggest when the shared model is reasonably sure
+GLOBAL_MIN_CONFIDENCE = 0.6
+# Per-user models only need to tell a few categories apart in one user's vocabulary
+PERSONAL_N_FEATURES = 2**10
+# Once there is a shared model, users with fewer labelled transactions than this get no model of
+# their own: at that size it would carry little weight in the blend, yet cost a stored model per user
+PERSONAL_MIN_SAMPLES = 50
+
+
+def normalize_category(name):
+    """'Food & Dining ' -> 'food dining': the form category names are compared in across users."""
+    return re.sub(r'[^a-z0-9]+', ' ', (name or '').lower()).strip()
+
+
+class OnlineCategoryClassifier:
+    """
+    Description -> category name classifier that can learn one transaction at a time.
+
+    A HashingVectorizer needs no fitted vocabulary, so a new example only touches
+    MultinomialNB's per-class counts: updates cost the same whether the user has
+    ten transactions or ten thousand. The class list is fixed when the model is
+    built; `learn_one` returns False for an unseen category, which is the cue for
+    a full rebuild (see `fit`), also used as periodic compaction.
+    """
+
+    def __init__(self, classes, n_features=2**13, alpha=0.1):
+        self.classes = np.array(sorted(set(classes)), dtype=object)
+        self.vectorizer = HashingVectorizer(n_features=n_features, alternate_sign=False, lowercase=True)
+        self.model = MultinomialNB(alpha=alpha)
+        self.n_samples = 0
+        self.online_updates = 0  # learn_one calls since the last full rebuild
+
+    @classmethod
+    def fit(cls, descriptions, labels, classes=None, **kwargs):
+        """Builds a model from a user's full history. `classes` may include categories with no examples yet."""
+        classifier = cls(set(labels) | set(classes or ()), **kwargs)
+        classifier.partial_fit(descriptions, labels)
+        return classifier
+
+    def knows(self, label):
+        return label in set(self.classes)
+
+    def partial_fit(self, descriptions, labels):
+        if not len(descriptions):
+            return True
+        known = set(self.classes)
+        if any(label not in known for label in labels):
+            return False
+        X = self.vectorizer.transform(descriptions)
+        self.model.partial_fit(X, np.asarray(labels, dtype=object), classes=self.classes)
+        self.n_samples += len(descriptions)
+        return True
+
+    def learn_one(self, description, label):
+        if not self.partial_fit([description], [label]):
+            return False
+        self.online_updates += 1
+        return True
+
+    def predict(self, descriptions):
+        return self.model.predict(self.vectorizer.transform(descriptions))
+
+    def predict_proba(self, descriptions):
+        return self.model.predict_proba(self.vectorizer.transform(descriptions))
+
+
+def suggest_category(description, category_names, user_model=None, global_model=None,
+                     prior_strength=PERSONALIZATION_PRIOR, min_confidence=GLOBAL_MIN_CONFIDENCE):
+    """
+    Picks one of the user's `category_names` for `description`, or None.
+
+    The shared model's probabilities are mapped onto the user's categories by
+    normalized name and renormalized over them; the user's own model is blended
+    in with weight n / (n + prior_strength), so it takes over as they label more
+    transactions. New users get suggestions from the shared model alone.
+    """
+    if not category_names:
+        return None
+    scores = np.zeros(len(category_names))
+    shared = np.zeros(len(category_names))
+    user_weight = 0.0
+
+    if user_model is not None:
+        user_weight = user_model.n_samples / (user_model.n_samples + prior_strength)
+        proba = dict(zip(user_model.classes, user_model.predict_proba([description])[0]))
+        scores += user_weight * np.array([proba.get(name, 0.0) for name in category_names])
+
+    if global_model is not None:
+        proba = dict(zip(global_model.classes, global_model.predict_proba([description])[0]))
+        shared = np.array([proba.get(normalize_category(name), 0.0) for name in category_names])
+        if shared.sum() > 0:
+            scores += (1 - user_weight) * shared / shared.sum()
+
+    best = int(np.argmax(scores))
+    # Judged before renormalizing: a user with only one matching category would otherwise always pass
+    if scores[best] <= 0 or (user_model is None and shared[best] < min_confidence):
+        return None
+    return category_names[best]
@@ -0,0 +1,79 @@
+# category_training.py
+
+from collections import Counter
+
+from sqlalchemy import func
+
+from models import db, Category, Transaction, BusinessTransaction
+from category_model import (OnlineCategoryClassifier, GLOBAL_MAX_CLASSES, GLOBAL_MIN_USERS, PERSONAL_N_FEATURES,
+                            normalize_category)
+
+# kind -> (transaction model, expenses only, ledger)
+CATEGORY_SOURCES = {
+    'category': (Transaction, True, 'personal'),
+    'business_category': (BusinessTransaction, False, 'business'),
+}
+
+# Fewest labelled transactions a per-user model is built from when there is no shared model to fall back on
+USER_MIN_ROWS = {'category': 10, 'business_category': 15}
+
+
+def labelled_rows(kind):
+    """(description, category name, owner) query over every labelled transaction of `kind`."""
+    model, expenses_only, _ = CATEGORY_SOURCES[kind]
+    query = db.session.query(model.description, Category.name, Category.user_id) \
+        .join(Category, model.category_id == Category.id)
+    return query.filter(model.type == 'expense') if expenses_only else query
+
+
+def train_user_model(kind, user_id, min_rows):
+    """The user's own category model, or None when they have fewer than `min_rows` labelled transactions."""
+    rows = labelled_rows(kind).filter(Category.user_id == user_id)
+    if rows.count() < min_rows:
+        return None
+    rows = rows.all()
+    classes = [name for name, in db.session.query(Category.name).filter(Category.user_id == user_id)]
+    return OnlineCategoryClassifier.fit([d for d, _, _ in rows], [c for _, c, _ in rows], classes=classes,
+                                        n_features=PERSONAL_N_FEATURES)
+
+
+def users_below(kind, min_rows):
+    """Ids of users with some, but fewer than `min_rows`, labelled transactions of `kind`."""
+    counts = labelled_rows(kind).with_entities(Category.user_id, func.count()).group_by(Category.user_id)
+    return [user_id for user_id, count in counts if count < min_rows]
+
+
+def global_classes(kind):
+    """
+    Normalized category names the shared model learns: only those used by
+    GLOBAL_MIN_USERS or more users, most widely used first, at most GLOBAL_MAX_CLASSES.
+    Empty until enough users share a category (a new deployment has no shared model).
+    """
+    users_per_class = Counter(normalize_category(name) for name, _ in
+                              labelled_rows(kind).with_entities(Category.name, Category.user_id).distinct())
+    return [name for name, users in users_per_class.most_common(GLOBAL_MAX_CLASSES) if name and users >= GLOBAL_MIN_USERS]
+
+
+def train_global_model(kind, batch_size=5000):
+    """
+    Trains the shared category model for `kind` on every user's labelled transactions,
+    with normalized category names as classes (see global_classes). Rows are streamed
+    in batches, so memory stays flat. Returns None when no category is shared widely enough.
+    """
+    classes = global_classes(kind)
+    if not classes:
+        return None
+
+    classifier = OnlineCategoryClassifier(classes)
+    known = set(classes)
+    descriptions, labels = [], []
+    for description, name, _ in labelled_rows(kind).yield_per(batch_size):
+        label = normalize_category(name)
+        if label in known and description:
+            descriptions.append(description)
+            labels.append(label)
+        if len(descriptions) >= batch_size:
+            classifier.partial_fit(descriptions, labels)
+            descriptions, labels = [], []
+    classifier.partial_fit(descriptions, labels)
+    return classifier
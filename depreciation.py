@@ -0,0 +1,48 @@
+# depreciation.py
+
+from datetime import date
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+
+from models import db, BusinessInvestment
+
+DAYS_PER_YEAR = 365.25
+
+
+def project_values(amount_invested, useful_life_years, purchase_dates, depreciating, dates):
+    """
+    Straight-line book value of each asset (rows) on each date (columns), the
+    same rule as BusinessInvestment.current_value. Non-depreciating assets keep
+    their cost, as do assets on dates before their purchase.
+    """
+    amount = np.asarray(amount_invested, dtype=np.float64)[:, None]
+    life = np.asarray(useful_life_years, dtype=np.float64)[:, None]
+    years = (np.array(dates, dtype='datetime64[D]')[None, :]
+             - np.array(purchase_dates, dtype='datetime64[D]')[:, None]).astype(np.float64) / DAYS_PER_YEAR
+    years = np.maximum(years, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        depreciated = np.where(years >= life, 0.0, np.maximum(amount - amount / life * years, 0.0))
+    return np.where(np.asarray(depreciating)[:, None], depreciated, amount)
+
+
+def depreciation_schedule(user_id, months=60, start_date=None):
+    """Projected book value of all the user's business assets, monthly from `start_date` (default today), from one query."""
+    start_date = start_date or date.today()
+    rows = db.session.query(BusinessInvestment.id, BusinessInvestment.investment_name, BusinessInvestment.investment_type,
+                            BusinessInvestment.amount_invested, BusinessInvestment.purchase_date,
+                            BusinessInvestment.useful_life_years) \
+        .filter(BusinessInvestment.user_id == user_id).order_by(BusinessInvestment.id).all()
+    dates = [start_date + relativedelta(months=+k) for k in range(months + 1)]
+    if not rows:
+        return {'dates': [d.isoformat() for d in dates], 'assets': [], 'total': [0.0] * len(dates)}
+
+    ids, names, types, amounts, purchase_dates, lives = zip(*rows)
+    depreciating = [t != 'Financial' and bool(life) and life > 0 for t, life in zip(types, lives)]
+    values = project_values(amounts, [life or 0 for life in lives], purchase_dates, depreciating, dates)
+    return {
+        'dates': [d.isoformat() for d in dates],
+        'assets': [{'id': i, 'name': name, 'type': t, 'depreciating': dep, 'values': v.tolist()}
+                   for i, name, t, dep, v in zip(ids, names, types, depreciating, values)],
+        'total': values.sum(axis=0).tolist(),
+    }
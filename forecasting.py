@@ -0,0 +1,248 @@
+# forecasting.py
+
+import json
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date, datetime
+from itertools import groupby
+
+import numpy as np
+import pandas as pd
+from prophet import Prophet
+from sqlalchemy import case, func
+
+from models import db, Forecast, LedgerVersion, Transaction, BusinessTransaction
+from ledger_version import current_version
+from light_forecast import choose_model, daily_grid, MAX_HISTORY_DAYS
+from light_forecast import forecast as light_forecast
+
+MODEL_NAMES = {'prophet': 'Prophet', 'holt': 'Holt', 'holt_weekly': 'Holt (weekly)',
+               'seasonal_naive': 'Seasonal naive', 'naive': 'Naive'}
+
+# Latency budgets used to pick a model: requests get a forecast immediately, background fits may use Prophet
+INLINE_BUDGET_MS = 10
+BACKGROUND_BUDGET_MS = 5000
+
+# kind -> (ledger, transaction model, type counted as inflow)
+FORECAST_KINDS = {
+    'balance': ('personal', Transaction, 'income'),
+    'business_cashflow': ('business', BusinessTransaction, 'revenue'),
+}
+
+
+def load_daily_series(kind, user_id):
+    """Daily net flow for a user's ledger as a Prophet-style frame (ds, y), aggregated in the database."""
+    _, model, inflow = FORECAST_KINDS[kind]
+    signed = case((model.type == inflow, model.amount), else_=-model.amount)
+    rows = db.session.query(model.date, func.sum(signed)).filter(model.user_id == user_id) \
+        .group_by(model.date).order_by(model.date).all()
+    return pd.DataFrame({'ds': pd.to_datetime([r[0] for r in rows]), 'y': [float(r[1]) for r in rows]})
+
+
+def history_days(series):
+    """Length in days of the daily history the lightweight models would see."""
+    if series.empty:
+        return 0
+    return min((series['ds'].max() - series['ds'].min()).days + 1, MAX_HISTORY_DAYS)
+
+
+def forecast_balance(series, budget_ms):
+    """30-day balance forecast with the best model that fits the budget. Returns (payload, model name)."""
+    if series.empty:
+        return {"prediction": [], "model": "No data available"}, "No data available"
+
+    model = choose_model(history_days(series), budget_ms)
+    if model is None:
+        return {"prediction": [], "model": "Insufficient data"}, "Insufficient data"
+
+    if model == 'prophet':
+        try:
+            prophet = Prophet()
+            prophet.fit(series)
+            future = prophet.make_future_dataframe(periods=30)
+            prediction = prophet.predict(future)['yhat'][-30:].tolist()
+            return {"prediction": prediction, "model": "Prophet"}, "Prophet"
+        except Exception:
+            model = 'holt_weekly'  # fall back to the lightweight model rather than failing
+
+    _, y = daily_grid(series['ds'].values, series['y'].values)
+    prediction = light_forecast(model, y, 30)[0].tolist()
+    return {"prediction": prediction, "model": MODEL_NAMES[model]}, MODEL_NAMES[model]
+
+
+def forecast_business_cashflow(series, budget_ms):
+    """Net cash flow forecast for the next 60 days with confidence bounds. Returns (payload, model name)."""
+    if series.empty:
+        return {"error": "Not enough data for a forecast."}, "Insufficient data"
+    model = choose_model(history_days(series), budget_ms)
+    if model is None:
+        return {"error": "Not enough distinct data points for a forecast."}, "Insufficient data"
+
+    today = pd.to_datetime(date.today())
+    last_day = series['ds'].max()
+    horizon = max((today - last_day).days - 1, 0) + 60
+    if model == 'prophet':
+        prophet = Prophet(daily_seasonality=True)
+        prophet.fit(series)
+        forecast = prophet.predict(prophet.make_future_dataframe(periods=horizon))
+        dates, mean, lower, upper = forecast['ds'], forecast['yhat'], forecast['yhat_lower'], forecast['yhat_upper']
+    else:
+        _, y = daily_grid(series['ds'].values, series['y'].values)
+        mean, lower, upper = light_forecast(model, y, horizon)
+        dates = pd.Series(pd.date_range(last_day + pd.Timedelta(days=1), periods=horizon))
+
+    # We only need the data from today onwards
+    keep = (dates >= today).to_numpy()
+    return {
+        'dates': dates[keep].dt.strftime('%Y-%m-%d').tolist(),
+        'predicted_flow': np.asarray(mean)[keep].tolist(),
+        'lower_bound': np.asarray(lower)[keep].tolist(),
+        'upper_bound': np.asarray(upper)[keep].tolist()
+    }, MODEL_NAMES[model]
+
+
+FORECASTERS = {'balance': forecast_balance, 'business_cashflow': forecast_business_cashflow}
+
+
+def compute_forecast(kind, series, budget_ms=BACKGROUND_BUDGET_MS):
+    """Runs the forecaster for `kind`, turning failures into the error payload the endpoints always returned."""
+    try:
+        return FORECASTERS[kind](series, budget_ms)
+    except Exception as e:
+        if kind == 'balance':
+            return {"prediction": [], "model": f"Error: {str(e)}"}, "Error"
+        return {"error": f"An error occurred: {str(e)}"}, "Error"
+
+
+def save_forecast(user_id, kind, ledger_version, payload, model_name):
+    """Upserts the stored forecast for (user, kind). The caller commits."""
+    forecast = Forecast.query.filter_by(user_id=user_id, kind=kind).first()
+    if forecast is None:
+        forecast = Forecast(user_id=user_id, kind=kind)
+        db.session.add(forecast)
+    forecast.ledger_version = ledger_version
+    forecast.model_name = model_name
+    forecast.payload = json.dumps(payload)
+    forecast.computed_at = datetime.utcnow()
+    return forecast
+
+
+def refresh_forecast(kind, user_id, budget_ms=BACKGROUND_BUDGET_MS):
+    """Recomputes and stores one user's forecast. Background job handler."""
+    # Read the version before the data: a write that lands mid-fit leaves the result stale, not wrongly fresh
+    version = current_version(user_id, FORECAST_KINDS[kind][0])
+    payload, model_name = compute_forecast(kind, load_daily_series(kind, user_id), budget_ms)
+    save_forecast(user_id, kind, version, payload, model_name)
+    db.session.commit()
+
+
+def inline_forecast(kind, user_id, budget_ms=INLINE_BUDGET_MS, background_budget_ms=BACKGROUND_BUDGET_MS):
+    """
+    Computes a forecast within a request's latency budget. Returns (payload, complete):
+    when the background budget would pick the same model the result is stored and
+    complete; otherwise (e.g. a long history that deserves Prophet) it is a stopgap
+    and a background refresh is still needed.
+    """
+    version = current_version(user_id, FORECAST_KINDS[kind][0])
+    series = load_daily_series(kind, user_id)
+    payload, model_name = compute_forecast(kind, series, budget_ms)
+    days = history_days(series)
+    complete = choose_model(days, budget_ms) == choose_model(days, background_budget_ms)
+    if complete:
+        save_forecast(user_id, kind, version, payload, model_name)
+        db.session.commit()
+    return payload, complete
+
+
+def stored_forecast(kind, user_id):
+    """Returns (payload or None, is_stale) for the user's stored forecast."""
+    forecast = Forecast.query.filter_by(user_id=user_id, kind=kind).first()
+    if forecast is None:
+        return None, True
+    payload = json.loads(forecast.payload)
+    if kind == 'business_cashflow' and 'dates' in payload:
+        # Drop days that have passed since the forecast was computed
+        today = date.today().isoformat()
+        keep = [i for i, d in enumerate(payload['dates']) if d >= today]
+        for field in ('dates', 'predicted_flow', 'lower_bound', 'upper_bound'):
+            payload[field] = [payload[field][i] for i in keep]
+    stale = forecast.ledger_version != current_version(user_id, FORECAST_KINDS[kind][0])
+    return payload, stale
+
+
+# --- Batch refresh across all users ---
+
+def _fit_in_worker(kind, user_id, version, dates, values, budget_ms):
+    """Process pool entry point: fits one forecast from plain lists, no database access."""
+    started = time.perf_counter()
+    series = pd.DataFrame({'ds': pd.to_datetime(dates), 'y': values})
+    payload, model_name = compute_forecast(kind, series, budget_ms)
+    return kind, user_id, version, payload, model_name, time.perf_counter() - started
+
+
+def _batch_inputs(kind, force):
+    """
+    Yields (user_id, version, dates, values) for every user with transactions in the
+    ledger whose stored forecast is missing or stale (or all of them with `force`),
+    streaming one grouped query over the whole ledger.
+    """
+    ledger, model, inflow = FORECAST_KINDS[kind]
+    versions = dict(db.session.query(LedgerVersion.user_id, LedgerVersion.version).filter(LedgerVersion.ledger == ledger))
+    stored = dict(db.session.query(Forecast.user_id, Forecast.ledger_version).filter(Forecast.kind == kind))
+
+    signed = case((model.type == inflow, model.amount), else_=-model.amount)
+    query = db.select(model.user_id, model.date, func.sum(signed)) \
+        .group_by(model.user_id, model.date).order_by(model.user_id, model.date)
+    # Separate connection, so results can be committed through the session while this is still streaming
+    with db.engine.connect() as conn:
+        rows = conn.execution_options(stream_results=True, yield_per=10000).execute(query)
+        for user_id, user_rows in groupby(rows, key=lambda r: r[0]):
+            version = versions.get(user_id, 0)
+            if not force and stored.get(user_id) == version:
+                continue
+            user_rows = list(user_rows)
+            yield user_id, version, [r[1].isoformat() for r in user_rows], [float(r[2]) for r in user_rows]
+
+
+def batch_refresh_forecasts(kinds, workers, budget_ms=BACKGROUND_BUDGET_MS, force=False, progress=None, commit_every=50):
+    """
+    Refreshes forecasts for every user across a process pool. Inputs are read and
+    results written by this process; workers only fit. At most a few tasks per
+    worker are in flight so memory stays flat however many users there are.
+    Returns a summary dict with counts and throughput.
+    """
+    stats = {'fitted': 0, 'errors': 0, 'fit_seconds': 0.0, 'by_model': {}}
+    started = time.perf_counter()
+    max_in_flight = workers * 4
+
+    # spawn: the web app process may hold DB connections and ML runtime threads that must not be forked
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        in_flight = set()
+
+        def collect(done):
+            for future in done:
+                kind, user_id, version, payload, model_name, seconds = future.result()
+                save_forecast(user_id, kind, version, payload, model_name)
+                stats['fitted'] += 1
+                stats['fit_seconds'] += seconds
+                stats['by_model'][model_name] = stats['by_model'].get(model_name, 0) + 1
+                if model_name == 'Error':
+                    stats['errors'] += 1
+                if stats['fitted'] % commit_every == 0:
+                    db.session.commit()
+                if progress:
+                    progress(stats['fitted'], time.perf_counter() - started)
+
+        for kind in kinds:
+            for user_id, version, dates, values in _batch_inputs(kind, force):
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                in_flight.add(pool.submit(_fit_in_worker, kind, user_id, version, dates, values, budget_ms))
+        collect(in_flight)
+
+    db.session.commit()
+    stats['elapsed'] = time.perf_counter() - started
+    stats['per_second'] = stats['fitted'] / stats['elapsed'] if stats['elapsed'] else 0.0
+    return stats
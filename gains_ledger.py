@@ -0,0 +1,86 @@
+# gains_ledger.py
+
+from datetime import date
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from models import db, CapitalGainsLedger, SoldInvestment
+
+
+def financial_year_of(day):
+    """Indian financial years run April to March; FY 2024-25 is returned as 2024."""
+    return day.year if day.month >= 4 else day.year - 1
+
+
+def fy_label(financial_year):
+    return f"FY {financial_year}-{str(financial_year + 1)[-2:]}"
+
+
+def current_financial_year():
+    return financial_year_of(date.today())
+
+
+def record_gain(user_id, sell_date, asset_type, gain_type, capital_gain):
+    """
+    Adds one sale to the user's ledger row for that FY. The caller commits.
+    The totals are incremented in SQL so concurrent sales can't lose an update.
+    """
+    bucket = CapitalGainsLedger.query.filter_by(
+        user_id=user_id, financial_year=financial_year_of(sell_date), asset_type=asset_type, gain_type=gain_type
+    )
+    increment = {CapitalGainsLedger.total_gain: CapitalGainsLedger.total_gain + capital_gain,
+                 CapitalGainsLedger.sale_count: CapitalGainsLedger.sale_count + 1}
+    if bucket.update(increment, synchronize_session=False):
+        return
+    try:
+        # Savepoint, so losing the race to create the row doesn't roll back the caller's sale
+        with db.session.begin_nested():
+            db.session.add(CapitalGainsLedger(user_id=user_id, financial_year=financial_year_of(sell_date),
+                                              asset_type=asset_type, gain_type=gain_type,
+                                              total_gain=capital_gain, sale_count=1))
+    except IntegrityError:
+        # Another sale created the row first (the unique constraint on the bucket caught it)
+        bucket.update(increment, synchronize_session=False)
+
+
+def gains_for_year(user_id, financial_year):
+    """Returns {(asset_type, gain_type): total_gain} for one FY."""
+    rows = db.session.query(
+        CapitalGainsLedger.asset_type, CapitalGainsLedger.gain_type, CapitalGainsLedger.total_gain
+    ).filter_by(user_id=user_id, financial_year=financial_year).all()
+    return {(asset_type, gain_type): total for asset_type, gain_type, total in rows}
+
+
+def ledger_years(user_id):
+    rows = db.session.query(CapitalGainsLedger.financial_year).filter_by(user_id=user_id).distinct().all()
+    return sorted(fy for fy, in rows)
+
+
+def rebuild_ledger(user_id=None):
+    """
+    Recomputes ledger rows from SoldInvestment history (for backfilling or repair).
+    Returns the number of ledger rows written.
+    """
+    delete_query = CapitalGainsLedger.query
+    sales_query = db.session.query(
+        SoldInvestment.user_id, SoldInvestment.asset_type, SoldInvestment.gain_type, SoldInvestment.sell_date,
+        func.sum(SoldInvestment.capital_gain), func.count(SoldInvestment.id)
+    )
+    if user_id is not None:
+        delete_query = delete_query.filter_by(user_id=user_id)
+        sales_query = sales_query.filter(SoldInvestment.user_id == user_id)
+    delete_query.delete(synchronize_session=False)
+
+    totals = {}
+    for uid, asset_type, gain_type, sell_date, gain, count in sales_query.group_by(
+            SoldInvestment.user_id, SoldInvestment.asset_type, SoldInvestment.gain_type, SoldInvestment.sell_date):
+        key = (uid, financial_year_of(sell_date), asset_type, gain_type)
+        total_gain, sale_count = totals.get(key, (0.0, 0))
+        totals[key] = (total_gain + (gain or 0.0), sale_count + count)
+
+    for (uid, fy, asset_type, gain_type), (total_gain, sale_count) in totals.items():
+        db.session.add(CapitalGainsLedger(user_id=uid, financial_year=fy, asset_type=asset_type,
+                                          gain_type=gain_type, total_gain=total_gain, sale_count=sale_count))
+    db.session.commit()
+    return len(totals)
@@ -0,0 +1,112 @@
+# insight_narrative.py
+
+import hashlib
+import json
+from datetime import datetime
+
+from huggingface_hub import InferenceClient
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from models import db, BusinessTransaction, Category, InsightNarrative
+
+# Bump whenever build_prompt changes, so cached narratives written for the old prompt aren't reused
+PROMPT_VERSION = 'v1'
+
+
+def month_payload(user_id, start_date, end_date):
+    """Aggregates the prompt is built from, in one grouped query. None if the period has no transactions."""
+    rows = db.session.query(BusinessTransaction.type, Category.name, func.sum(BusinessTransaction.amount),
+                            func.count(BusinessTransaction.id)) \
+        .outerjoin(Category, BusinessTransaction.category_id == Category.id) \
+        .filter(BusinessTransaction.user_id == user_id, BusinessTransaction.date.between(start_date, end_date)) \
+        .group_by(BusinessTransaction.type, Category.name).all()
+    if not rows:
+        return None
+
+    total_revenue = sum(total for ttype, _, total, _ in rows if ttype == 'revenue')
+    total_expenses = sum(total for ttype, _, total, _ in rows if ttype == 'expense')
+    expenses_by_category = {}
+    for ttype, name, total, _ in rows:
+        if ttype == 'expense':
+            expenses_by_category[name or 'Uncategorized'] = expenses_by_category.get(name or 'Uncategorized', 0) + total
+    top_expense_category = max(expenses_by_category, key=expenses_by_category.get) if expenses_by_category else "N/A"
+
+    # Rounded as they appear in the prompt, so equal-looking months hash the same
+    return {
+        'period': start_date.strftime('%B %Y'),
+        'total_revenue': round(total_revenue, 2),
+        'total_expenses': round(total_expenses, 2),
+        'net_profit': round(total_revenue - total_expenses, 2),
+        'transaction_count': sum(count for _, _, _, count in rows),
+        'top_expense_category': top_expense_category,
+        'top_expense_amount': round(expenses_by_category.get(top_expense_category, 0), 2),
+    }
+
+
+def build_prompt(payload):
+    return f"""
+            As a friendly financial analyst, analyze the following monthly data for a small business owner and provide a concise, easy-to-understand summary in bullet points. Focus on key takeaways.
+
+            DATA FOR {payload['period']}:
+            - Total Revenue: {payload['total_revenue']:.2f}
+            - Total Expenses: {payload['total_expenses']:.2f}
+            - Net Profit/Loss: {payload['net_profit']:.2f}
+            - Total Number of Transactions: {payload['transaction_count']}
+            - Top Expense Category: {payload['top_expense_category']} with an amount of {payload['top_expense_amount']:.2f}
+
+            Based on this data, generate a short summary.
+            """
+
+
+def payload_hash(payload):
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(f"{PROMPT_VERSION}:{canonical}".encode()).hexdigest()
+
+
+def request_narrative(user_id, payload):
+    """
+    Returns the user's cached narrative for this payload, creating a pending one
+    if there is none. Failed narratives are put back to pending for another try.
+    """
+    key = payload_hash(payload)
+    narrative = InsightNarrative.query.filter_by(user_id=user_id, payload_hash=key).first()
+    if narrative is None:
+        narrative = InsightNarrative(user_id=user_id, payload_hash=key, prompt_version=PROMPT_VERSION,
+                                     payload=json.dumps(payload))
+        db.session.add(narrative)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another request created it first
+            db.session.rollback()
+            narrative = InsightNarrative.query.filter_by(user_id=user_id, payload_hash=key).first()
+    elif narrative.status == 'failed':
+        narrative.status = 'pending'
+        narrative.requested_at = datetime.utcnow()
+        db.session.commit()
+    return narrative
+
+
+def generate_narrative(narrative_id, endpoint=None, model=None, timeout=None):
+    """
+    Background job handler: calls the text-generation endpoint for a pending
+    narrative and stores the result. `endpoint` is a URL (e.g. a dedicated
+    inference endpoint or scripts/stub_inference_server.py); without one the
+    hosted `model` is used.
+    """
+    narrative = db.session.get(InsightNarrative, narrative_id)
+    if narrative is None or narrative.status != 'pending':
+        return
+
+    try:
+        client = InferenceClient(model=endpoint or model, timeout=timeout)
+        narrative.narrative = client.text_generation(build_prompt(json.loads(narrative.payload)), max_new_tokens=250)
+        narrative.status = 'ready'
+        narrative.error = None
+    except Exception as e:
+        print(f"Error generating insights: {e}")
+        narrative.status = 'failed'
+        narrative.error = str(e)
+    narrative.completed_at = datetime.utcnow()
+    db.session.commit()
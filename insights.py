@@ -0,0 +1,126 @@
+# insights.py
+
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from sqlalchemy import case, func
+
+from models import db, Category, Loan, LedgerVersion, Transaction
+from anomaly import ANOMALY_THRESHOLD
+import ledger_version  # noqa: F401 -- keeps LedgerVersion bumped on every ledger write
+
+SAVINGS_TARGET = 100000  # example savings goal
+CACHE_MAX_ENTRIES = 2048
+
+_cache = OrderedDict()  # user_id -> (cache key, insights)
+_cache_lock = threading.Lock()
+
+
+def _emi_total(user_id):
+    return db.select(func.coalesce(func.sum(Loan.emi_amount), 0.0)).where(Loan.user_id == user_id).scalar_subquery()
+
+
+def _cache_key(user_id):
+    """(ledger version, EMI total, today): everything the insights depend on besides the ledger rows."""
+    version = db.select(LedgerVersion.version).where(LedgerVersion.user_id == user_id,
+                                                     LedgerVersion.ledger == 'personal').scalar_subquery()
+    row = db.session.execute(db.select(func.coalesce(version, 0), _emi_total(user_id))).one()
+    # The savings projection is relative to today, so cached results also expire at midnight
+    return int(row[0]), float(row[1]), date.today()
+
+
+def load_ledger_frame(user_id):
+    """
+    The user's personal ledger as columns (date, signed amount, category name,
+    anomaly score) plus their total EMI, from a single query.
+    """
+    signed = case((Transaction.type == 'income', Transaction.amount), else_=-Transaction.amount)
+    rows = db.session.execute(
+        db.select(Transaction.date, signed, Category.name, Transaction.anomaly_score, _emi_total(user_id))
+        .outerjoin(Category, Transaction.category_id == Category.id)
+        .where(Transaction.user_id == user_id)
+        .order_by(Transaction.date, Transaction.id)
+    ).all()
+    if not rows:
+        return None
+    dates, amounts, categories, scores, emi = zip(*rows)
+    return {
+        'date': np.array(dates, dtype='datetime64[D]'),
+        'amount': np.array(amounts, dtype=np.float64),
+        'category': np.array([c or 'Uncategorized' for c in categories], dtype=object),
+        'anomaly_score': np.array([np.nan if s is None else s for s in scores], dtype=np.float64),
+        'emi_total': float(emi[0]),
+    }
+
+
+def compute_insights(frame):
+    """All personal insights from one ledger frame, each a vectorized pass over its columns."""
+    amount = frame['amount']
+    is_expense = amount < 0
+    insights = []
+
+    # --- 1. Anomaly Detection (scores stored when each expense was added) ---
+    flagged = np.flatnonzero(is_expense & (frame['anomaly_score'] > ANOMALY_THRESHOLD))
+    if len(flagged):
+        latest = flagged[-1]
+        insights.append(
+            f"Alert: Unusual spending detected on {frame['date'][latest].astype(object).strftime('%d %b')} "
+            f"in {frame['category'][latest]} (₹{abs(amount[latest]):.2f})."
+        )
+
+    # --- 2. Savings Goal Predictor ---
+    balance = amount.sum()
+    daily_avg = amount.mean()
+    if daily_avg > 0:
+        days_needed = (SAVINGS_TARGET - balance) / daily_avg
+        if days_needed > 0:
+            reach_date = datetime.now() + timedelta(days=int(days_needed))
+            insights.append(f"At current rate, you may reach ₹{SAVINGS_TARGET:,.0f} savings by {reach_date.strftime('%d %b %Y')}.")
+
+    # --- 3. Category-wise Spending Forecast ---
+    names, index = np.unique(frame['category'][is_expense], return_inverse=True)
+    totals = np.bincount(index, weights=-amount[is_expense], minlength=len(names))
+    if frame['emi_total'] > 0:
+        # Loan EMIs stand in for (and replace) any 'EMI' category total
+        keep = names != 'EMI'
+        names = np.append(names[keep], 'EMI')
+        totals = np.append(totals[keep], frame['emi_total'])
+    if len(totals):
+        top = int(np.argmax(totals))
+        insights.append(f"Next month's largest expense is likely to be '{names[top]}' at around ₹{totals[top]:.2f}.")
+
+    # --- 4. Financial Health Indicator ---
+    income_total = amount[~is_expense].sum()
+    expense_total = -amount[is_expense].sum()
+    expense_ratio = expense_total / (income_total + 1e-5)
+    if expense_ratio < 0.5:
+        health = "Good"
+    elif expense_ratio < 0.8:
+        health = "Moderate"
+    else:
+        health = "Risky"
+    insights.append(f"AI Financial Health: {health}.")
+
+    return insights
+
+
+def personal_insights(user_id):
+    """Insights for the user, recomputed only when their ledger, loans or the date change."""
+    key = _cache_key(user_id)
+    with _cache_lock:
+        cached = _cache.get(user_id)
+        if cached and cached[0] == key:
+            _cache.move_to_end(user_id)
+            return cached[1]
+
+    frame = load_ledger_frame(user_id)
+    insights = compute_insights(frame) if frame else ["No data available to generate insights."]
+
+    with _cache_lock:
+        _cache[user_id] = (key, insights)
+        _cache.move_to_end(user_id)
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return insights
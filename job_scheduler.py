@@ -0,0 +1,92 @@
+# job_scheduler.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DebouncedJobScheduler:
+    """
+    Runs per-user background jobs (model retraining and the like) off the request path.
+
+    `mark_dirty(kind, user_id)` asks for the job registered under `kind` to run for
+    that user after `debounce_seconds`. Triggers that arrive before it runs are
+    coalesced into the same run; triggers that arrive while it is running cause a
+    single follow-up run. At most `max_workers` jobs execute at once, each inside
+    an application context.
+    """
+
+    def __init__(self, app, max_workers=2, debounce_seconds=30):
+        self.app = app
+        self.max_workers = max_workers
+        self.debounce_seconds = debounce_seconds
+        self._handlers = {}
+        self._due = {}  # (kind, user_id) -> monotonic time it should run
+        self._running = set()
+        self._rerun = set()
+        self._cond = threading.Condition()
+        self._executor = None
+        self._dispatcher = None
+
+    def register(self, kind, handler):
+        self._handlers[kind] = handler
+
+    def mark_dirty(self, kind, user_id, delay=None):
+        if kind not in self._handlers:
+            raise KeyError(f"No background job registered for '{kind}'")
+        key = (kind, user_id)
+        with self._cond:
+            self._ensure_started()
+            if key in self._running:
+                self._rerun.add(key)
+            elif key not in self._due:
+                self._due[key] = time.monotonic() + (self.debounce_seconds if delay is None else delay)
+                self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return {'scheduled': len(self._due), 'running': len(self._running)}
+
+    def _ensure_started(self):
+        # Threads are started lazily so they are created in the serving process, after any fork
+        if self._dispatcher is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='background-job')
+            self._dispatcher = threading.Thread(target=self._dispatch, daemon=True, name='job-dispatcher')
+            self._dispatcher.start()
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    ready = [key for key, due in self._due.items() if due <= now]
+                    # Respect the concurrency cap: leave work queued rather than piling it onto the pool
+                    capacity = self.max_workers - len(self._running)
+                    if ready and capacity > 0:
+                        break
+                    timeout = None
+                    if self._due and capacity > 0:
+                        timeout = max(0.0, min(self._due.values()) - now)
+                    self._cond.wait(timeout)
+                ready.sort(key=self._due.get)
+                batch = ready[:capacity]
+                for key in batch:
+                    del self._due[key]
+                    self._running.add(key)
+            for key in batch:
+                self._executor.submit(self._run, key)
+
+    def _run(self, key):
+        kind, user_id = key
+        try:
+            with self.app.app_context():
+                self._handlers[kind](user_id)
+        except Exception:
+            self.app.logger.exception("Background job %s failed for user %s", kind, user_id)
+        finally:
+            with self._cond:
+                self._running.discard(key)
+                if key in self._rerun:
+                    self._rerun.discard(key)
+                    self._due[key] = time.monotonic() + self.debounce_seconds
+                self._cond.notify()
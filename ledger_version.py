@@ -0,0 +1,51 @@
+# ledger_version.py
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import LedgerVersion, Transaction, BusinessTransaction
+
+LEDGER_OF = {Transaction: 'personal', BusinessTransaction: 'business'}
+
+# Columns that are derived from the ledger rather than part of it; writing them is not a ledger change
+DERIVED_COLUMNS = {'anomaly_score'}
+
+
+def current_version(user_id, ledger):
+    """Version of a user's ledger; 0 if it has never been written through the ORM."""
+    row = LedgerVersion.query.filter_by(user_id=user_id, ledger=ledger).first()
+    return row.version if row else 0
+
+
+def _ledger_changed(obj):
+    state = inspect(obj)
+    return any(attr.history.has_changes() for attr in state.attrs if attr.key not in DERIVED_COLUMNS)
+
+
+@event.listens_for(Session, 'before_flush')
+def _bump_ledger_versions(session, flush_context, instances):
+    """
+    Bumps the version of every (user, ledger) whose transactions are inserted,
+    updated or deleted in this flush, so every write path invalidates caches
+    without having to remember to.
+    """
+    touched = set()
+    for obj in list(session.new) + list(session.deleted):
+        ledger = LEDGER_OF.get(type(obj))
+        if ledger and obj.user_id is not None:
+            touched.add((obj.user_id, ledger))
+    for obj in session.dirty:
+        ledger = LEDGER_OF.get(type(obj))
+        if ledger and _ledger_changed(obj):
+            touched.add((obj.user_id, ledger))
+    if not touched:
+        return
+
+    with session.no_autoflush:
+        for user_id, ledger in touched:
+            row = session.query(LedgerVersion).filter_by(user_id=user_id, ledger=ledger).first()
+            if row is None:
+                session.add(LedgerVersion(user_id=user_id, ledger=ledger, version=1))
+            else:
+                # Increment in SQL so concurrent writers can't lose a bump
+                row.version = LedgerVersion.version + 1
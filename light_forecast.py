@@ -0,0 +1,106 @@
+# light_forecast.py
+
+import numpy as np
+
+SEASON = 7                # weekly pattern in daily flows
+MAX_HISTORY_DAYS = 730    # older data adds cost but little signal for a 30-60 day horizon
+DAMPING = 0.9             # damped trend, so a short-lived slope isn't extrapolated forever
+
+# Smoothing parameters are picked by one-step-ahead error over this grid, all candidates at once
+_ALPHAS, _BETAS = np.meshgrid([0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.8], [0.0, 0.02, 0.1, 0.3])
+ALPHAS, BETAS = _ALPHAS.ravel(), _BETAS.ravel()
+
+# Rough costs used to pick a model within a latency budget
+PROPHET_MIN_DAYS = 180    # below ~6 months Prophet's trend/seasonality fit isn't more accurate (see scripts/forecast_backtest.py)
+PROPHET_COST_MS = 1500
+HOLT_COST_MS_PER_DAY = 0.01
+
+
+def daily_grid(dates, values):
+    """
+    Turns (date, net flow) rows into a contiguous daily array, with 0 for days
+    without transactions. Returns (first date, values).
+    """
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    offsets = (dates - dates.min()).astype(np.int64)
+    grid = np.zeros(offsets.max() + 1)
+    np.add.at(grid, offsets, np.asarray(values, dtype=np.float64))
+    if len(grid) > MAX_HISTORY_DAYS:
+        return dates.min() + np.timedelta64(len(grid) - MAX_HISTORY_DAYS, 'D'), grid[-MAX_HISTORY_DAYS:]
+    return dates.min(), grid
+
+
+def choose_model(n_days, budget_ms):
+    """Cheapest adequate model for `n_days` of daily history that fits in `budget_ms`."""
+    if n_days < 2:
+        return None
+    if n_days >= PROPHET_MIN_DAYS and budget_ms >= PROPHET_COST_MS:
+        return 'prophet'
+    if n_days * HOLT_COST_MS_PER_DAY <= budget_ms:
+        return 'holt_weekly' if n_days >= 2 * SEASON else 'holt'
+    return 'seasonal_naive' if n_days >= SEASON else 'naive'
+
+
+def weekly_profile(y):
+    """
+    Additive day-of-week offsets from the last 8 weeks; index 0 is the weekday of y[-SEASON].
+    Medians, so a salary credit or one-off purchase doesn't become a weekly pattern.
+    """
+    recent = y[len(y) % SEASON:][-8 * SEASON:]
+    profile = np.median(recent.reshape(-1, SEASON), axis=0)
+    return profile - profile.mean()
+
+
+def seasonal_terms(profile, positions, n_history):
+    """Profile offsets for day positions (0 = first day of history, n_history = first forecast day)."""
+    return profile[(np.asarray(positions) - n_history) % SEASON]
+
+
+def holt(y, horizon):
+    """
+    Damped-trend Holt smoothing. Returns (forecast, one-step error scale, alpha).
+    The recursion runs once over the history for every (alpha, beta) candidate in
+    parallel; the winner minimises absolute one-step error, which keeps a monthly
+    salary credit from dragging the fit towards chasing spikes.
+    """
+    level = np.full(ALPHAS.shape, y[0])
+    trend = np.zeros(ALPHAS.shape)
+    abs_error = np.zeros(ALPHAS.shape)
+    for value in y[1:]:
+        error = value - (level + DAMPING * trend)
+        abs_error += np.abs(error)
+        level = level + DAMPING * trend + ALPHAS * error
+        trend = DAMPING * trend + ALPHAS * BETAS * error
+    best = int(np.argmin(abs_error))
+    steps = np.cumsum(DAMPING ** np.arange(1, horizon + 1))
+    sigma = 1.25 * abs_error[best] / max(len(y) - 1, 1)  # mean absolute error -> std for normal errors
+    return level[best] + steps * trend[best], sigma, ALPHAS[best]
+
+
+def forecast(model, y, horizon):
+    """
+    Forecasts `horizon` days past the end of daily series `y` with one of the
+    lightweight models. Returns (mean, lower, upper) arrays; bounds are ~95%.
+    """
+    h = np.arange(1, horizon + 1)
+    if model in ('naive', 'seasonal_naive'):
+        if model == 'seasonal_naive':
+            mean = np.resize(y[-SEASON:], horizon)
+            errors = y[SEASON:] - y[:-SEASON]
+            widen = np.sqrt(np.ceil(h / SEASON))
+        else:
+            mean = np.full(horizon, y[-1])
+            errors = np.diff(y)
+            widen = np.sqrt(h)
+        sigma = np.sqrt(np.mean(errors ** 2)) if len(errors) else 0.0
+        return mean, mean - 1.96 * sigma * widen, mean + 1.96 * sigma * widen
+
+    profile = None
+    if model == 'holt_weekly':
+        profile = weekly_profile(y)
+        y = y - seasonal_terms(profile, np.arange(len(y)), len(y))
+    mean, sigma, alpha = holt(y, horizon)
+    if profile is not None:
+        mean = mean + seasonal_terms(profile, len(y) + np.arange(horizon), len(y))
+    spread = 1.96 * sigma * np.sqrt(1 + (h - 1) * alpha ** 2)
+    return mean, mean - spread, mean + spread
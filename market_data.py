@@ -0,0 +1,193 @@
+# market_data.py
+
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import yfinance as yf
+from pycoingecko import CoinGeckoAPI
+
+# Symbols are (asset_type, ticker) pairs. Stocks are quoted in INR, crypto in USD
+# and USD_INR_SYMBOL carries the exchange rate between the two.
+USD_INR_SYMBOL = ('FX', 'USDINR')
+DEFAULT_USD_TO_INR_RATE = 83.5
+
+
+def symbol_key(symbol):
+    return f"{symbol[0]}:{symbol[1]}"
+
+
+def parse_symbol_key(key):
+    asset_type, ticker = key.split(':', 1)
+    return (asset_type, ticker)
+
+
+class MarketDataProvider(ABC):
+    """
+    Base class for price sources. `get_quotes(symbols)` returns {symbol: price};
+    symbols that could not be priced are left out of the result.
+    """
+    name = 'base'
+
+    @abstractmethod
+    def get_quotes(self, symbols):
+        ...
+
+
+class LiveMarketData(MarketDataProvider):
+    """Real prices from Yahoo Finance (stocks) and CoinGecko (crypto + USD/INR)."""
+    name = 'live'
+
+    def get_quotes(self, symbols):
+        quotes = {}
+        coin_ids = sorted({ticker for asset_type, ticker in symbols if asset_type == 'Crypto'})
+        wants_rate = USD_INR_SYMBOL in symbols
+        if coin_ids or wants_rate:
+            try:
+                # One CoinGecko call covers every coin plus the USD->INR rate (via tether)
+                prices = CoinGeckoAPI().get_price(ids=','.join(coin_ids + ['tether']), vs_currencies='usd,inr')
+            except Exception as e:
+                print(f"Could not fetch crypto prices: {e}")
+                prices = {}
+            if wants_rate and prices.get('tether', {}).get('inr'):
+                quotes[USD_INR_SYMBOL] = prices['tether']['inr']
+            for coin in coin_ids:
+                if prices.get(coin, {}).get('usd') is not None:
+                    quotes[('Crypto', coin)] = prices[coin]['usd']
+        for asset_type, ticker in symbols:
+            if asset_type != 'Stock':
+                continue
+            try:
+                todays_data = yf.Ticker(ticker).history(period='1d')
+                if not todays_data.empty:
+                    quotes[(asset_type, ticker)] = float(todays_data['Close'].iloc[0])
+            except Exception as e:
+                print(f"Could not fetch price for {ticker}: {e}")
+        return quotes
+
+
+class RecordingMarketData(MarketDataProvider):
+    """
+    Passes calls through to another provider and writes every quote it sees,
+    plus the observed call latency, to a JSON fixture that RecordedMarketData can replay.
+    """
+    name = 'record'
+
+    def __init__(self, fixture_path, upstream=None):
+        self.fixture_path = fixture_path
+        self.upstream = upstream or LiveMarketData()
+        self._lock = threading.Lock()
+        self._fixture = _load_fixture(fixture_path) if os.path.exists(fixture_path) else {'quotes': {}, 'latencies_ms': []}
+
+    def get_quotes(self, symbols):
+        started = time.perf_counter()
+        quotes = self.upstream.get_quotes(symbols)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._fixture['quotes'].update({symbol_key(s): p for s, p in quotes.items()})
+            self._fixture['latencies_ms'].append(round(elapsed_ms, 3))
+            _write_fixture(self.fixture_path, self._fixture)
+        return quotes
+
+
+class RecordedMarketData(MarketDataProvider):
+    """
+    Replays a fixture written by RecordingMarketData. With `replay_latency` the
+    recorded call latencies are slept through in order, so benchmarks see
+    realistic provider cost without touching the network.
+    """
+    name = 'replay'
+
+    def __init__(self, fixture_path, replay_latency=False):
+        fixture = _load_fixture(fixture_path)
+        self.quotes = {parse_symbol_key(k): v for k, v in fixture['quotes'].items()}
+        self.latencies_ms = fixture.get('latencies_ms') or []
+        self.replay_latency = replay_latency
+        self._calls = 0
+        self._lock = threading.Lock()
+
+    def get_quotes(self, symbols):
+        if self.replay_latency and self.latencies_ms:
+            with self._lock:
+                delay_ms = self.latencies_ms[self._calls % len(self.latencies_ms)]
+                self._calls += 1
+            time.sleep(delay_ms / 1000)
+        return {s: self.quotes[s] for s in symbols if s in self.quotes}
+
+
+class SyntheticMarketData(MarketDataProvider):
+    """
+    Deterministic prices for any symbol. Each symbol gets a base price derived
+    from its name and seed, then follows a seeded random walk that advances one
+    step per call. `latency_ms` adds a fixed per-call delay to mimic a provider.
+    """
+    name = 'synthetic'
+
+    def __init__(self, seed=0, volatility=0.01, latency_ms=0):
+        self.seed = seed
+        self.volatility = volatility
+        self.latency_ms = latency_ms
+        self._steps = {}
+        self._log_drift = {}
+        self._lock = threading.Lock()
+
+    def _base_price(self, symbol):
+        if symbol == USD_INR_SYMBOL:
+            return DEFAULT_USD_TO_INR_RATE
+        digest = hashlib.sha256(f"{self.seed}:{symbol_key(symbol)}".encode()).digest()
+        # Spread base prices log-uniformly between 1 and 100,000
+        return round(10 ** (5 * int.from_bytes(digest[:4], 'big') / 2**32), 4)
+
+    def get_quotes(self, symbols):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        quotes = {}
+        with self._lock:
+            for symbol in symbols:
+                step = self._steps.get(symbol, 0)
+                self._steps[symbol] = step + 1
+                drift = self._log_drift.get(symbol, 0.0)
+                if step:
+                    drift += random.Random(f"{self.seed}:{symbol_key(symbol)}:{step}").gauss(0, self.volatility)
+                    self._log_drift[symbol] = drift
+                quotes[symbol] = self._base_price(symbol) * math.exp(drift)
+        return quotes
+
+
+def provider_from_config(config):
+    """
+    Builds the provider selected by MARKET_DATA_PROVIDER:
+    'live' (default), 'record', 'replay' or 'synthetic'.
+    """
+    kind = (config.get('MARKET_DATA_PROVIDER') or 'live').lower()
+    fixture_path = config.get('MARKET_DATA_FIXTURE') or 'market_data_fixture.json'
+    if kind == 'live':
+        return LiveMarketData()
+    if kind == 'record':
+        return RecordingMarketData(fixture_path)
+    if kind == 'replay':
+        return RecordedMarketData(fixture_path, replay_latency=bool(config.get('MARKET_DATA_REPLAY_LATENCY')))
+    if kind == 'synthetic':
+        return SyntheticMarketData(seed=int(config.get('MARKET_DATA_SEED', 0)),
+                                   latency_ms=float(config.get('MARKET_DATA_LATENCY_MS', 0)))
+    raise ValueError(f"Unknown MARKET_DATA_PROVIDER '{kind}'")
+
+
+def _load_fixture(path):
+    with open(path) as f:
+        fixture = json.load(f)
+    fixture.setdefault('quotes', {})
+    fixture.setdefault('latencies_ms', [])
+    return fixture
+
+
+def _write_fixture(path, fixture):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(fixture, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
@@ -0,0 +1,220 @@
+# model_store.py
+
+import copy
+import io
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+import joblib
+
+
+class ModelStore:
+    """
+    Versioned on-disk store for trained models with an in-process LRU cache.
+
+    Each key (e.g. 'user_5/category') is a directory of immutable version files
+    plus a CURRENT pointer. Writes go to a temp file and are renamed into place,
+    so readers never see a half-written pickle. Loads are served from memory
+    until the pointer changes (another worker retrained) or the entry is evicted
+    to stay under `cache_max_bytes`.
+    """
+
+    def __init__(self, directory, cache_max_bytes=64 * 1024 * 1024, keep_versions=3):
+        self.directory = directory
+        self.cache_max_bytes = cache_max_bytes
+        self.keep_versions = keep_versions
+        self._cache = OrderedDict()  # key -> (pointer_mtime, version, model, size)
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+
+    # --- paths ---
+
+    def _key_dir(self, key):
+        return os.path.join(self.directory, *key.split('/'))
+
+    def _pointer_path(self, key):
+        return os.path.join(self._key_dir(key), 'CURRENT')
+
+    def _version_path(self, key, version):
+        return os.path.join(self._key_dir(key), f'v{version}.pkl')
+
+    # --- public API ---
+
+    def save(self, key, model):
+        """Writes a new version of `key` atomically and makes it current. Returns the version."""
+        key_dir = self._key_dir(key)
+        os.makedirs(key_dir, exist_ok=True)
+        version = time.time_ns()
+
+        buffer = io.BytesIO()
+        joblib.dump(model, buffer)
+        payload = buffer.getvalue()
+        _atomic_write(self._version_path(key, version), payload)
+        _atomic_write(self._pointer_path(key), str(version).encode())
+
+        self._prune(key, version)
+        with self._lock:
+            self._put(key, os.stat(self._pointer_path(key)).st_mtime_ns, version, model, len(payload))
+        return version
+
+    def load(self, key):
+        """Returns the current model for `key`, or None if nothing has been saved yet."""
+        try:
+            pointer_mtime = os.stat(self._pointer_path(key)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] == pointer_mtime:
+                self._cache.move_to_end(key)
+                return cached[2]
+
+        try:
+            with open(self._pointer_path(key)) as f:
+                version = int(f.read().strip())
+            path = self._version_path(key, version)
+            model = joblib.load(path)
+            size = os.path.getsize(path)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        with self._lock:
+            self._put(key, pointer_mtime, version, model, size)
+        return model
+
+    def current_version(self, key):
+        try:
+            with open(self._pointer_path(key)) as f:
+                return int(f.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def invalidate(self, key):
+        with self._lock:
+            self._drop(key)
+
+    def delete(self, key):
+        """Removes every version of `key`. Returns whether there was anything to remove."""
+        with self._lock:
+            self._drop(key)
+        if not os.path.isdir(self._key_dir(key)):
+            return False
+        shutil.rmtree(self._key_dir(key), ignore_errors=True)
+        return True
+
+    def cache_stats(self):
+        with self._lock:
+            return {'entries': len(self._cache), 'bytes': self._cache_bytes, 'max_bytes': self.cache_max_bytes}
+
+    # --- internals ---
+
+    def _put(self, key, pointer_mtime, version, model, size):
+        self._drop(key)
+        if size > self.cache_max_bytes:
+            return
+        self._cache[key] = (pointer_mtime, version, model, size)
+        self._cache_bytes += size
+        while self._cache_bytes > self.cache_max_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_bytes -= evicted[3]
+
+    def _drop(self, key):
+        entry = self._cache.pop(key, None)
+        if entry:
+            self._cache_bytes -= entry[3]
+
+    def _prune(self, key, current_version):
+        versions = []
+        for name in os.listdir(self._key_dir(key)):
+            if name.startswith('v') and name.endswith('.pkl'):
+                try:
+                    versions.append(int(name[1:-4]))
+                except ValueError:
+                    continue
+        for version in sorted(versions)[:-self.keep_versions]:
+            if version != current_version:
+                try:
+                    os.remove(self._version_path(key, version))
+                except FileNotFoundError:
+                    pass
+
+
+class OnlineModels:
+    """
+    Models that change in memory between saves (an online classifier learning one
+    labelled row at a time), in front of a ModelStore.
+
+    `update` changes a key's model under a per-key lock and keeps it in memory;
+    `flush` saves it as a new version, so callers decide when the pickling and
+    fsync happen (e.g. a debounced background job) rather than paying for them on
+    every change. Changes not flushed before the process exits are lost, so the
+    model must be rebuildable from its source data.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._pending = {}  # key -> model changed since it was last saved
+        self._locks = {}
+
+    def lock(self, key):
+        return self._locks.setdefault(key, threading.Lock())
+
+    def load(self, key):
+        """The key's newest model: pending in-memory changes first, else the saved version."""
+        model = self._pending.get(key)
+        return model if model is not None else self.store.load(key)
+
+    def update(self, key, apply):
+        """
+        Calls `apply(model)` under the key's lock and keeps the model pending if it
+        returns True. The saved model is copied on the first change after a save,
+        since the cached instance may be predicting in other threads; later changes
+        go to the pending copy in place. `apply` must leave the model untouched
+        when it returns False.
+        """
+        with self.lock(key):
+            model = self._pending.get(key)
+            if model is None:
+                model = copy.deepcopy(self.store.load(key))
+            if model is None or not apply(model):
+                return False
+            self._pending[key] = model
+            return True
+
+    def flush(self, key):
+        """Saves the key's pending model, if any. Returns whether anything was written."""
+        with self.lock(key):
+            model = self._pending.get(key)
+            if model is None:
+                return False
+            self.store.save(key, model)
+            del self._pending[key]
+            return True
+
+    def save(self, key, model):
+        """Saves a rebuilt model, discarding pending changes to the one it replaces."""
+        with self.lock(key):
+            self._pending.pop(key, None)
+            return self.store.save(key, model)
+
+    def delete(self, key):
+        """Removes the key's model, pending changes included."""
+        with self.lock(key):
+            self._pending.pop(key, None)
+            return self.store.delete(key)
+
+    def pending(self):
+        return len(self._pending)
+
+
+def _atomic_write(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
@@ -3,6 +3,12 @@ from flask_login import UserMixin
 from datetime import date, datetime
 from dateutil.relativedelta import relativedelta
 
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.ext.hybrid import hybrid_property
+
+from amortization import balance_at
+from sql_dates import days_since, months_since
+
 db = SQLAlchemy()
 
 # --- CORE SHARED MODEL ---
@@ -35,6 +41,12 @@ class User(UserMixin, db.Model):
     investments = db.relationship('Investment', backref='user', lazy=True, cascade="all, delete-orphan")
     sold_investments = db.relationship('SoldInvestment', backref='user', lazy=True, cascade="all, delete-orphan")
     loans = db.relationship('Loan', backref='user', lazy=True, cascade="all, delete-orphan")
+    capital_gains = db.relationship('CapitalGainsLedger', backref='user', lazy=True, cascade="all, delete-orphan")
+    net_worth_snapshots = db.relationship('NetWorthSnapshot', backref='user', lazy=True, cascade="all, delete-orphan")
+    anomaly_stats = db.relationship('AnomalyStats', backref='user', lazy=True, cascade="all, delete-orphan")
+    ledger_versions = db.relationship('LedgerVersion', backref='user', lazy=True, cascade="all, delete-orphan")
+    forecasts = db.relationship('Forecast', backref='user', lazy=True, cascade="all, delete-orphan")
+    report_artifacts = db.relationship('ReportArtifact', backref='user', lazy=True, cascade="all, delete-orphan")
     categories = db.relationship('Category', backref='user', lazy=True, cascade="all, delete-orphan")
     budgets = db.relationship('Budget', backref='user', lazy=True, cascade="all, delete-orphan")
 
@@ -56,6 +68,7 @@ class Transaction(db.Model):
     date = db.Column(db.Date, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
+    anomaly_score = db.Column(db.Float, nullable=True) # Robust z-score at insert time; None if not scored
     
     # Explicitly link back to the 'transactions' property in the Category model
     category = db.relationship('Category', back_populates='transactions')
@@ -100,6 +113,18 @@ class SoldInvestment(db.Model):
     gain_type = db.Column(db.String(10), nullable=False) # STCG or LTCG
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+class CapitalGainsLedger(db.Model):
+    # Running totals of realised gains per financial year, maintained by sell_investment
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    financial_year = db.Column(db.Integer, nullable=False) # Starting year, e.g. 2024 for FY 2024-25
+    asset_type = db.Column(db.String(20), nullable=False)
+    gain_type = db.Column(db.String(10), nullable=False) # STCG or LTCG
+    total_gain = db.Column(db.Float, nullable=False, default=0.0)
+    sale_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.UniqueConstraint('user_id', 'financial_year', 'asset_type', 'gain_type', name='_user_fy_asset_gain_uc'),)
+
 class Loan(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     loan_name = db.Column(db.String(100), nullable=False)
@@ -110,6 +135,92 @@ class Loan(db.Model):
     start_date = db.Column(db.Date, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+class NetWorthSnapshot(db.Model):
+    # One row per user per day, written by the nightly `flask snapshot-net-worth` job
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    snapshot_date = db.Column(db.Date, nullable=False)
+    cash = db.Column(db.Float, nullable=False, default=0.0)
+    schemes = db.Column(db.Float, nullable=False, default=0.0)
+    investments = db.Column(db.Float, nullable=False, default=0.0)
+    liabilities = db.Column(db.Float, nullable=False, default=0.0)
+    net_worth = db.Column(db.Float, nullable=False, default=0.0)
+
+    __table_args__ = (db.UniqueConstraint('user_id', 'snapshot_date', name='_user_snapshot_date_uc'),)
+
+
+class AnomalyStats(db.Model):
+    # Rolling robust statistics of expense amounts, per user, ledger and category (category_id 0 = all categories)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    ledger = db.Column(db.String(10), nullable=False) # 'personal' or 'business'
+    category_id = db.Column(db.Integer, nullable=False, default=0)
+    sample_count = db.Column(db.Integer, nullable=False, default=0)
+    median = db.Column(db.Float, nullable=False, default=0.0)
+    mad = db.Column(db.Float, nullable=False, default=0.0)
+    window = db.Column(db.Text, nullable=False, default='[]') # JSON list of the most recent amounts
+
+    __table_args__ = (db.UniqueConstraint('user_id', 'ledger', 'category_id', name='_user_ledger_category_uc'),)
+
+
+class LedgerVersion(db.Model):
+    # Incremented whenever a user's transactions in a ledger are written; derived data is cached against it
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    ledger = db.Column(db.String(10), nullable=False) # 'personal' or 'business'
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.UniqueConstraint('user_id', 'ledger', name='_user_ledger_uc'),)
+
+
+class Forecast(db.Model):
+    # Latest stored forecast per user and kind, with the ledger version it was computed from
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(30), nullable=False) # 'balance' or 'business_cashflow'
+    ledger_version = db.Column(db.Integer, nullable=False)
+    model_name = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False) # JSON response body
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('user_id', 'kind', name='_user_forecast_kind_uc'),)
+
+
+class InsightNarrative(db.Model):
+    # LLM-written business summary, reused by the user's requests whose aggregates and prompt version hash the same
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    payload_hash = db.Column(db.String(64), nullable=False)
+    prompt_version = db.Column(db.String(20), nullable=False)
+    payload = db.Column(db.Text, nullable=False) # JSON month aggregates the prompt is built from
+    status = db.Column(db.String(10), nullable=False, default='pending') # 'pending', 'ready' or 'failed'
+    narrative = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    requested_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (db.UniqueConstraint('user_id', 'payload_hash', name='_user_payload_hash_uc'),)
+
+
+class ReportArtifact(db.Model):
+    # A rendered report file, reused until the ledger it was built from changes
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    ledger = db.Column(db.String(10), nullable=False) # 'personal' or 'business'
+    report_type = db.Column(db.String(20), nullable=False, default='summary')
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    format = db.Column(db.String(10), nullable=False) # 'pdf' or 'csv'
+    ledger_version = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending') # 'pending', 'ready' or 'failed'
+    size = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    requested_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (db.UniqueConstraint('user_id', 'ledger', 'report_type', 'start_date', 'end_date', 'format',
+                                          'ledger_version', name='_report_artifact_uc'),)
+
 
 # --- BUDGET MODEL ---
 
@@ -133,6 +244,9 @@ class BusinessMetrics(db.Model):
     monthly_expenses = db.Column(db.Float, default=0.0)
     net_profit = db.Column(db.Float, default=0.0)
     profit_margin = db.Column(db.Float, default=0.0)
+    # Month the totals are for; maintained by business_metrics as transactions are written
+    period_year = db.Column(db.Integer, nullable=True)
+    period_month = db.Column(db.Integer, nullable=True)
 
 class BusinessTransaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -143,6 +257,7 @@ class BusinessTransaction(db.Model):
     date = db.Column(db.Date, nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
     receipt_filename = db.Column(db.String(255), nullable=True)
+    anomaly_score = db.Column(db.Float, nullable=True) # Robust z-score at insert time; None if not scored
 
     # Explicitly link back to the 'business_transactions' property in the Category model
     category = db.relationship('Category', back_populates='business_transactions')
@@ -156,8 +271,9 @@ class BusinessInvestment(db.Model):
     purchase_date = db.Column(db.Date)
     useful_life_years = db.Column(db.Integer, nullable=True)
 
-    @property
+    @hybrid_property
     def current_value(self):
+        # Straight-line depreciation over the useful life; financial assets keep their value
         if self.investment_type != 'Financial' and self.useful_life_years and self.useful_life_years > 0:
             years_owned = (date.today() - self.purchase_date).days / 365.25
             if years_owned >= self.useful_life_years: return 0.0
@@ -167,12 +283,28 @@ class BusinessInvestment(db.Model):
         else:
             return self.amount_invested
 
-    @property
+    @current_value.expression
+    def current_value(cls):
+        depreciating = and_(or_(cls.investment_type.is_(None), cls.investment_type != 'Financial'),
+                            cls.useful_life_years > 0)
+        days_owned = days_since(cls.purchase_date)
+        return case(
+            (and_(depreciating, days_owned >= cls.useful_life_years * 365.25), 0.0),
+            (depreciating, cls.amount_invested - cls.amount_invested * days_owned / (cls.useful_life_years * 365.25)),
+            else_=cls.amount_invested,
+        )
+
+    @hybrid_property
     def roi(self):
         if self.amount_invested > 0:
             return ((self.current_value - self.amount_invested) / self.amount_invested) * 100
         return 0.0
 
+    @roi.expression
+    def roi(cls):
+        return case((cls.amount_invested > 0, (cls.current_value - cls.amount_invested) / cls.amount_invested * 100),
+                    else_=0.0)
+
 class BusinessLoan(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
@@ -183,15 +315,22 @@ class BusinessLoan(db.Model):
     start_date = db.Column(db.Date)
     emi = db.Column(db.Float)
 
-    @property
+    @hybrid_property
     def remaining_balance(self):
-        r = (self.interest_rate / 12) / 100
-        n = self.tenure_months
-        p_made = (date.today().year - self.start_date.year) * 12 + date.today().month - self.start_date.month
-        if p_made < 0: p_made = 0
-        if p_made >= n: return 0.0
-        balance = self.principal_amount * (((1 + r)**n) - ((1 + r)**p_made)) / (((1 + r)**n) - 1)
-        return balance if balance > 0 else 0.0
+        return float(balance_at(self.principal_amount, self.interest_rate, self.tenure_months, self.start_date))
+
+    @remaining_balance.expression
+    def remaining_balance(cls):
+        # Same closed form as amortization.balance_after, with the instalments paid counted in SQL
+        paid = months_since(cls.start_date)
+        growth = 1 + cls.interest_rate / 1200.0
+        return case(
+            (paid <= 0, cls.principal_amount),
+            (paid >= cls.tenure_months, 0.0),
+            (cls.interest_rate <= 0, cls.principal_amount - cls.principal_amount * paid / cls.tenure_months),
+            else_=cls.principal_amount * (func.power(growth, cls.tenure_months) - func.power(growth, paid))
+            / (func.power(growth, cls.tenure_months) - 1),
+        )
 
 class BusinessClient(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -0,0 +1,98 @@
+# parquet_export.py
+
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from models import db, Budget, BusinessTransaction, Category, SoldInvestment, Transaction
+
+ROW_GROUP_SIZE = 100000
+
+
+def _ledger_export(model, extra=()):
+    columns = [('id', model.id, pa.int64()), ('user_id', model.user_id, pa.int64()),
+               ('date', model.date, pa.date32()), ('type', model.type, pa.string()),
+               ('amount', model.amount, pa.float64()), ('category_id', model.category_id, pa.int64()),
+               ('category', Category.name, pa.string()), ('description', model.description, pa.string()),
+               ('anomaly_score', model.anomaly_score, pa.float64()), *extra]
+    return model, columns, (model.user_id, model.date, model.id)
+
+
+# table -> (model, [(column name, SQL column, arrow type)], order by)
+EXPORTS = {
+    'transactions': _ledger_export(Transaction),
+    'business_transactions': _ledger_export(
+        BusinessTransaction, [('receipt_filename', BusinessTransaction.receipt_filename, pa.string())]),
+    'sold_investments': (SoldInvestment, [
+        ('id', SoldInvestment.id, pa.int64()), ('user_id', SoldInvestment.user_id, pa.int64()),
+        ('asset_type', SoldInvestment.asset_type, pa.string()),
+        ('ticker_symbol', SoldInvestment.ticker_symbol, pa.string()),
+        ('quantity', SoldInvestment.quantity, pa.float64()),
+        ('purchase_price', SoldInvestment.purchase_price, pa.float64()),
+        ('purchase_date', SoldInvestment.purchase_date, pa.date32()),
+        ('sell_price', SoldInvestment.sell_price, pa.float64()),
+        ('sell_date', SoldInvestment.sell_date, pa.date32()),
+        ('capital_gain', SoldInvestment.capital_gain, pa.float64()),
+        ('gain_type', SoldInvestment.gain_type, pa.string()),
+    ], (SoldInvestment.user_id, SoldInvestment.sell_date, SoldInvestment.id)),
+    'budgets': (Budget, [
+        ('id', Budget.id, pa.int64()), ('user_id', Budget.user_id, pa.int64()),
+        ('year', Budget.year, pa.int32()), ('month', Budget.month, pa.int32()),
+        ('category_id', Budget.category_id, pa.int64()), ('category', Category.name, pa.string()),
+        ('amount', Budget.amount, pa.float64()),
+    ], (Budget.user_id, Budget.year, Budget.month, Budget.id)),
+}
+
+
+def export_query(table, user_id=None):
+    model, columns, order_by = EXPORTS[table]
+    query = db.select(*(column for _, column, _ in columns))
+    if any(column is Category.name for _, column, _ in columns):
+        # Category names denormalized onto each row, so the files stand alone
+        query = query.outerjoin(Category, model.category_id == Category.id)
+    if user_id is not None:
+        query = query.where(model.user_id == user_id)
+    return query.order_by(*order_by)
+
+
+def export_table(table, path, user_id=None, row_group_size=ROW_GROUP_SIZE, compression='zstd'):
+    """
+    Streams one table (one user's rows, or everyone's) into a Parquet file, one
+    row group per fetched batch, so memory stays at one batch however large the
+    table is. Rows are ordered by user, which keeps row-group statistics useful
+    for filtering on user_id. Returns the number of rows written.
+    """
+    _, columns, _ = EXPORTS[table]
+    schema = pa.schema([(name, arrow_type) for name, _, arrow_type in columns])
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    rows_written = 0
+
+    try:
+        # Separate connection with a server-side cursor, so the whole table is never held in memory
+        with db.engine.connect() as conn, pq.ParquetWriter(tmp_path, schema, compression=compression) as writer:
+            result = conn.execution_options(stream_results=True, yield_per=row_group_size) \
+                .execute(export_query(table, user_id))
+            for rows in result.partitions():
+                arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+                writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema), row_group_size=row_group_size)
+                rows_written += len(rows)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return rows_written
+
+
+def export_all(directory, tables=None, user_id=None, row_group_size=ROW_GROUP_SIZE, compression='zstd', progress=None):
+    """Writes `<table>.parquet` (or `<table>_user_<id>.parquet`) for each table into `directory`."""
+    os.makedirs(directory, exist_ok=True)
+    written = {}
+    for table in tables or EXPORTS:
+        suffix = f"_user_{user_id}" if user_id is not None else ''
+        path = os.path.join(directory, f"{table}{suffix}.parquet")
+        written[table] = (path, export_table(table, path, user_id, row_group_size, compression))
+        if progress:
+            progress(table, *written[table])
+    return written
@@ -0,0 +1,135 @@
+# price_stream.py
+
+import queue
+import threading
+import time
+
+
+class PriceStreamHub:
+    """
+    Shares one background refresher per distinct symbol set between every
+    subscribed browser tab. Each subscriber first gets every quote the feed
+    has (possibly none), then only the quotes that changed.
+
+    `fetch_quotes(symbols)` must return a dict of {symbol: price}; symbols it
+    could not price are simply left out.
+    """
+
+    def __init__(self, fetch_quotes, interval=60):
+        self.fetch_quotes = fetch_quotes
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._feeds = {}
+        # Quotes are shared across feeds, so two users holding the same ticker
+        # only cost one provider call per interval.
+        self._quote_cache = {}
+        self._cache_lock = threading.Lock()
+
+    def subscribe(self, symbols):
+        key = frozenset(symbols)
+        with self._lock:
+            feed = self._feeds.get(key)
+            if feed is None:
+                feed = _SymbolFeed(self, key)
+                self._feeds[key] = feed
+                feed.start()
+            subscriber = feed.add_subscriber()
+        return feed, subscriber
+
+    def unsubscribe(self, feed, subscriber):
+        with self._lock:
+            if feed.remove_subscriber(subscriber) == 0:
+                feed.stop()
+                if self._feeds.get(feed.key) is feed:
+                    del self._feeds[feed.key]
+
+    def is_stale(self, feed):
+        """True until the feed's first successful refresh, or once two intervals pass without one."""
+        return feed.refreshed_at is None or time.time() - feed.refreshed_at > 2 * self.interval
+
+    def active_feeds(self):
+        with self._lock:
+            return len(self._feeds)
+
+    def _quotes_for(self, symbols):
+        now = time.monotonic()
+        max_age = self.interval / 2
+        quotes, stale = {}, []
+        with self._cache_lock:
+            for symbol in symbols:
+                cached = self._quote_cache.get(symbol)
+                if cached and now - cached[1] < max_age:
+                    quotes[symbol] = cached[0]
+                else:
+                    stale.append(symbol)
+        if stale:
+            fresh = self.fetch_quotes(stale)
+            with self._cache_lock:
+                for symbol, price in fresh.items():
+                    self._quote_cache[symbol] = (price, now)
+            quotes.update(fresh)
+        return quotes
+
+
+class _SymbolFeed:
+    def __init__(self, hub, key):
+        self.hub = hub
+        self.key = key
+        self.last_quotes = {}
+        self.polled = False
+        self.refreshed_at = None  # Wall-clock time of the last successful refresh
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name='price-feed')
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def add_subscriber(self):
+        subscriber = queue.Queue(maxsize=10)
+        with self._lock:
+            self._subscribers.append(subscriber)
+            # Late joiners get whatever the feed already knows straight away, even if that's nothing
+            if self.polled:
+                subscriber.put_nowait(dict(self.last_quotes))
+        return subscriber
+
+    def remove_subscriber(self, subscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+            return len(self._subscribers)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                quotes = self.hub._quotes_for(self.key)
+                self.refreshed_at = time.time()
+            except Exception as e:
+                print(f"Price stream: refresh failed: {e}")
+                quotes = {}
+            with self._lock:
+                changed = {s: p for s, p in quotes.items() if self.last_quotes.get(s) != p}
+                self.last_quotes.update(changed)
+                # The first poll goes out even when empty, so subscribers waiting on it get their snapshot
+                if changed or not self.polled:
+                    for subscriber in self._subscribers:
+                        _offer(subscriber, changed)
+                self.polled = True
+            self._stop.wait(self.hub.interval)
+
+
+def _offer(subscriber, changed):
+    # A slow client must not stall the feed: fold its oldest pending update into this one.
+    try:
+        subscriber.put_nowait(changed)
+    except queue.Full:
+        try:
+            changed = {**subscriber.get_nowait(), **changed}
+        except queue.Empty:
+            pass
+        subscriber.put_nowait(changed)
@@ -0,0 +1,564 @@
+# report_artifacts.py
+
+import csv
+import io
+import json
+import multiprocessing
+import os
+import time
+from calendar import monthrange
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date, datetime
+from functools import partial
+from itertools import groupby
+
+from fpdf import FPDF
+from sqlalchemy import func
+
+from models import db, Category, LedgerVersion, ReportArtifact, Transaction, BusinessTransaction
+from ledger_version import current_version
+
+# ledger -> (transaction model, income type)
+REPORT_LEDGERS = {'personal': (Transaction, 'income'), 'business': (BusinessTransaction, 'revenue')}
+
+MIMETYPES = {'pdf': 'application/pdf', 'csv': 'text/csv', 'json': 'application/json'}
+
+REPORT_TYPES = {'summary': 'Summary', 'mom': 'Month-over-month', 'qoq': 'Quarter-over-quarter',
+                'yoy': 'Year-over-year'}
+# Comparative report type -> period it pivots on
+COMPARATIVE_PERIODS = {'mom': 'month', 'qoq': 'quarter', 'yoy': 'year'}
+MAX_COMPARATIVE_PERIODS = 12
+
+LINE_LABELS = {'personal': {'income': 'Income', 'expense': 'Expenses', 'net': 'Net Savings'},
+               'business': {'revenue': 'Revenue', 'expense': 'Expenses', 'net': 'Net Profit / (Loss)'}}
+
+
+# --- Report data ---
+
+def summary_data(ledger, user_id, start_date, end_date):
+    """Totals and expense-by-category for a date range, from one grouped query."""
+    model, _ = REPORT_LEDGERS[ledger]
+    rows = db.session.query(model.type, Category.name, func.sum(model.amount)) \
+        .outerjoin(Category, model.category_id == Category.id) \
+        .filter(model.user_id == user_id, model.date.between(start_date, end_date)) \
+        .group_by(model.type, Category.name).all()
+    return summary_from_totals(ledger, start_date, end_date, rows)
+
+
+def summary_from_totals(ledger, start_date, end_date, rows):
+    """Summary report data from (type, category name, total) rows."""
+    _, income_type = REPORT_LEDGERS[ledger]
+    total_income = sum(total for ttype, _, total in rows if ttype == income_type)
+    total_expense = sum(total for ttype, _, total in rows if ttype == 'expense')
+    expenses_by_category = {}
+    for ttype, name, total in rows:
+        if ttype == 'expense':
+            expenses_by_category[name or 'Uncategorized'] = expenses_by_category.get(name or 'Uncategorized', 0) + total
+
+    data = {'start_date': start_date.strftime('%d %b %Y'), 'end_date': end_date.strftime('%d %b %Y'),
+            'expenses_by_category': expenses_by_category}
+    if ledger == 'business':
+        data.update(total_revenue=total_income, total_expenses=total_expense, net_profit=total_income - total_expense)
+    else:
+        data.update(total_income=total_income, total_expense=total_expense, net_savings=total_income - total_expense)
+    return data
+
+
+def period_keys(start_date, end_date, period):
+    """Every period touching the range, as the (year[, month or quarter]) keys the comparative query groups by."""
+    if period == 'year':
+        return [(year,) for year in range(start_date.year, end_date.year + 1)]
+    per_year = 12 if period == 'month' else 4
+    first = start_date.month if period == 'month' else (start_date.month - 1) // 3 + 1
+    last = end_date.month if period == 'month' else (end_date.month - 1) // 3 + 1
+    return [(n // per_year, n % per_year + 1)
+            for n in range(start_date.year * per_year + first - 1, end_date.year * per_year + last)]
+
+
+def period_label(key, period):
+    if period == 'year':
+        return str(key[0])
+    if period == 'quarter':
+        return f"Q{key[1]} {key[0]}"
+    return datetime(key[0], key[1], 1).strftime('%b %Y')
+
+
+def _line(label, values):
+    """A pivot line: its value per period and the change of the last period over the one before."""
+    change = change_pct = None
+    if len(values) > 1:
+        change = values[-1] - values[-2]
+        change_pct = round(change / abs(values[-2]) * 100, 2) if values[-2] else None
+    return {'label': label, 'values': values, 'change': change, 'change_pct': change_pct}
+
+
+def comparative_data(ledger, user_id, start_date, end_date, period='month'):
+    """
+    Category x period pivot of the ledger, with totals and net per period, from
+    one query grouped by period, category and type.
+    """
+    model, income_type = REPORT_LEDGERS[ledger]
+    period_columns = [func.extract('year', model.date)]
+    if period == 'quarter':
+        # From the month, since not every backend extracts a quarter (SQLite has no such strftime field)
+        period_columns.append(func.floor((func.extract('month', model.date) - 1) / 3) + 1)
+    elif period == 'month':
+        period_columns.append(func.extract('month', model.date))
+    rows = db.session.query(*period_columns, model.type, Category.name, func.sum(model.amount)) \
+        .outerjoin(Category, model.category_id == Category.id) \
+        .filter(model.user_id == user_id, model.date.between(start_date, end_date)) \
+        .group_by(*period_columns, model.type, Category.name).all()
+
+    keys = period_keys(start_date, end_date, period)
+    column = {key: i for i, key in enumerate(keys)}
+    pivot = {}
+    for row in rows:
+        *key, ttype, name, total = row
+        values = pivot.setdefault((ttype, name or 'Uncategorized'), [0.0] * len(keys))
+        values[column[tuple(int(k) for k in key)]] += total
+
+    labels = LINE_LABELS[ledger]
+    sections, section_totals = [], {}
+    for ttype in (income_type, 'expense'):
+        lines = sorted(((name, values) for (t, name), values in pivot.items() if t == ttype),
+                       key=lambda line: -sum(line[1]))
+        totals = [sum(column_values) for column_values in zip(*(values for _, values in lines))] or [0.0] * len(keys)
+        section_totals[ttype] = totals
+        sections.append({'type': ttype, 'label': labels[ttype],
+                         'lines': [_line(name, values) for name, values in lines],
+                         'total': _line(f"Total {labels[ttype]}", totals)})
+    net = [income - expense for income, expense in zip(section_totals[income_type], section_totals['expense'])]
+
+    return {'ledger': ledger, 'period': period,
+            'start_date': start_date.strftime('%d %b %Y'), 'end_date': end_date.strftime('%d %b %Y'),
+            'periods': [period_label(key, period) for key in keys],
+            'sections': sections, 'net': _line(labels['net'], net)}
+
+
+def validate_report(report_type, report_format, start_date, end_date):
+    """Why the requested report can't be generated, or None if it can."""
+    if report_type not in REPORT_TYPES:
+        return 'Unsupported report type.'
+    if report_format not in MIMETYPES:
+        return 'Unsupported report format.'
+    if start_date > end_date:
+        return 'Start date cannot be after end date.'
+    period = COMPARATIVE_PERIODS.get(report_type)
+    if period and len(period_keys(start_date, end_date, period)) > MAX_COMPARATIVE_PERIODS:
+        return f'A comparative report can cover at most {MAX_COMPARATIVE_PERIODS} {period}s.'
+    return None
+
+
+# --- Renderers ---
+
+def _pdf_bytes(pdf):
+    # fpdf2 returns a bytearray; the original PyFPDF a latin-1 str
+    output = pdf.output()
+    return output.encode('latin-1') if isinstance(output, str) else bytes(output)
+
+
+def generate_business_pdf_report(data):
+    pdf = FPDF()
+    pdf.add_page()
+
+    # Title
+    pdf.set_font('Helvetica', 'B', 18)
+    pdf.cell(0, 10, 'Profit & Loss Statement', 0, 1, 'C')
+    pdf.set_font('Helvetica', '', 12)
+    pdf.cell(0, 10, f"For the period: {data['start_date']} to {data['end_date']}", 0, 1, 'C')
+    pdf.ln(10)
+
+    # Summary Section
+    pdf.set_font('Helvetica', 'B', 14)
+    pdf.cell(0, 10, 'Financial Summary', 0, 1)
+    pdf.set_font('Helvetica', '', 12)
+    pdf.cell(95, 10, 'Total Revenue:', 1, 0)
+    pdf.cell(95, 10, f"Rs. {data['total_revenue']:.2f}", 1, 1, 'R')
+    pdf.cell(95, 10, 'Total Expenses:', 1, 0)
+    pdf.cell(95, 10, f"Rs. {data['total_expenses']:.2f}", 1, 1, 'R')
+    pdf.set_font('Helvetica', 'B', 12)
+    pdf.cell(95, 10, 'Net Profit / (Loss):', 1, 0)
+    pdf.cell(95, 10, f"Rs. {data['net_profit']:.2f}", 1, 1, 'R')
+    pdf.ln(10)
+
+    # Expense Breakdown
+    if data['expenses_by_category']:
+        pdf.set_font('Helvetica', 'B', 14)
+        pdf.cell(0, 10, 'Expense Breakdown by Category', 0, 1)
+        pdf.set_font('Helvetica', 'B', 12)
+        pdf.cell(95, 10, 'Category', 1, 0)
+        pdf.cell(95, 10, 'Amount', 1, 1, 'C')
+        pdf.set_font('Helvetica', '', 12)
+        for category, amount in data['expenses_by_category'].items():
+            pdf.cell(95, 10, f"  {category}", 1, 0)
+            pdf.cell(95, 10, f"Rs. {amount:.2f}", 1, 1, 'R')
+
+    return _pdf_bytes(pdf)
+
+def generate_business_csv_report(data):
+    output = io.StringIO()
+    writer = csv.writer(output)
+
+    # Write summary
+    writer.writerow(['Profit & Loss Statement'])
+    writer.writerow(['Period', f"{data['start_date']} to {data['end_date']}"])
+    writer.writerow([]) # Spacer
+    writer.writerow(['Metric', 'Amount (Rs.)'])
+    writer.writerow(['Total Revenue', data['total_revenue']])
+    writer.writerow(['Total Expenses', data['total_expenses']])
+    writer.writerow(['Net Profit / (Loss)', data['net_profit']])
+    writer.writerow([]) # Spacer
+
+    # Write expense breakdown
+    writer.writerow(['Expense Breakdown by Category'])
+    writer.writerow(['Category', 'Amount (Rs.)'])
+    for category, amount in data['expenses_by_category'].items():
+        writer.writerow([category, amount])
+
+    return output.getvalue()
+
+def generate_personal_pdf_report(data):
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font('Helvetica', 'B', 18)
+    pdf.cell(0, 10, 'Income & Expense Report', 0, 1, 'C')
+    pdf.set_font('Helvetica', '', 12)
+    pdf.cell(0, 10, f"For the period: {data['start_date']} to {data['end_date']}", 0, 1, 'C')
+    pdf.ln(10)
+    pdf.set_font('Helvetica', 'B', 14)
+    pdf.cell(0, 10, 'Summary', 0, 1)
+    pdf.set_font('Helvetica', '', 12)
+    pdf.cell(95, 10, 'Total Income:', 1, 0)
+    pdf.cell(95, 10, f"Rs. {data['total_income']:.2f}", 1, 1, 'R')
+    pdf.cell(95, 10, 'Total Expense:', 1, 0)
+    pdf.cell(95, 10, f"Rs. {data['total_expense']:.2f}", 1, 1, 'R')
+    pdf.set_font('Helvetica', 'B', 12)
+    pdf.cell(95, 10, 'Net Savings:', 1, 0)
+    pdf.cell(95, 10, f"Rs. {data['net_savings']:.2f}", 1, 1, 'R')
+    pdf.ln(10)
+    if data['expenses_by_category']:
+        pdf.set_font('Helvetica', 'B', 14)
+        pdf.cell(0, 10, 'Expense Breakdown by Category', 0, 1)
+        pdf.set_font('Helvetica', 'B', 12)
+        pdf.cell(95, 10, 'Category', 1, 0)
+        pdf.cell(95, 10, 'Amount', 1, 1, 'C')
+        pdf.set_font('Helvetica', '', 12)
+        for category, amount in data['expenses_by_category'].items():
+            pdf.cell(95, 10, f"  {category}", 1, 0)
+            pdf.cell(95, 10, f"Rs. {amount:.2f}", 1, 1, 'R')
+    return _pdf_bytes(pdf)
+
+def generate_personal_csv_report(data):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['Income & Expense Report'])
+    writer.writerow(['Period', f"{data['start_date']} to {data['end_date']}"])
+    writer.writerow([]); writer.writerow(['Metric', 'Amount (Rs.)'])
+    writer.writerow(['Total Income', data['total_income']])
+    writer.writerow(['Total Expense', data['total_expense']])
+    writer.writerow(['Net Savings', data['net_savings']])
+    writer.writerow([]); writer.writerow(['Expense Breakdown by Category'])
+    writer.writerow(['Category', 'Amount (Rs.)'])
+    for category, amount in data['expenses_by_category'].items():
+        writer.writerow([category, amount])
+    return output.getvalue()
+
+
+def _comparative_title(data):
+    title = 'Comparative Profit & Loss Statement' if data['ledger'] == 'business' else 'Comparative Income & Expense Report'
+    return title, f"{data['period'].title()} by {data['period']}: {data['start_date']} to {data['end_date']}"
+
+
+def _pivot_lines(data):
+    """(kind, line) in print order: each section's header, lines and total, then net."""
+    for section in data['sections']:
+        yield 'header', section
+        for line in section['lines']:
+            yield 'line', line
+        yield 'total', section['total']
+    yield 'net', data['net']
+
+
+def generate_comparative_pdf_report(data):
+    pdf = FPDF(orientation='L')
+    pdf.add_page()
+    title, subtitle = _comparative_title(data)
+    pdf.set_font('Helvetica', 'B', 16)
+    pdf.cell(0, 10, title, 0, 1, 'C')
+    pdf.set_font('Helvetica', '', 11)
+    pdf.cell(0, 8, subtitle, 0, 1, 'C')
+    pdf.ln(6)
+
+    # Category column, one column per period, then change and change %
+    label_w, change_w, pct_w = 55, 26, 20
+    value_w = min(30, (pdf.w - pdf.l_margin - pdf.r_margin - label_w - change_w - pct_w) / len(data['periods']))
+    pdf.set_font('Helvetica', 'B', 8)
+    pdf.cell(label_w, 8, 'Category', 1, 0)
+    for label in data['periods']:
+        pdf.cell(value_w, 8, label, 1, 0, 'C')
+    pdf.cell(change_w, 8, 'Change', 1, 0, 'C')
+    pdf.cell(pct_w, 8, 'Change %', 1, 1, 'C')
+
+    for kind, line in _pivot_lines(data):
+        if kind == 'header':
+            pdf.set_font('Helvetica', 'B', 9)
+            pdf.cell(0, 8, line['label'], 1, 1)
+            continue
+        pdf.set_font('Helvetica', '' if kind == 'line' else 'B', 8)
+        pdf.cell(label_w, 7, f"  {line['label'][:32]}" if kind == 'line' else line['label'], 1, 0)
+        for value in line['values']:
+            pdf.cell(value_w, 7, f"{value:,.2f}", 1, 0, 'R')
+        pdf.cell(change_w, 7, '' if line['change'] is None else f"{line['change']:+,.2f}", 1, 0, 'R')
+        pdf.cell(pct_w, 7, '' if line['change_pct'] is None else f"{line['change_pct']:+.1f}%", 1, 1, 'R')
+
+    pdf.ln(4)
+    pdf.set_font('Helvetica', 'I', 8)
+    pdf.cell(0, 6, 'Amounts in Rs. Change compares the last period with the one before it.', 0, 1)
+    return _pdf_bytes(pdf)
+
+def generate_comparative_csv_report(data):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    title, subtitle = _comparative_title(data)
+    writer.writerow([title])
+    writer.writerow(['Period', subtitle])
+    writer.writerow([])
+    writer.writerow(['Category', *data['periods'], 'Change', 'Change %'])
+    for kind, line in _pivot_lines(data):
+        if kind == 'header':
+            writer.writerow([line['label']])
+            continue
+        writer.writerow([line['label'], *line['values'], line['change'], line['change_pct']])
+        if kind == 'total':
+            writer.writerow([])
+    return output.getvalue()
+
+def generate_json_report(data):
+    return json.dumps(data, indent=2)
+
+
+# (report_type, ledger, format) -> (data builder, renderer)
+REPORTS = {
+    ('summary', 'personal', 'pdf'): (summary_data, generate_personal_pdf_report),
+    ('summary', 'personal', 'csv'): (summary_data, generate_personal_csv_report),
+    ('summary', 'business', 'pdf'): (summary_data, generate_business_pdf_report),
+    ('summary', 'business', 'csv'): (summary_data, generate_business_csv_report),
+    ('summary', 'personal', 'json'): (summary_data, generate_json_report),
+    ('summary', 'business', 'json'): (summary_data, generate_json_report),
+}
+for report_type, period in COMPARATIVE_PERIODS.items():
+    for ledger in REPORT_LEDGERS:
+        builder = partial(comparative_data, period=period)
+        REPORTS[(report_type, ledger, 'pdf')] = (builder, generate_comparative_pdf_report)
+        REPORTS[(report_type, ledger, 'csv')] = (builder, generate_comparative_csv_report)
+        REPORTS[(report_type, ledger, 'json')] = (builder, generate_json_report)
+
+
+# --- Artifacts ---
+
+def artifact_path(directory, artifact):
+    return os.path.join(directory, f'user_{artifact.user_id}', f'{artifact.id}.{artifact.format}')
+
+
+def download_name(artifact):
+    return f"{artifact.ledger}_{artifact.report_type}_{artifact.start_date:%Y%m%d}_{artifact.end_date:%Y%m%d}.{artifact.format}"
+
+
+def request_report(directory, user_id, ledger, start_date, end_date, report_format, report_type='summary'):
+    """
+    Returns the artifact for this report at the ledger's current version,
+    creating a pending one if it hasn't been rendered yet. Renders of the same
+    report for older ledger versions are deleted, files included.
+    """
+    version = current_version(user_id, ledger)
+    matching = ReportArtifact.query.filter_by(user_id=user_id, ledger=ledger, report_type=report_type,
+                                              start_date=start_date, end_date=end_date, format=report_format).all()
+    artifact = None
+    for existing in matching:
+        if existing.ledger_version == version:
+            artifact = existing
+        else:
+            _remove_file(artifact_path(directory, existing))
+            db.session.delete(existing)
+
+    if artifact is None:
+        artifact = ReportArtifact(user_id=user_id, ledger=ledger, report_type=report_type, start_date=start_date,
+                                  end_date=end_date, format=report_format, ledger_version=version)
+        db.session.add(artifact)
+    elif artifact.status == 'failed':
+        artifact.status = 'pending'
+        artifact.error = None
+    db.session.commit()
+    return artifact
+
+
+def render_artifact(artifact_id, directory):
+    """Background job handler: renders a pending artifact to disk."""
+    artifact = db.session.get(ReportArtifact, artifact_id)
+    if artifact is None or artifact.status != 'pending':
+        return
+
+    try:
+        build, render = REPORTS[(artifact.report_type, artifact.ledger, artifact.format)]
+        _store_artifact(artifact, directory, render(build(artifact.ledger, artifact.user_id,
+                                                          artifact.start_date, artifact.end_date)))
+    except Exception as e:
+        print(f"Error rendering report {artifact_id}: {e}")
+        _fail_artifact(artifact, e)
+    db.session.commit()
+
+
+def _store_artifact(artifact, directory, content):
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    path = artifact_path(directory, artifact)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    artifact.size = len(content)
+    artifact.status = 'ready'
+    artifact.error = None
+    artifact.completed_at = datetime.utcnow()
+
+
+def _fail_artifact(artifact, error):
+    artifact.status = 'failed'
+    artifact.error = str(error)
+    artifact.completed_at = datetime.utcnow()
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# --- Month-end statements for all users ---
+
+def _render_in_worker(artifact_id, report_type, ledger, report_format, data):
+    """Process pool entry point: renders one report from its data, no database access."""
+    _, render = REPORTS[(report_type, ledger, report_format)]
+    try:
+        return artifact_id, render(data), None
+    except Exception as e:
+        return artifact_id, None, str(e)
+
+
+def _statement_inputs(ledger, start_date, end_date):
+    """
+    Yields (user_id, summary data) for every user with transactions in the ledger
+    and period, streaming one query grouped by user, type and category.
+    """
+    model, _ = REPORT_LEDGERS[ledger]
+    query = db.select(model.user_id, model.type, Category.name, func.sum(model.amount)) \
+        .outerjoin(Category, model.category_id == Category.id) \
+        .where(model.date.between(start_date, end_date)) \
+        .group_by(model.user_id, model.type, Category.name).order_by(model.user_id)
+    # Separate connection, so artifacts can be committed through the session while this is still streaming
+    with db.engine.connect() as conn:
+        rows = conn.execution_options(stream_results=True, yield_per=10000).execute(query)
+        for user_id, user_rows in groupby(rows, key=lambda r: r[0]):
+            yield user_id, summary_from_totals(ledger, start_date, end_date, [r[1:] for r in user_rows])
+
+
+def _month_statements(ledger, start_date, end_date):
+    """(user_id, format) -> the month's summary artifact rows in the ledger, at any version."""
+    rows = db.session.query(ReportArtifact.id, ReportArtifact.user_id, ReportArtifact.format,
+                            ReportArtifact.ledger_version, ReportArtifact.status) \
+        .filter_by(ledger=ledger, report_type='summary', start_date=start_date, end_date=end_date)
+    existing = {}
+    for row in rows:
+        existing.setdefault((row.user_id, row.format), []).append(row)
+    return existing
+
+
+def month_end_statements(directory, year, month, workers, ledgers=None, formats=('pdf', 'csv'),
+                         progress=None, commit_every=50):
+    """
+    Renders the month's summary statement in each format for every user with
+    activity in each ledger, across a process pool. Statements already rendered
+    for the user's current ledger version are skipped, so an interrupted run
+    picks up where it stopped. Each user's totals are aggregated once and shared
+    by all formats. Pending artifacts are created, and renders of older ledger
+    versions deleted, in batches of `commit_every` rather than one commit per
+    statement. Returns a summary dict with counts and throughput.
+    """
+    start_date = date(year, month, 1)
+    end_date = date(year, month, monthrange(year, month)[1])
+    stats = {'rendered': 0, 'skipped': 0, 'errors': 0}
+    started = time.perf_counter()
+    max_in_flight = workers * 4
+
+    # spawn: the web app process may hold DB connections and ML runtime threads that must not be forked
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        in_flight = set()
+        batch, stale = [], []
+
+        def collect(done):
+            for future in done:
+                artifact_id, content, error = future.result()
+                artifact = db.session.get(ReportArtifact, artifact_id)
+                if error is None:
+                    _store_artifact(artifact, directory, content)
+                    stats['rendered'] += 1
+                else:
+                    _fail_artifact(artifact, error)
+                    stats['errors'] += 1
+                if (stats['rendered'] + stats['errors']) % commit_every == 0:
+                    db.session.commit()
+                if progress:
+                    progress(stats, time.perf_counter() - started)
+
+        def submit_batch():
+            nonlocal in_flight
+            if stale:
+                ReportArtifact.query.filter(ReportArtifact.id.in_([row.id for row in stale])) \
+                    .delete(synchronize_session=False)
+                for row in stale:
+                    _remove_file(artifact_path(directory, row))
+            db.session.flush()  # One round trip for the batch's new pending rows, which gives them ids
+            for artifact, ledger, report_format, data in batch:
+                if len(in_flight) >= max_in_flight:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                in_flight.add(pool.submit(_render_in_worker, artifact.id, 'summary', ledger, report_format, data))
+            db.session.commit()
+            batch.clear()
+            stale.clear()
+
+        for ledger in ledgers or REPORT_LEDGERS:
+            versions = dict(db.session.query(LedgerVersion.user_id, LedgerVersion.version)
+                            .filter(LedgerVersion.ledger == ledger))
+            existing = _month_statements(ledger, start_date, end_date)
+            for user_id, data in _statement_inputs(ledger, start_date, end_date):
+                version = versions.get(user_id, 0)
+                for report_format in formats:
+                    current = None
+                    for row in existing.pop((user_id, report_format), ()):
+                        if row.ledger_version == version:
+                            current = row
+                        else:
+                            stale.append(row)
+                    if current is not None and current.status == 'ready':
+                        stats['skipped'] += 1
+                        continue
+                    if current is None:
+                        artifact = ReportArtifact(user_id=user_id, ledger=ledger, report_type='summary',
+                                                  start_date=start_date, end_date=end_date, format=report_format,
+                                                  ledger_version=version)
+                        db.session.add(artifact)
+                    else:  # Pending or failed when an earlier run stopped
+                        artifact = db.session.get(ReportArtifact, current.id)
+                    batch.append((artifact, ledger, report_format, data))
+                    if len(batch) >= commit_every:
+                        submit_batch()
+            submit_batch()
+        collect(in_flight)
+
+    db.session.commit()
+    stats['elapsed'] = time.perf_counter() - started
+    stats['per_second'] = stats['rendered'] / stats['elapsed'] if stats['elapsed'] else 0.0
+    return stats
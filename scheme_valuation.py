@@ -0,0 +1,83 @@
+# scheme_valuation.py
+
+from datetime import date
+from functools import lru_cache
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+
+from models import db, FixedScheme
+
+DAYS_PER_YEAR = 365.25
+CACHE_MAX_ENTRIES = 4096
+
+# A scheme's terms as a hashable row: (id, principal, annual rate %, tenure months, start date, penalty rate %)
+SCHEME_COLUMNS = (FixedScheme.id, FixedScheme.principal_amount, FixedScheme.interest_rate,
+                  FixedScheme.tenure_months, FixedScheme.start_date, FixedScheme.penalty_rate)
+
+
+def scheme_rows(schemes):
+    """Terms rows for already-loaded FixedScheme objects."""
+    return tuple((s.id, s.principal_amount, s.interest_rate, s.tenure_months, s.start_date, s.penalty_rate)
+                 for s in schemes)
+
+
+def load_scheme_rows(user_id):
+    return tuple(tuple(row) for row in db.session.query(*SCHEME_COLUMNS)
+                 .filter(FixedScheme.user_id == user_id).order_by(FixedScheme.id))
+
+
+def _columns(rows):
+    _, principal, rate, tenure, start, penalty = zip(*rows)
+    return (np.array(principal, dtype=np.float64), np.array(rate, dtype=np.float64) / 100,
+            np.array(tenure, dtype=np.float64) / 12, np.array(start, dtype='datetime64[D]'),
+            np.array(penalty, dtype=np.float64) / 100)
+
+
+def _years_at(start, tenure_years, day):
+    """Years of growth by `day`: none before the start, none past maturity."""
+    elapsed = (np.datetime64(day, 'D') - start).astype(np.float64) / DAYS_PER_YEAR
+    return np.clip(elapsed, 0, tenure_years)
+
+
+@lru_cache(maxsize=CACHE_MAX_ENTRIES)
+def _valuation(rows, on_date):
+    principal, rate, tenure_years, start, penalty = _columns(rows)
+    years = _years_at(start, tenure_years, on_date)
+    matured = years >= tenure_years
+    current = principal * (1 + rate) ** years
+    # Breaking a scheme early earns the rate less the penalty; matured schemes pay out in full
+    early = np.where(matured, current, principal * (1 + np.maximum(rate - penalty, 0)) ** years)
+    return {
+        'ids': tuple(row[0] for row in rows),
+        'current_value': tuple(current.tolist()),
+        'maturity_amount': tuple((principal * (1 + rate) ** tenure_years).tolist()),
+        'early_withdrawal_value': tuple(early.tolist()),
+        'maturity_date': tuple(row[4] + relativedelta(months=+row[3]) for row in rows),
+        'matured': tuple(matured.tolist()),
+        'total_current_value': float(current.sum()),
+    }
+
+
+def value_schemes(rows, on_date=None):
+    """
+    Current, maturity and early-withdrawal values of every scheme in `rows`, as
+    tuples aligned with the rows. Growth stops at maturity. Memoized per day.
+    """
+    if not rows:
+        return {'ids': (), 'current_value': (), 'maturity_amount': (), 'early_withdrawal_value': (),
+                'maturity_date': (), 'matured': (), 'total_current_value': 0.0}
+    return _valuation(rows, on_date or date.today())
+
+
+@lru_cache(maxsize=CACHE_MAX_ENTRIES)
+def _fy_interest(rows, financial_year):
+    principal, rate, tenure_years, start, _ = _columns(rows)
+    opening = _years_at(start, tenure_years, date(financial_year, 4, 1))
+    closing = _years_at(start, tenure_years, date(financial_year + 1, 4, 1))
+    return tuple((principal * ((1 + rate) ** closing - (1 + rate) ** opening)).tolist())
+
+
+def interest_for_fy(rows, financial_year):
+    """Interest each scheme accrues during the financial year (April to March), as a tuple aligned with the rows."""
+    return _fy_interest(rows, financial_year) if rows else ()
@@ -0,0 +1,106 @@
+"""
+Benchmark: cost of updating the category model as a user's history grows.
+
+Compares, for each history size,
+  * a full refit of the old TF-IDF + MultinomialNB pipeline,
+  * a full rebuild of OnlineCategoryClassifier (the periodic compaction),
+  * a single learn_one() update on its own,
+  * the insert path end to end when every update is saved to the model store
+    (copy, learn_one, pickle and fsync per transaction),
+  * the insert path end to end with OnlineModels: learn_one in memory, with the
+    store write amortized over one flush per --flush-every transactions.
+
+    python scripts/bench_category_model.py --sizes 100 1000 10000 50000
+"""
+import argparse
+import copy
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.pipeline import make_pipeline
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from category_model import OnlineCategoryClassifier  # noqa: E402
+from model_store import ModelStore, OnlineModels  # noqa: E402
+
+CATEGORIES = {
+    'Food': ['swiggy', 'zomato', 'restaurant', 'cafe', 'dominos', 'lunch', 'dinner'],
+    'Transport': ['uber', 'ola', 'petrol', 'metro', 'fuel', 'parking', 'toll'],
+    'Utilities': ['electricity', 'water', 'broadband', 'mobile', 'recharge', 'gas'],
+    'Groceries': ['bigbasket', 'dmart', 'milk', 'vegetables', 'supermarket', 'blinkit'],
+    'Entertainment': ['netflix', 'movie', 'pvr', 'spotify', 'concert', 'prime'],
+}
+
+
+def synthetic_history(size, rng):
+    labels = [rng.choice(list(CATEGORIES)) for _ in range(size)]
+    descriptions = [f"{rng.choice(CATEGORIES[c])} {rng.choice(CATEGORIES[c])} payment {rng.randint(1, 999)}" for c in labels]
+    return descriptions, labels
+
+
+def timed(fn, repeat=1):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def per_update_ms(fn, updates):
+    started = time.perf_counter()
+    for description, label in updates:
+        fn(description, label)
+    return (time.perf_counter() - started) / len(updates) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 50000])
+    parser.add_argument('--updates', type=int, default=200, help='Single-row updates to average over')
+    parser.add_argument('--flush-every', type=int, default=50, help='Updates per background flush in the buffered path')
+    args = parser.parse_args()
+    rng = random.Random(42)
+
+    print(f"{'history':>8} {'tfidf refit ms':>15} {'online rebuild ms':>18} {'learn_one ms':>13} "
+          f"{'save each ms':>13} {'buffered ms':>12}")
+    for size in args.sizes:
+        descriptions, labels = synthetic_history(size, rng)
+        tfidf_ms = timed(lambda: make_pipeline(TfidfVectorizer(), MultinomialNB()).fit(descriptions, labels))
+        rebuild_ms = timed(lambda: OnlineCategoryClassifier.fit(descriptions, labels))
+        updates = list(zip(*synthetic_history(args.updates, rng)))
+
+        model = OnlineCategoryClassifier.fit(descriptions, labels)
+        update_ms = per_update_ms(model.learn_one, updates)
+
+        with tempfile.TemporaryDirectory() as directory:
+            store = ModelStore(directory)
+            store.save('user_1/category', OnlineCategoryClassifier.fit(descriptions, labels))
+
+            def save_each(description, label):
+                updated = copy.deepcopy(store.load('user_1/category'))
+                updated.learn_one(description, label)
+                store.save('user_1/category', updated)
+
+            save_each_ms = per_update_ms(save_each, updates)
+
+            online = OnlineModels(store)
+            inserted = []
+
+            def buffered(description, label):
+                online.update('user_1/category', lambda m: m.learn_one(description, label))
+                inserted.append(1)
+                if len(inserted) % args.flush_every == 0:
+                    online.flush('user_1/category')
+
+            buffered_ms = per_update_ms(buffered, updates)
+
+        print(f"{size:>8} {tfidf_ms:>15.2f} {rebuild_ms:>18.2f} {update_ms:>13.3f} "
+              f"{save_each_ms:>13.3f} {buffered_ms:>12.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Offline latency/throughput benchmark for the portfolio valuation routes.
+
+Runs /refresh_prices and /net_worth through Flask's test client against a
+throwaway SQLite database, with prices coming from the synthetic (default) or
+a recorded market-data provider, so results are reproducible without network.
+
+    python scripts/bench_valuation.py --holdings 50 --requests 200
+    python scripts/bench_valuation.py --provider replay --fixture market_data_fixture.json
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--provider', default='synthetic', choices=['synthetic', 'replay'])
+parser.add_argument('--fixture', default='market_data_fixture.json')
+parser.add_argument('--latency-ms', type=float, default=0, help='Simulated provider latency (synthetic only)')
+parser.add_argument('--holdings', type=int, default=20)
+parser.add_argument('--requests', type=int, default=100)
+args = parser.parse_args()
+
+db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+os.environ['DATABASE_URI'] = f'sqlite:///{db_file}'
+os.environ['MARKET_DATA_PROVIDER'] = args.provider
+os.environ['MARKET_DATA_FIXTURE'] = args.fixture
+os.environ['MARKET_DATA_REPLAY_LATENCY'] = '1'
+os.environ['MARKET_DATA_LATENCY_MS'] = str(args.latency_ms)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+from app import app  # noqa: E402
+from models import db, User, Investment  # noqa: E402
+
+
+def seed():
+    user = User(username='bench', password=generate_password_hash('bench', method='pbkdf2:sha256'), dob=date(1990, 1, 1), role='employee')
+    db.session.add(user)
+    db.session.commit()
+    for i in range(args.holdings):
+        is_crypto = i % 3 == 0
+        db.session.add(Investment(
+            asset_type='Crypto' if is_crypto else 'Stock',
+            ticker_symbol=f'coin{i}' if is_crypto else f'STOCK{i}.NS',
+            quantity=1 + i % 7, purchase_price=100 + i,
+            purchase_currency='USD' if is_crypto else 'INR',
+            purchase_date=date.today() - timedelta(days=30 * i), user_id=user.id))
+    db.session.commit()
+
+
+def bench(client, path):
+    timings = []
+    started = time.perf_counter()
+    for _ in range(args.requests):
+        t0 = time.perf_counter()
+        response = client.get(path)
+        timings.append((time.perf_counter() - t0) * 1000)
+        assert response.status_code == 200, f"{path} returned {response.status_code}"
+    total = time.perf_counter() - started
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{path:<16} p50={statistics.median(timings):8.2f}ms  p95={p95:8.2f}ms  throughput={args.requests / total:8.1f} req/s")
+
+
+with app.app_context():
+    db.create_all()
+    seed()
+
+client = app.test_client()
+client.post('/login', data={'username': 'bench', 'password': 'bench'})
+print(f"provider={args.provider} holdings={args.holdings} requests={args.requests}")
+bench(client, '/refresh_prices')
+bench(client, '/net_worth')
+os.remove(db_file)
@@ -0,0 +1,85 @@
+"""
+Backtest: forecast error and fit time of the lightweight models vs Prophet.
+
+For synthetic daily net-flow histories of several lengths (salary spikes,
+weekly spending pattern, noise and sparse days, like a real ledger), holds
+out the last --horizon days, forecasts them with each model and reports mean
+absolute error and fit time. The old RandomForest fallback is included for
+reference. Prophet is skipped if it isn't installed.
+
+    python scripts/forecast_backtest.py --lengths 30 90 180 365 730 --users 20
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from light_forecast import forecast as light_forecast  # noqa: E402
+
+try:
+    from prophet import Prophet
+except ImportError:
+    Prophet = None
+
+
+def synthetic_history(days, rng):
+    t = np.arange(days)
+    salary = np.where(t % 30 == 0, rng.uniform(40000, 90000), 0.0)
+    weekly = np.where(t % 7 >= 5, -rng.uniform(1500, 4000), -rng.uniform(200, 900))
+    drift = -t * rng.uniform(0, 3)
+    noise = rng.normal(0, 400, days)
+    spend = (weekly + drift + noise) * (rng.random(days) > 0.3)  # some days have no transactions
+    return salary + spend
+
+
+def fit_prophet(y, horizon):
+    series = pd.DataFrame({'ds': pd.date_range('2023-01-01', periods=len(y)), 'y': y})
+    model = Prophet()
+    model.fit(series)
+    return model.predict(model.make_future_dataframe(periods=horizon))['yhat'][-horizon:].to_numpy()
+
+
+def fit_random_forest(y, horizon):
+    rf = RandomForestRegressor(n_estimators=100, random_state=42)
+    rf.fit(np.arange(len(y)).reshape(-1, 1), y)
+    return rf.predict(np.arange(len(y), len(y) + horizon).reshape(-1, 1))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lengths', type=int, nargs='+', default=[30, 90, 180, 365, 730])
+    parser.add_argument('--users', type=int, default=10, help='Synthetic histories per length')
+    parser.add_argument('--horizon', type=int, default=30)
+    args = parser.parse_args()
+    rng = np.random.default_rng(42)
+
+    models = {name: (lambda y, h, name=name: light_forecast(name, y, h)[0])
+              for name in ('naive', 'seasonal_naive', 'holt', 'holt_weekly')}
+    models['random_forest'] = fit_random_forest
+    if Prophet is not None:
+        models['prophet'] = fit_prophet
+    else:
+        print("prophet is not installed; skipping it.\n")
+
+    print(f"{'history':>8} {'model':>15} {'MAE':>10} {'fit ms':>10}")
+    for length in args.lengths:
+        histories = [synthetic_history(length + args.horizon, rng) for _ in range(args.users)]
+        for name, fit in models.items():
+            errors, times = [], []
+            for y in histories:
+                train, test = y[:-args.horizon], y[-args.horizon:]
+                started = time.perf_counter()
+                prediction = fit(train, args.horizon)
+                times.append((time.perf_counter() - started) * 1000)
+                errors.append(np.mean(np.abs(prediction - test)))
+            print(f"{length:>8} {name:>15} {np.mean(errors):>10.1f} {np.median(times):>10.2f}")
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Local stand-in for a text-generation inference endpoint, for developing and
+load-testing the business insight narratives without calling a hosted model.
+
+Answers POST requests in the text-generation-inference format that
+huggingface_hub's InferenceClient.text_generation expects, with a canned
+summary built from the numbers in the prompt, after an optional delay.
+
+    python scripts/stub_inference_server.py --port 8081 --delay 2
+    INSIGHT_LLM_ENDPOINT=http://127.0.0.1:8081 flask run
+
+GET /stats reports how many generations were served, which shows whether
+repeat views are being answered from the narrative cache.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+calls = 0
+calls_lock = threading.Lock()
+
+
+def canned_summary(prompt):
+    figures = dict(re.findall(r'- ([A-Za-z/ ]+): ([-\d.]+)', prompt))
+    lines = [f"- {name.strip()}: {value}" for name, value in figures.items()]
+    return "Stub summary (no model was called):\n" + "\n".join(lines or ["- No figures found in the prompt."])
+
+
+class Handler(BaseHTTPRequestHandler):
+    delay = 0.0
+    fail_every = 0
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/stats':
+            self._send(200, {'generations': calls})
+        else:
+            self._send(404, {'error': 'not found'})
+
+    def do_POST(self):
+        global calls
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        with calls_lock:
+            calls += 1
+            call_number = calls
+        time.sleep(self.delay)
+        if self.fail_every and call_number % self.fail_every == 0:
+            self._send(503, {'error': 'stub: simulated overload'})
+            return
+        self._send(200, [{'generated_text': canned_summary(request.get('inputs', ''))}])
+
+    def log_message(self, fmt, *args):
+        print(f"[stub] {self.address_string()} {fmt % args}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--delay', type=float, default=1.0, help='Seconds to wait before answering, like a real model')
+    parser.add_argument('--fail-every', type=int, default=0, help='Answer every Nth request with a 503')
+    args = parser.parse_args()
+
+    Handler.delay = args.delay
+    Handler.fail_every = args.fail_every
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    # The bound port, so --port 0 (any free port) can be used by tests
+    host, port = server.server_address[:2]
+    print(f"Stub inference server on http://{host}:{port} (delay {args.delay}s)", flush=True)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
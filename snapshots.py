@@ -0,0 +1,104 @@
+# snapshots.py
+
+from datetime import date, timedelta
+
+from sqlalchemy import case, func
+
+from models import db, User, Transaction, Loan, NetWorthSnapshot
+from market_data import USD_INR_SYMBOL
+from amortization import balance_at
+from scheme_valuation import load_scheme_rows, value_schemes
+from valuation import load_holdings, value_portfolio
+
+
+def compute_net_worth(user_id, market_data_provider, quotes=None):
+    """
+    Current assets/liabilities breakdown for one user. Pass `quotes` to reuse
+    prices that were already fetched (the nightly job prices everyone at once).
+    """
+    cash_balance = db.session.query(func.sum(case(
+        (Transaction.type == 'income', Transaction.amount),
+        (Transaction.type == 'expense', -Transaction.amount),
+        else_=0
+    ))).filter(Transaction.user_id == user_id).scalar() or 0.0
+
+    total_schemes_value = value_schemes(load_scheme_rows(user_id))['total_current_value']
+
+    holdings = load_holdings(user_id)
+    if quotes is None:
+        quotes = market_data_provider.get_quotes(set(holdings.symbols) | {USD_INR_SYMBOL})
+    total_investments_value = value_portfolio(holdings, quotes).total_value_inr
+
+    loans = Loan.query.filter_by(user_id=user_id).all()
+    outstanding = balance_at([loan.principal for loan in loans], [loan.interest_rate for loan in loans],
+                             [loan.tenure_months for loan in loans], [loan.start_date for loan in loans]) if loans else []
+    total_liabilities = float(sum(outstanding))
+    loans_with_details = [{'loan_name': loan.loan_name, 'outstanding': float(balance)}
+                          for loan, balance in zip(loans, outstanding)]
+
+    total_assets = cash_balance + total_schemes_value + total_investments_value
+    return {
+        'cash': cash_balance,
+        'schemes': total_schemes_value,
+        'investments': total_investments_value,
+        'assets': total_assets,
+        'liabilities': total_liabilities,
+        'net_worth': total_assets - total_liabilities,
+        'loans': loans_with_details,
+    }
+
+
+def save_snapshot(user_id, breakdown, snapshot_date=None):
+    """Stores (or replaces) the user's snapshot for the day. The caller commits."""
+    snapshot_date = snapshot_date or date.today()
+    snapshot = NetWorthSnapshot.query.filter_by(user_id=user_id, snapshot_date=snapshot_date).first()
+    if not snapshot:
+        snapshot = NetWorthSnapshot(user_id=user_id, snapshot_date=snapshot_date)
+        db.session.add(snapshot)
+    snapshot.cash = breakdown['cash']
+    snapshot.schemes = breakdown['schemes']
+    snapshot.investments = breakdown['investments']
+    snapshot.liabilities = breakdown['liabilities']
+    snapshot.net_worth = breakdown['net_worth']
+    return snapshot
+
+
+def snapshot_all_users(market_data_provider, snapshot_date=None, progress=None):
+    """
+    Nightly batch job: prices every distinct symbol across all users with a
+    single provider call, then writes one snapshot row per user.
+    """
+    user_ids = [uid for uid, in db.session.query(User.id).order_by(User.id).all()]
+    symbols = {USD_INR_SYMBOL}
+    for uid in user_ids:
+        symbols.update(load_holdings(uid).symbols)
+    quotes = market_data_provider.get_quotes(symbols)
+
+    for done, uid in enumerate(user_ids, start=1):
+        save_snapshot(uid, compute_net_worth(uid, market_data_provider, quotes=quotes), snapshot_date)
+        db.session.commit()
+        if progress:
+            progress(done, len(user_ids))
+    return len(user_ids)
+
+
+def latest_snapshot(user_id):
+    return NetWorthSnapshot.query.filter_by(user_id=user_id).order_by(NetWorthSnapshot.snapshot_date.desc()).first()
+
+
+def snapshot_history(user_id, days=365):
+    rows = db.session.query(
+        NetWorthSnapshot.snapshot_date, NetWorthSnapshot.cash, NetWorthSnapshot.schemes,
+        NetWorthSnapshot.investments, NetWorthSnapshot.liabilities, NetWorthSnapshot.net_worth
+    ).filter(
+        NetWorthSnapshot.user_id == user_id,
+        NetWorthSnapshot.snapshot_date >= date.today() - timedelta(days=days)
+    ).order_by(NetWorthSnapshot.snapshot_date).all()
+    return {
+        'dates': [r.snapshot_date.strftime('%Y-%m-%d') for r in rows],
+        'cash': [r.cash for r in rows],
+        'schemes': [r.schemes for r in rows],
+        'investments': [r.investments for r in rows],
+        'liabilities': [r.liabilities for r in rows],
+        'net_worth': [r.net_worth for r in rows],
+    }
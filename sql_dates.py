@@ -0,0 +1,49 @@
+# sql_dates.py
+
+from sqlalchemy import Integer
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+
+class days_since(FunctionElement):
+    """Whole days from a date column to today (the database's current date), as SQL."""
+    type = Integer()
+    name = 'days_since'
+    inherit_cache = True
+
+
+@compiles(days_since)
+def _days_since_default(element, compiler, **kw):
+    # PostgreSQL: date - date is a number of days
+    return f"(CURRENT_DATE - {compiler.process(element.clauses, **kw)})"
+
+
+@compiles(days_since, 'mysql')
+def _days_since_mysql(element, compiler, **kw):
+    return f"DATEDIFF(CURRENT_DATE, {compiler.process(element.clauses, **kw)})"
+
+
+@compiles(days_since, 'sqlite')
+def _days_since_sqlite(element, compiler, **kw):
+    return f"CAST(julianday(date('now', 'localtime')) - julianday({compiler.process(element.clauses, **kw)}) AS INTEGER)"
+
+
+class months_since(FunctionElement):
+    """Calendar months from a date column's month to the current month, as SQL (the day of month is ignored)."""
+    type = Integer()
+    name = 'months_since'
+    inherit_cache = True
+
+
+@compiles(months_since)
+def _months_since_default(element, compiler, **kw):
+    column = compiler.process(element.clauses, **kw)
+    return (f"((EXTRACT(YEAR FROM CURRENT_DATE) - EXTRACT(YEAR FROM {column})) * 12"
+            f" + EXTRACT(MONTH FROM CURRENT_DATE) - EXTRACT(MONTH FROM {column}))")
+
+
+@compiles(months_since, 'sqlite')
+def _months_since_sqlite(element, compiler, **kw):
+    column = compiler.process(element.clauses, **kw)
+    return (f"((CAST(strftime('%Y', 'now', 'localtime') AS INTEGER) - CAST(strftime('%Y', {column}) AS INTEGER)) * 12"
+            f" + CAST(strftime('%m', 'now', 'localtime') AS INTEGER) - CAST(strftime('%m', {column}) AS INTEGER))")
@@ -0,0 +1,171 @@
+# tax_engine.py
+
+import numpy as np
+
+from gains_ledger import current_financial_year
+
+AGE_BANDS = ('below_60', 'senior', 'super_senior')  # <60, 60-79, 80+
+
+_OLD_REGIME = {'standard_deduction': 50000, 'rebate_limit': 500000,  # Section 87A: no tax up to this taxable income
+               'slabs': {'below_60': [(250000, 0.0), (500000, 0.05), (1000000, 0.20), (None, 0.30)],
+                         'senior': [(300000, 0.0), (500000, 0.05), (1000000, 0.20), (None, 0.30)],
+                         'super_senior': [(500000, 0.0), (1000000, 0.20), (None, 0.30)]}}
+
+
+def _new_regime(standard_deduction, rebate_limit, slabs):
+    return {'standard_deduction': standard_deduction, 'rebate_limit': rebate_limit,
+            'slabs': {band: slabs for band in AGE_BANDS}}
+
+
+# Financial year (starting year) -> rules in force from that year until the next entry.
+# Slabs are (upper bound, rate) with None for the open-ended top slab. A new FY's
+# budget is added here as another entry; years before the first entry aren't supported.
+TAX_TABLES = {
+    2023: {
+        'new': _new_regime(50000, 700000, [(300000, 0.0), (600000, 0.05), (900000, 0.10), (1200000, 0.15),
+                                           (1500000, 0.20), (None, 0.30)]),
+        'old': _OLD_REGIME,
+        'cess': 0.04,
+        'capital_gains': {'stcg_rate': 0.15, 'ltcg_rate': 0.10, 'ltcg_exemption': 100000, 'crypto_rate': 0.30},
+    },
+    2024: {
+        'new': _new_regime(75000, 700000, [(300000, 0.0), (700000, 0.05), (1000000, 0.10), (1200000, 0.15),
+                                           (1500000, 0.20), (None, 0.30)]),
+        'old': _OLD_REGIME,
+        'cess': 0.04,
+        # Rates for sales from 23 July 2024, which covers most of the year
+        'capital_gains': {'stcg_rate': 0.20, 'ltcg_rate': 0.125, 'ltcg_exemption': 125000, 'crypto_rate': 0.30},
+    },
+    2025: {
+        'new': _new_regime(75000, 1200000, [(400000, 0.0), (800000, 0.05), (1200000, 0.10), (1600000, 0.15),
+                                            (2000000, 0.20), (2400000, 0.25), (None, 0.30)]),
+        'old': _OLD_REGIME,
+        'cess': 0.04,
+        'capital_gains': {'stcg_rate': 0.20, 'ltcg_rate': 0.125, 'ltcg_exemption': 125000, 'crypto_rate': 0.30},
+    },
+}
+
+MAX_SCENARIOS = 10000
+MAX_AMOUNT = 10 ** 9  # Largest income or deduction the API routes accept
+
+
+def table_year(fy=None):
+    """The TAX_TABLES entry that applies to a financial year: the latest one starting at or before it."""
+    fy = current_financial_year() if fy is None else fy
+    applicable = [year for year in TAX_TABLES if year <= fy]
+    if not applicable:
+        raise ValueError(f"No tax table for FY {fy}; the earliest is FY {min(TAX_TABLES)}.")
+    return max(applicable)
+
+
+def tax_table(fy=None):
+    """Rules for the financial year."""
+    return TAX_TABLES[table_year(fy)]
+
+
+def valid_fy(fy):
+    """Financial years the API answers for: the earliest table's year up to next year."""
+    return min(TAX_TABLES) <= fy <= current_financial_year() + 1
+
+
+def age_band_index(age):
+    age = np.asarray(age)
+    return np.select([age < 60, age < 80], [0, 1], default=2)
+
+
+def slab_tax(taxable_income, slabs):
+    """Progressive tax on any array of incomes: the income falling in each slab times its rate, summed."""
+    upper = np.array([np.inf if bound is None else bound for bound, _ in slabs], dtype=np.float64)
+    lower = np.concatenate(([0.0], upper[:-1]))
+    rates = np.array([rate for _, rate in slabs])
+    in_slab = np.clip(np.asarray(taxable_income, dtype=np.float64)[..., None] - lower, 0, upper - lower)
+    return in_slab @ rates
+
+
+def regime_tax(regime, gross_income, deductions=0, age=0, fy=None):
+    """
+    Tax on regular income under 'new' or 'old' for arrays of scenarios; inputs
+    broadcast against each other. Deductions (80C, HRA) only apply to the old regime.
+    """
+    table = tax_table(fy)
+    rules = table[regime]
+    gross_income = np.asarray(gross_income, dtype=np.float64)
+    deductions = np.asarray(deductions if regime == 'old' else 0, dtype=np.float64)
+    taxable = np.maximum(gross_income - deductions - rules['standard_deduction'], 0)
+
+    bands = np.broadcast_to(age_band_index(age), np.broadcast_shapes(taxable.shape, np.shape(age)))
+    taxable = np.broadcast_to(taxable, bands.shape)
+    tax = np.zeros(bands.shape)
+    for index in np.unique(bands):
+        in_band = bands == index
+        tax[in_band] = slab_tax(taxable[in_band], rules['slabs'][AGE_BANDS[index]])
+    if rules['rebate_limit'] is not None:
+        tax = np.where(taxable <= rules['rebate_limit'], 0.0, tax)
+
+    cess = tax * table['cess']
+    return {'taxable_income': taxable, 'total_deductions': np.broadcast_to(deductions, bands.shape),
+            'standard_deduction': rules['standard_deduction'], 'income_tax': tax, 'cess': cess,
+            'total_tax': tax + cess}
+
+
+def capital_gains_tax(stcg=0, ltcg=0, crypto=0, fy=None):
+    """Tax on realised stock STCG, stock LTCG (above the exemption) and crypto gains, for arrays of scenarios."""
+    rules = tax_table(fy)['capital_gains']
+    stcg_tax = np.asarray(stcg, dtype=np.float64) * rules['stcg_rate']
+    ltcg_tax = np.maximum(np.asarray(ltcg, dtype=np.float64) - rules['ltcg_exemption'], 0) * rules['ltcg_rate']
+    crypto_tax = np.asarray(crypto, dtype=np.float64) * rules['crypto_rate']
+    return {'stcg_tax': stcg_tax, 'ltcg_tax': ltcg_tax, 'crypto_tax': crypto_tax,
+            'total_tax': stcg_tax + ltcg_tax + crypto_tax}
+
+
+def compare_regimes(gross_income, deductions=0, stcg=0, ltcg=0, crypto=0, age=0, fy=None):
+    """Total tax under both regimes for every scenario, with the cheaper regime and the saving."""
+    gains_tax = capital_gains_tax(stcg, ltcg, crypto, fy)['total_tax']
+    new_total = regime_tax('new', gross_income, age=age, fy=fy)['total_tax'] + gains_tax
+    old_total = regime_tax('old', gross_income, deductions, age, fy)['total_tax'] + gains_tax
+    new_total, old_total, gains_tax = np.broadcast_arrays(new_total, old_total, gains_tax)
+    return {'new_regime_tax': new_total, 'old_regime_tax': old_total, 'capital_gains_tax': gains_tax,
+            'better_regime': np.where(new_total <= old_total, 'new', 'old'),
+            'saving': np.abs(new_total - old_total)}
+
+
+def break_even_deductions(gross_income, age=0, fy=None, step=1000):
+    """
+    Smallest deductions (a multiple of `step`) at which the old regime costs no
+    more than the new one, per income; NaN where no deduction up to the income
+    itself gets there. Old-regime tax never rises with deductions, so each
+    income is bisected on the number of steps, all incomes at once.
+    """
+    gross_income = np.atleast_1d(np.asarray(gross_income, dtype=np.float64))
+    new = regime_tax('new', gross_income, age=age, fy=fy)['total_tax']
+
+    def old_beats(steps):
+        return regime_tax('old', gross_income, steps * step, age, fy)['total_tax'] <= new
+
+    low = np.zeros(gross_income.shape, dtype=np.int64)
+    high = np.floor(np.maximum(gross_income, 0) / step).astype(np.int64)
+    reachable = old_beats(high)
+    while np.any(low < high):
+        searching = low < high
+        mid = (low + high) // 2
+        beats = old_beats(mid)
+        high = np.where(searching & beats, mid, high)
+        low = np.where(searching & ~beats, mid + 1, low)
+    return np.where(reachable, high * step, np.nan)
+
+
+# --- Single-scenario wrappers used by the tax estimator page ---
+
+def _as_details(regime_name, gross_income, result):
+    return {'regime': regime_name, 'gross_income': gross_income,
+            'taxable_income': float(result['taxable_income']), 'total_deductions': float(result['total_deductions']),
+            'standard_deduction': result['standard_deduction'], 'income_tax': float(result['income_tax']),
+            'cess': float(result['cess']), 'total_tax': float(result['total_tax'])}
+
+
+def calculate_new_regime_tax(gross_income, fy=None):
+    return _as_details('New', gross_income, regime_tax('new', gross_income, fy=fy))
+
+
+def calculate_old_regime_tax(gross_income, total_deductions, age, fy=None):
+    return _as_details('Old', gross_income, regime_tax('old', gross_income, total_deductions, age, fy))
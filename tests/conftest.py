@@ -0,0 +1,32 @@
+# conftest.py
+
+import pytest
+from flask import Flask
+
+from models import db as _db, User
+
+
+@pytest.fixture
+def app():
+    # A bare app over an in-memory database: importing app.py would load the OCR and language models
+    app = Flask(__name__)
+    app.config.update(TESTING=True, SQLALCHEMY_DATABASE_URI='sqlite://')
+    _db.init_app(app)
+    with app.app_context():
+        _db.create_all()
+        yield app
+        _db.session.remove()
+        _db.drop_all()
+
+
+@pytest.fixture
+def db(app):
+    return _db
+
+
+@pytest.fixture
+def user(db):
+    user = User(username='owner', password='x')
+    db.session.add(user)
+    db.session.commit()
+    return user
@@ -0,0 +1,76 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+import amortization as am
+
+
+def test_emi():
+    assert am.emi(100000, 12, 12) == pytest.approx(8884.88, abs=0.01)
+    # Interest-free loans are repaid in equal parts
+    assert am.emi(120000, 0, 12) == pytest.approx(10000)
+    np.testing.assert_allclose(am.emi([100000, 120000], [12, 0], 12), [8884.88, 10000], atol=0.01)
+
+
+def test_balance_after_endpoints():
+    assert am.balance_after(100000, 9, 60, 0) == pytest.approx(100000)
+    assert am.balance_after(100000, 9, 60, 60) == pytest.approx(0, abs=1e-6)
+    assert am.balance_after(100000, 9, 60, 90) == pytest.approx(0, abs=1e-6)
+    assert am.balance_after(120000, 0, 12, 3) == pytest.approx(90000)
+
+
+def test_payments_made_counts_whole_months_capped_at_tenure():
+    assert am.payments_made(date(2024, 1, 15), 24, date(2024, 1, 31)) == 0
+    assert am.payments_made(date(2024, 1, 15), 24, date(2024, 4, 1)) == 3
+    assert am.payments_made(date(2024, 1, 15), 24, date(2030, 1, 1)) == 24
+    assert am.payments_made(date(2024, 1, 15), 24, date(2023, 1, 1)) == 0
+    np.testing.assert_array_equal(am.payments_made([date(2024, 1, 1), date(2024, 3, 1)], 12, date(2024, 4, 1)), [3, 1])
+
+
+def test_schedule_is_consistent():
+    schedule = am.schedules(100000, 10, 24)
+    instalment = am.emi(100000, 10, 24)
+    np.testing.assert_allclose(schedule['payment'][0], instalment)
+    assert schedule['principal'][0].sum() == pytest.approx(100000)
+    assert schedule['interest'][0].sum() == pytest.approx(24 * instalment - 100000)
+    assert schedule['balance'][0, -1] == pytest.approx(0, abs=1e-6)
+    assert am.interest_paid(100000, 10, 24, 6) == pytest.approx(schedule['interest'][0, :6].sum())
+
+
+def test_schedules_pad_shorter_loans_with_zeros():
+    schedule = am.schedules([50000, 80000], [8, 0], [6, 12])
+    assert schedule['payment'].shape == (2, 12)
+    assert (schedule['payment'][0, 6:] == 0).all()
+    np.testing.assert_allclose(schedule['principal'].sum(axis=1), [50000, 80000])
+
+
+def test_simulate_without_changes_matches_the_schedule():
+    simulated = am.simulate(200000, 8.5, 36)
+    schedule = am.schedules(200000, 8.5, 36)
+    assert len(simulated['month']) == 36
+    np.testing.assert_allclose(simulated['interest'], schedule['interest'][0])
+    np.testing.assert_allclose(simulated['balance'], schedule['balance'][0], atol=1e-6)
+
+
+def test_prepayment_shortens_the_loan_or_lowers_the_instalment():
+    base = am.schedule_summary(am.simulate(200000, 8.5, 36))
+    shorter = am.simulate(200000, 8.5, 36, prepayments={6: 50000}, reduce='tenure')
+    cheaper = am.simulate(200000, 8.5, 36, prepayments={6: 50000}, reduce='emi')
+
+    assert len(shorter['month']) < 36
+    assert am.schedule_summary(shorter)['total_interest'] < base['total_interest']
+    assert len(cheaper['month']) == 36
+    assert cheaper['payment'][6] < cheaper['payment'][5]
+    assert shorter['balance'][-1] == pytest.approx(0, abs=0.01)
+    assert cheaper['balance'][-1] == pytest.approx(0, abs=0.01)
+
+
+def test_rate_rise_with_fixed_instalment_stretches_the_loan():
+    stretched = am.simulate(200000, 8, 36, rate_changes={12: 12})
+    assert len(stretched['month']) > 36
+    assert stretched['interest'][11] > stretched['interest'][10] * 1.3
+
+
+def test_payment_dates():
+    assert am.payment_dates(date(2024, 1, 31), [1, 2]) == [date(2024, 2, 29), date(2024, 3, 31)]
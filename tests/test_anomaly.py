@@ -0,0 +1,99 @@
+import json
+from datetime import date, timedelta
+
+import pytest
+
+from anomaly import ALL_CATEGORIES, MIN_HISTORY, is_anomalous, reset_stats, score_transaction
+from models import AnomalyStats, Category, Transaction
+
+START = date(2024, 1, 1)
+
+
+@pytest.fixture
+def categories(db, user):
+    food, rent = Category(name='Food', type='expense', user_id=user.id), Category(name='Rent', type='expense', user_id=user.id)
+    db.session.add_all([food, rent])
+    db.session.commit()
+    return food.id, rent.id
+
+
+def add_expense(db, user, category_id, amount, days=0, score=True, type='expense'):
+    transaction = Transaction(description='spend', amount=amount, type=type, date=START + timedelta(days=days),
+                              user_id=user.id, category_id=category_id)
+    db.session.add(transaction)
+    db.session.commit()
+    if score:
+        score_transaction(transaction, 'personal')
+        db.session.commit()
+    return transaction
+
+
+def stats(user, category_id):
+    return AnomalyStats.query.filter_by(user_id=user.id, ledger='personal', category_id=category_id).first()
+
+
+def test_no_score_until_min_history(db, user, categories):
+    food, _ = categories
+    scores = [add_expense(db, user, food, 100.0 + i % 5, days=i).anomaly_score for i in range(MIN_HISTORY + 1)]
+    assert scores[:MIN_HISTORY] == [None] * MIN_HISTORY
+    assert scores[MIN_HISTORY] is not None and not is_anomalous(scores[MIN_HISTORY])
+    assert stats(user, food).sample_count == MIN_HISTORY + 1
+
+
+def test_outlier_is_flagged_and_income_is_not_scored(db, user, categories):
+    food, _ = categories
+    for i in range(MIN_HISTORY):
+        add_expense(db, user, food, 100.0 + i % 5, days=i)
+    spike = add_expense(db, user, food, 5000.0, days=MIN_HISTORY)
+    assert is_anomalous(spike.anomaly_score)
+    assert score_transaction(add_expense(db, user, food, 9999.0, score=False, type='income'), 'personal') is None
+
+
+def test_sparse_category_falls_back_to_all_expenses(db, user, categories):
+    food, rent = categories
+    for i in range(MIN_HISTORY):
+        add_expense(db, user, food, 100.0, days=i)
+    first_rent = add_expense(db, user, rent, 100.0, days=MIN_HISTORY)
+    assert first_rent.anomaly_score == 0.0  # Scored against every expense, not the empty Rent window
+    assert stats(user, rent).sample_count == 1
+    assert stats(user, ALL_CATEGORIES).sample_count == MIN_HISTORY + 1
+
+
+def test_stats_are_seeded_from_existing_history(db, user, categories):
+    food, _ = categories
+    for i in range(MIN_HISTORY):
+        add_expense(db, user, food, 100.0, days=i, score=False)
+    assert add_expense(db, user, food, 100.0, days=MIN_HISTORY).anomaly_score == 0.0
+    assert stats(user, food).sample_count == MIN_HISTORY + 1
+
+
+def test_reset_drops_only_the_affected_categories_and_leaves_the_commit_to_the_caller(db, user, categories):
+    food, rent = categories
+    add_expense(db, user, food, 100.0)
+    add_expense(db, user, rent, 900.0)
+    assert AnomalyStats.query.count() == 3
+
+    assert reset_stats(user.id, 'personal', {food}) == 2
+    assert stats(user, rent) is not None and stats(user, food) is None and stats(user, ALL_CATEGORIES) is None
+    db.session.rollback()
+    assert AnomalyStats.query.count() == 3  # Nothing was committed inside reset_stats
+
+    assert reset_stats(user.id, 'business', {food}) == 0
+    assert reset_stats(user.id, 'personal', {food, rent}) == 3
+
+
+def test_stats_are_reseeded_after_an_edit(db, user, categories):
+    food, rent = categories
+    rows = [add_expense(db, user, food, 100.0, days=i) for i in range(MIN_HISTORY)]
+    moved = rows[0]
+
+    # Move one expense to Rent and make it large, as the edit route does
+    moved.amount, moved.category_id = 700.0, rent
+    reset_stats(user.id, 'personal', {food, rent})
+    db.session.commit()
+
+    add_expense(db, user, food, 100.0, days=MIN_HISTORY)
+    # Re-seeded from the edited history: the moved expense left Food's window and counts in the overall one
+    assert json.loads(stats(user, food).window) == [100.0] * MIN_HISTORY
+    assert sorted(json.loads(stats(user, ALL_CATEGORIES).window)) == [100.0] * MIN_HISTORY + [700.0]
+    assert stats(user, rent) is None
@@ -0,0 +1,154 @@
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+
+import business_metrics as bm
+from models import BusinessMetrics, BusinessTransaction, Category, User
+
+TODAY = date.today()
+LAST_MONTH = TODAY.replace(day=1) - timedelta(days=1)
+
+
+@pytest.fixture
+def category(db, user):
+    category = Category(name='General', type='expense', user_id=user.id)
+    db.session.add(category)
+    db.session.commit()
+    return category
+
+
+@pytest.fixture
+def add(db, user, category):
+    def add(amount, ttype, day=TODAY, user_id=None):
+        transaction = BusinessTransaction(user_id=user_id or user.id, description='x', amount=amount, type=ttype,
+                                          date=day, category_id=category.id)
+        db.session.add(transaction)
+        db.session.commit()
+        return transaction
+    return add
+
+
+def stored(db, user_id):
+    db.session.expire_all()
+    metrics = BusinessMetrics.query.filter_by(user_id=user_id).one()
+    return metrics.monthly_revenue, metrics.monthly_expenses, metrics.net_profit, metrics.profit_margin
+
+
+def assert_consistent(db, user_id):
+    """The maintained row equals a recount of the month's transactions."""
+    revenue, expenses = bm.month_totals(db.session, user_id, *bm.current_period())
+    margin = (revenue - expenses) / revenue * 100 if revenue > 0 else 0
+    assert stored(db, user_id) == pytest.approx((revenue, expenses, revenue - expenses, margin))
+
+
+def test_first_transaction_creates_the_row(db, user, add):
+    add(1000, 'revenue')
+    metrics = BusinessMetrics.query.filter_by(user_id=user.id).one()
+    assert (metrics.period_year, metrics.period_month) == bm.current_period()
+    assert stored(db, user.id) == pytest.approx((1000, 0, 1000, 100))
+
+
+def test_adds_edits_and_deletes_keep_the_totals(db, user, add):
+    add(1000, 'revenue')
+    add(500, 'revenue')
+    expense = add(200, 'expense')
+    add(99, 'expense', LAST_MONTH)
+    assert stored(db, user.id) == pytest.approx((1500, 200, 1300, 1300 / 1500 * 100))
+
+    expense.amount = 350
+    db.session.commit()
+    assert_consistent(db, user.id)
+
+    expense.type = 'revenue'
+    db.session.commit()
+    assert stored(db, user.id)[:2] == pytest.approx((1850, 0))
+
+    expense.date = LAST_MONTH
+    db.session.commit()
+    assert stored(db, user.id)[:2] == pytest.approx((1500, 0))
+
+    expense.date = TODAY
+    db.session.commit()
+    assert_consistent(db, user.id)
+
+    db.session.delete(expense)
+    db.session.commit()
+    assert stored(db, user.id)[:2] == pytest.approx((1500, 0))
+
+
+def test_edit_of_an_expired_transaction_uses_the_stored_values(db, user, add):
+    expense = add(200, 'expense')
+    db.session.expire_all()
+    # Set without loading first: the old type is only known to the database
+    expense.type = 'revenue'
+    db.session.commit()
+    assert stored(db, user.id)[:2] == pytest.approx((200, 0))
+
+
+def test_other_months_are_not_counted(db, user, add):
+    add(100, 'revenue')
+    add(70, 'revenue', LAST_MONTH)
+    add(30, 'expense', TODAY.replace(day=1) + timedelta(days=40))
+    assert stored(db, user.id)[:2] == pytest.approx((100, 0))
+
+
+def test_users_are_kept_apart(db, user, add):
+    other = User(username='other', password='x')
+    db.session.add(other)
+    db.session.commit()
+    add(100, 'revenue')
+    add(40, 'expense', user_id=other.id)
+    assert stored(db, user.id)[:2] == pytest.approx((100, 0))
+    assert stored(db, other.id)[:2] == pytest.approx((0, 40))
+
+
+def make_stale(db, user_id):
+    metrics = BusinessMetrics.query.filter_by(user_id=user_id).one()
+    metrics.period_year -= 1
+    metrics.monthly_revenue = 12345
+    db.session.commit()
+
+
+def test_first_write_of_a_new_month_rebuilds(db, user, add):
+    add(100, 'revenue')
+    make_stale(db, user.id)
+    add(10, 'expense')
+    assert stored(db, user.id)[:2] == pytest.approx((100, 10))
+    assert_consistent(db, user.id)
+
+
+def test_first_read_of_a_new_month_rebuilds(db, user, add):
+    add(100, 'revenue')
+    make_stale(db, user.id)
+    metrics = bm.current_metrics(user.id)
+    assert (metrics.period_year, metrics.period_month) == bm.current_period()
+    assert_consistent(db, user.id)
+
+
+def test_current_read_is_a_single_select(db, user, add):
+    add(100, 'revenue')
+    user_id = user.id
+    db.session.expire_all()
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        metrics = bm.current_metrics(user_id)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert metrics.monthly_revenue == 100
+    assert len(statements) == 1 and statements[0].startswith('SELECT')
+
+
+def test_repair_recomputes_drifted_rows(db, user, add):
+    add(100, 'revenue')
+    add(30, 'expense')
+    BusinessMetrics.query.filter_by(user_id=user.id).one().monthly_revenue = 0
+    db.session.commit()
+
+    assert bm.repair_metrics() == 1
+    assert_consistent(db, user.id)
@@ -0,0 +1,68 @@
+import pytest
+
+from category_model import (GLOBAL_MIN_CONFIDENCE, PERSONALIZATION_PRIOR, OnlineCategoryClassifier, normalize_category,
+                            suggest_category)
+
+USER_CATEGORIES = ['Cabs', 'Food & Dining']
+
+
+def global_model():
+    # The shared model knows 'uber' as transport, which this user calls 'Cabs' only in their own model
+    return OnlineCategoryClassifier.fit(['uber ride', 'uber trip', 'swiggy order', 'zomato dinner'] * 5,
+                                        ['transport', 'transport', 'food dining', 'food dining'] * 5)
+
+
+def user_model(n_samples):
+    # A user who files their commute under food, against what everyone else does
+    return OnlineCategoryClassifier.fit(['uber ride office'] * n_samples, ['Food & Dining'] * n_samples,
+                                        classes=USER_CATEGORIES, n_features=2**10)
+
+
+def test_normalize_category():
+    assert normalize_category(' Food & Dining ') == 'food dining'
+    assert normalize_category('FOOD-dining') == 'food dining'
+    assert normalize_category(None) == ''
+
+
+def test_online_model_rejects_unseen_categories():
+    model = user_model(3)
+    assert model.learn_one('rent', 'Rent') is False
+    assert model.n_samples == 3 and model.online_updates == 0
+    assert model.learn_one('ola cab', 'Cabs') is True
+    assert model.online_updates == 1
+    assert model.predict(['ola cab'])[0] == 'Cabs'
+
+
+def test_shared_model_alone_maps_onto_the_users_names():
+    assert suggest_category('swiggy order', ['Rent', 'Food & Dining'], global_model=global_model()) == 'Food & Dining'
+    # 'uber' is transport, which this user has no category for
+    assert suggest_category('uber ride', ['Rent', 'Food & Dining'], global_model=global_model()) is None
+
+
+def test_shared_model_alone_needs_confidence():
+    shared = OnlineCategoryClassifier.fit(['payment'] * 2, ['food dining', 'transport'])
+    assert suggest_category('payment', ['Food & Dining', 'Transport'], global_model=shared,
+                            min_confidence=GLOBAL_MIN_CONFIDENCE) is None
+    assert suggest_category('payment', ['Food & Dining', 'Transport'], global_model=shared, min_confidence=0.4) is not None
+
+
+def test_own_model_takes_over_as_the_user_labels_more():
+    categories = ['Transport', 'Food & Dining']
+    # A couple of personal labels are outweighed by the shared model
+    few = user_model(2)
+    assert few.n_samples / (few.n_samples + PERSONALIZATION_PRIOR) < 0.5
+    assert suggest_category('uber ride', categories, user_model=few, global_model=global_model()) == 'Transport'
+    # With a long history the user's own labelling wins
+    assert suggest_category('uber ride', categories, user_model=user_model(200), global_model=global_model()) == 'Food & Dining'
+
+
+def test_own_model_covers_names_the_shared_model_lacks():
+    model = OnlineCategoryClassifier.fit(['ola cab'] * 40, ['Cabs'] * 40, classes=USER_CATEGORIES)
+    assert suggest_category('ola cab', USER_CATEGORIES, user_model=model, global_model=global_model()) == 'Cabs'
+    assert suggest_category('ola cab', USER_CATEGORIES, user_model=model) == 'Cabs'
+
+
+@pytest.mark.parametrize('names', [[], ['Food & Dining']])
+def test_no_models_or_categories_means_no_suggestion(names):
+    assert suggest_category('swiggy order', names) is None
+    assert suggest_category('swiggy order', [], user_model=user_model(5), global_model=global_model()) is None
@@ -0,0 +1,86 @@
+from datetime import date
+
+from category_model import GLOBAL_MIN_USERS
+from category_training import global_classes, train_global_model, train_user_model, users_below
+from models import BusinessTransaction, Category, Transaction, User
+
+
+def add_user(db, username, labelled, type='expense'):
+    """labelled: {category name: [descriptions]}"""
+    user = User(username=username, password='x')
+    db.session.add(user)
+    db.session.flush()
+    for name, descriptions in labelled.items():
+        category = Category(name=name, type=type, user_id=user.id)
+        db.session.add(category)
+        db.session.flush()
+        for description in descriptions:
+            db.session.add(Transaction(description=description, amount=10.0, type=type, date=date(2024, 1, 1),
+                                       user_id=user.id, category_id=category.id))
+    db.session.commit()
+    return user.id
+
+
+FOOD = {'Food': ['swiggy order', 'zomato dinner']}
+TRANSPORT = {'Transport': ['uber ride', 'ola cab']}
+
+
+def test_nothing_is_shared_until_enough_users_have_a_category(db):
+    for n in range(GLOBAL_MIN_USERS - 1):
+        add_user(db, f'user{n}', {**FOOD, **TRANSPORT})
+    assert global_classes('category') == []
+    assert train_global_model('category') is None
+
+    add_user(db, 'third', {'Food': ['pizza'], 'My Pets': ['vet']})
+    assert global_classes('category') == ['food']
+    model = train_global_model('category')
+    assert list(model.classes) == ['food']
+    assert model.n_samples == 2 * (GLOBAL_MIN_USERS - 1) + 1
+
+
+def test_shared_model_learns_normalized_names_used_by_enough_users(db):
+    add_user(db, 'a', {'Food': ['swiggy order'], 'Transport': ['uber ride'], 'Secret Project': ['lab kit']})
+    add_user(db, 'b', {'food': ['zomato dinner'], 'TRANSPORT': ['ola cab']})
+    add_user(db, 'c', {' Food ': ['dominos pizza'], 'Transport': ['metro card']})
+
+    model = train_global_model('category', batch_size=2)
+    assert list(model.classes) == ['food', 'transport']
+    assert model.n_samples == 6  # The one-user category's rows are left out
+    assert model.predict(['uber ride'])[0] == 'transport'
+
+
+def test_income_is_not_training_data_for_personal_models(db):
+    for n in range(GLOBAL_MIN_USERS):
+        add_user(db, f'earner{n}', {'Salary': ['monthly salary']}, type='income')
+    assert global_classes('category') == []
+    assert global_classes('business_category') == []
+
+
+def test_user_model_needs_enough_rows(db):
+    user_id = add_user(db, 'saver', {'Food': ['swiggy order'] * 6, 'Transport': ['uber ride'] * 4, 'Rent': []})
+    assert train_user_model('category', user_id, min_rows=11) is None
+
+    model = train_user_model('category', user_id, min_rows=10)
+    assert model.n_samples == 10
+    assert set(model.classes) == {'Food', 'Rent', 'Transport'}  # Categories without examples yet are known
+    assert model.predict(['uber ride'])[0] == 'Transport'
+
+
+def test_business_models_train_on_business_transactions(db, user):
+    category = Category(name='Software', type='expense', user_id=user.id)
+    db.session.add(category)
+    db.session.flush()
+    for n in range(3):
+        db.session.add(BusinessTransaction(description=f'aws invoice {n}', amount=10.0, type='expense',
+                                           date=date(2024, 1, 1), user_id=user.id, category_id=category.id))
+    db.session.commit()
+    assert train_user_model('business_category', user.id, min_rows=3).n_samples == 3
+    assert train_user_model('category', user.id, min_rows=1) is None
+
+
+def test_users_below_the_threshold(db):
+    small = add_user(db, 'small', FOOD)
+    large = add_user(db, 'large', {'Food': ['swiggy order'] * 5})
+    add_user(db, 'empty', {})
+    assert users_below('category', 5) == [small]
+    assert sorted(users_below('category', 6)) == [small, large]
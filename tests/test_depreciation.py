@@ -0,0 +1,76 @@
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from depreciation import DAYS_PER_YEAR, depreciation_schedule, project_values
+from models import BusinessInvestment, User
+
+START = date(2025, 1, 1)
+
+
+def add_asset(db, user_id, name, amount, purchase_date, life, investment_type='Equipment'):
+    asset = BusinessInvestment(user_id=user_id, investment_name=name, investment_type=investment_type,
+                               amount_invested=amount, purchase_date=purchase_date, useful_life_years=life)
+    db.session.add(asset)
+    db.session.commit()
+    return asset
+
+
+def test_straight_line_until_fully_depreciated(db, user):
+    add_asset(db, user.id, 'Laptop', 120000.0, date(2023, 1, 1), 3)
+    schedule = depreciation_schedule(user.id, months=24, start_date=START)
+
+    assert len(schedule['dates']) == 25
+    assert schedule['dates'][:2] == ['2025-01-01', '2025-02-01']
+    values = schedule['assets'][0]['values']
+    assert values[0] == pytest.approx(120000 - 40000 * 731 / DAYS_PER_YEAR)
+    assert all(a >= b for a, b in zip(values, values[1:]))
+    assert values[12] == values[-1] == 0.0  # Past its three-year life
+
+
+@pytest.mark.parametrize('investment_type,life', [('Financial', 5), ('Equipment', None), ('Equipment', 0)])
+def test_assets_without_a_useful_life_keep_their_cost(db, user, investment_type, life):
+    add_asset(db, user.id, 'Holding', 50000.0, date(2020, 1, 1), life, investment_type)
+    asset = depreciation_schedule(user.id, months=6, start_date=START)['assets'][0]
+    assert not asset['depreciating']
+    assert asset['values'] == [50000.0] * 7
+
+
+def test_assets_are_held_at_cost_until_their_purchase_date():
+    values = project_values([12000.0], [1], [date(2025, 3, 1)], [True],
+                            [date(2025, 1, 1), date(2025, 3, 1), date(2025, 9, 1)])
+    np.testing.assert_allclose(values[0], [12000, 12000, 12000 - 12000 * 184 / DAYS_PER_YEAR])
+
+
+def test_total_sums_the_users_own_assets(db, user):
+    other = User(username='other', password='x')
+    db.session.add(other)
+    db.session.commit()
+    first = add_asset(db, user.id, 'Van', 800000.0, date(2024, 1, 1), 8, 'Vehicle')
+    second = add_asset(db, user.id, 'Bonds', 100000.0, date(2024, 1, 1), None, 'Financial')
+    add_asset(db, other.id, 'Press', 1e6, date(2024, 1, 1), 10)
+
+    schedule = depreciation_schedule(user.id, months=12, start_date=START)
+    assert [(a['id'], a['name'], a['type']) for a in schedule['assets']] == [(first.id, 'Van', 'Vehicle'),
+                                                                          (second.id, 'Bonds', 'Financial')]
+    np.testing.assert_allclose(schedule['total'], np.sum([a['values'] for a in schedule['assets']], axis=0))
+
+
+def test_user_without_assets(db, user):
+    schedule = depreciation_schedule(user.id, months=3, start_date=START)
+    assert schedule == {'dates': ['2025-01-01', '2025-02-01', '2025-03-01', '2025-04-01'], 'assets': [],
+                        'total': [0.0] * 4}
+
+
+def test_first_column_matches_the_current_value(db, user):
+    rng = random.Random(7)
+    today = date.today()
+    assets = [add_asset(db, user.id, 'asset', rng.uniform(1e3, 1e6), today - timedelta(days=rng.randint(0, 6000)),
+                        rng.choice([None, 0, rng.randint(1, 15)]),
+                        rng.choice(['Equipment', 'Financial', 'Vehicle', None]))
+              for _ in range(50)]
+    schedule = depreciation_schedule(user.id, months=1)
+    for asset, projected in zip(assets, schedule['assets']):
+        assert projected['values'][0] == pytest.approx(asset.current_value, rel=1e-9, abs=1e-6)
@@ -0,0 +1,145 @@
+from datetime import date, timedelta
+
+import pytest
+
+from forecasting import batch_refresh_forecasts, inline_forecast, refresh_forecast, save_forecast, stored_forecast
+from ledger_version import current_version
+from models import Category, Forecast, Transaction, User
+
+
+def add_user(db, username):
+    user = User(username=username, password='x')
+    db.session.add(user)
+    db.session.flush()
+    category = Category(name='General', type='expense', user_id=user.id)
+    db.session.add(category)
+    db.session.commit()
+    return user.id, category.id
+
+
+def add_history(db, user_id, category_id, days, end=None):
+    end = end or date.today()
+    for offset in range(days):
+        day = end - timedelta(days=days - 1 - offset)
+        db.session.add(Transaction(description='salary' if offset % 7 == 0 else 'spend', amount=500.0 if offset % 7 == 0 else 40.0,
+                                   type='income' if offset % 7 == 0 else 'expense', date=day,
+                                   user_id=user_id, category_id=category_id))
+    db.session.commit()
+
+
+@pytest.fixture
+def saver(db):
+    user_id, category_id = add_user(db, 'saver')
+    add_history(db, user_id, category_id, 30)
+    return user_id, category_id
+
+
+def test_missing_forecast_is_stale(db, saver):
+    assert stored_forecast('balance', saver[0]) == (None, True)
+
+
+def test_stored_forecast_is_fresh_until_the_ledger_changes(db, saver):
+    user_id, category_id = saver
+    refresh_forecast('balance', user_id)
+    payload, stale = stored_forecast('balance', user_id)
+    assert not stale
+    assert len(payload['prediction']) == 30 and payload['model'] == 'Holt (weekly)'
+    assert Forecast.query.filter_by(user_id=user_id).one().ledger_version == current_version(user_id, 'personal')
+
+    add_history(db, user_id, category_id, 1)
+    assert stored_forecast('balance', user_id)[1]
+    refresh_forecast('balance', user_id)
+    assert not stored_forecast('balance', user_id)[1]
+
+
+def test_derived_columns_and_other_users_do_not_invalidate(db, saver):
+    user_id, _ = saver
+    refresh_forecast('balance', user_id)
+
+    Transaction.query.filter_by(user_id=user_id).first().anomaly_score = 1.5
+    db.session.commit()
+    other_id, other_category = add_user(db, 'other')
+    add_history(db, other_id, other_category, 5)
+    assert not stored_forecast('balance', user_id)[1]
+
+    transaction = Transaction.query.filter_by(user_id=user_id).first()
+    transaction.amount += 1
+    db.session.commit()
+    assert stored_forecast('balance', user_id)[1]
+
+
+def test_deleting_a_transaction_invalidates(db, saver):
+    user_id, _ = saver
+    refresh_forecast('balance', user_id)
+    db.session.delete(Transaction.query.filter_by(user_id=user_id).first())
+    db.session.commit()
+    assert stored_forecast('balance', user_id)[1]
+
+
+def test_inline_forecast_is_stored_only_when_the_background_would_agree(db, saver):
+    user_id, category_id = saver
+    payload, complete = inline_forecast('balance', user_id)
+    assert complete
+    assert stored_forecast('balance', user_id) == (payload, False)
+
+    long_id, long_category = add_user(db, 'long')
+    add_history(db, long_id, long_category, 200)
+    payload, complete = inline_forecast('balance', long_id)
+    assert not complete  # Worth Prophet, which only the background budget allows
+    assert len(payload['prediction']) == 30
+    assert stored_forecast('balance', long_id) == (None, True)
+
+
+def test_stored_cashflow_drops_days_that_have_passed(db, saver):
+    user_id, _ = saver
+    days = [(date.today() + timedelta(days=d)).isoformat() for d in (-2, -1, 0, 1)]
+    save_forecast(user_id, 'business_cashflow', 0, {'dates': days, 'predicted_flow': [1, 2, 3, 4],
+                                                    'lower_bound': [0, 1, 2, 3], 'upper_bound': [2, 3, 4, 5]}, 'Holt')
+    db.session.commit()
+    payload, stale = stored_forecast('business_cashflow', user_id)
+    assert not stale
+    assert payload == {'dates': days[2:], 'predicted_flow': [3, 4], 'lower_bound': [2, 3], 'upper_bound': [4, 5]}
+
+
+def test_batch_refresh_fits_only_missing_or_stale_forecasts(db, saver):
+    user_id, category_id = saver
+    fresh_id, fresh_category = add_user(db, 'fresh')
+    add_history(db, fresh_id, fresh_category, 10)
+    refresh_forecast('balance', fresh_id)
+    fresh_computed_at = Forecast.query.filter_by(user_id=fresh_id).one().computed_at
+    progress = []
+
+    stats = batch_refresh_forecasts(['balance'], workers=2, progress=lambda done, elapsed: progress.append(done))
+    assert stats['fitted'] == 1 and stats['errors'] == 0
+    assert stats['by_model'] == {'Holt (weekly)': 1}
+    assert progress == [1]
+    assert not stored_forecast('balance', user_id)[1]
+    assert Forecast.query.filter_by(user_id=fresh_id).one().computed_at == fresh_computed_at
+
+    assert batch_refresh_forecasts(['balance'], workers=2)['fitted'] == 0
+    add_history(db, user_id, category_id, 1)
+    assert batch_refresh_forecasts(['balance'], workers=2)['fitted'] == 1
+
+
+def test_batch_refresh_matches_a_single_refresh(db, saver):
+    user_id, _ = saver
+    refresh_forecast('balance', user_id)
+    single = stored_forecast('balance', user_id)[0]
+    Forecast.query.delete()
+    db.session.commit()
+
+    batch_refresh_forecasts(['balance'], workers=1)
+    assert stored_forecast('balance', user_id) == (single, False)
+
+
+def test_forced_batch_refresh_refits_everyone(db, saver):
+    for n in range(4):
+        user_id, category_id = add_user(db, f'user{n}')
+        add_history(db, user_id, category_id, 3 + n)
+    batch_refresh_forecasts(['balance'], workers=2)
+
+    stats = batch_refresh_forecasts(['balance'], workers=2, force=True, commit_every=2)
+    assert stats['fitted'] == 5
+    assert stats['per_second'] > 0
+    assert Forecast.query.count() == 5
+    assert not any(stored_forecast('balance', f.user_id)[1] for f in Forecast.query)
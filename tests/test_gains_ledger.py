@@ -0,0 +1,79 @@
+from datetime import date
+
+from sqlalchemy.orm import Query
+
+from gains_ledger import financial_year_of, fy_label, gains_for_year, ledger_years, rebuild_ledger, record_gain
+from models import CapitalGainsLedger, SoldInvestment
+
+SALES = [
+    ('Stock', 'STCG', date(2024, 3, 31), 100.0),
+    ('Stock', 'STCG', date(2024, 4, 1), 50.0),
+    ('Stock', 'STCG', date(2025, 3, 31), 25.0),
+    ('Stock', 'LTCG', date(2024, 9, 1), 300.0),
+    ('Crypto', 'STCG', date(2024, 12, 1), -40.0),
+]
+
+
+def add_sales(db, user):
+    for asset_type, gain_type, sell_date, gain in SALES:
+        db.session.add(SoldInvestment(user_id=user.id, asset_type=asset_type, ticker_symbol='t', quantity=1,
+                                      purchase_price=1, purchase_date=date(2020, 1, 1), sell_price=1,
+                                      sell_date=sell_date, capital_gain=gain, gain_type=gain_type))
+        record_gain(user.id, sell_date, asset_type, gain_type, gain)
+    db.session.commit()
+
+
+def test_financial_year_starts_in_april():
+    assert financial_year_of(date(2024, 3, 31)) == 2023
+    assert financial_year_of(date(2024, 4, 1)) == 2024
+    assert fy_label(2024) == 'FY 2024-25'
+
+
+def test_record_gain_accumulates_per_financial_year(db, user):
+    add_sales(db, user)
+    assert gains_for_year(user.id, 2023) == {('Stock', 'STCG'): 100.0}
+    assert gains_for_year(user.id, 2024) == {('Stock', 'STCG'): 75.0, ('Stock', 'LTCG'): 300.0,
+                                             ('Crypto', 'STCG'): -40.0}
+    assert ledger_years(user.id) == [2023, 2024]
+
+
+def test_rebuild_matches_incremental_totals(db, user):
+    add_sales(db, user)
+    incremental = {(r.financial_year, r.asset_type, r.gain_type): (r.total_gain, r.sale_count)
+                   for r in CapitalGainsLedger.query.all()}
+
+    assert rebuild_ledger(user.id) == len(incremental)
+    rebuilt = {(r.financial_year, r.asset_type, r.gain_type): (r.total_gain, r.sale_count)
+               for r in CapitalGainsLedger.query.all()}
+    assert rebuilt == incremental
+    assert rebuilt[(2024, 'Stock', 'STCG')] == (75.0, 2)
+
+
+def test_losing_the_insert_race_falls_back_to_an_increment(db, user, monkeypatch):
+    record_gain(user.id, date(2024, 5, 1), 'Stock', 'STCG', 10.0)
+    db.session.commit()
+
+    # Make the first UPDATE miss, as if another sale created the row between it and our insert
+    update = Query.update
+    misses = iter([True])
+    monkeypatch.setattr(Query, 'update', lambda self, *args, **kwargs: 0 if next(misses, False)
+                        else update(self, *args, **kwargs))
+    sale = SoldInvestment(user_id=user.id, asset_type='Stock', ticker_symbol='t', quantity=1, purchase_price=1,
+                          purchase_date=date(2020, 1, 1), sell_price=1, sell_date=date(2024, 5, 2),
+                          capital_gain=5.0, gain_type='STCG')
+    db.session.add(sale)
+    record_gain(user.id, date(2024, 5, 2), 'Stock', 'STCG', 5.0)
+    db.session.commit()
+
+    entry = CapitalGainsLedger.query.one()
+    assert (entry.total_gain, entry.sale_count) == (15.0, 2)
+    # The savepoint kept the caller's own writes
+    assert db.session.get(SoldInvestment, sale.id) is not None
+
+
+def test_several_lots_in_one_sale_share_the_row(db, user):
+    for gain in (1.0, 2.0, 3.0):
+        record_gain(user.id, date(2024, 5, 1), 'Crypto', 'STCG', gain)
+    db.session.commit()
+    assert gains_for_year(user.id, 2024) == {('Crypto', 'STCG'): 6.0}
+    assert CapitalGainsLedger.query.one().sale_count == 3
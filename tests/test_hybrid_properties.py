@@ -0,0 +1,69 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.dialects import mysql, postgresql
+
+from models import BusinessInvestment, BusinessLoan
+
+TODAY = date.today()
+
+
+@pytest.fixture
+def loans(db, user):
+    rng = random.Random(4)
+    loans = [BusinessLoan(user_id=user.id, loan_name='loan', principal_amount=rng.uniform(1e4, 1e7),
+                          interest_rate=rng.choice([0, rng.uniform(1, 18)]), tenure_months=rng.randint(1, 360),
+                          start_date=TODAY - timedelta(days=rng.randint(-60, 8000)), emi=0)
+             for _ in range(200)]
+    # Edge cases: starts this month, starts next month, ends this month
+    loans += [BusinessLoan(user_id=user.id, loan_name='edge', principal_amount=1000, interest_rate=10,
+                           tenure_months=12, start_date=start, emi=0)
+              for start in (TODAY, TODAY + timedelta(days=40), TODAY.replace(day=1) - timedelta(days=360))]
+    db.session.add_all(loans)
+    db.session.commit()
+    return loans
+
+
+@pytest.fixture
+def investments(db, user):
+    rng = random.Random(7)
+    investments = [BusinessInvestment(user_id=user.id, investment_name='asset',
+                                      investment_type=rng.choice(['Equipment', 'Financial', 'Vehicle', None]),
+                                      amount_invested=rng.choice([0, rng.uniform(1e3, 1e6)]),
+                                      purchase_date=TODAY - timedelta(days=rng.randint(0, 6000)),
+                                      useful_life_years=rng.choice([None, 0, rng.randint(1, 15)]))
+                   for _ in range(200)]
+    db.session.add_all(investments)
+    db.session.commit()
+    return investments
+
+
+def test_loan_balance_in_sql_matches_python(db, loans):
+    in_sql = dict(db.session.query(BusinessLoan.id, BusinessLoan.remaining_balance))
+    for loan in loans:
+        assert in_sql[loan.id] == pytest.approx(loan.remaining_balance, rel=1e-9, abs=1e-6)
+    assert db.session.query(func.sum(BusinessLoan.remaining_balance)).scalar() == \
+        pytest.approx(sum(loan.remaining_balance for loan in loans))
+
+
+def test_investment_value_and_roi_in_sql_match_python(db, investments):
+    in_sql = {row.id: row for row in db.session.query(BusinessInvestment.id, BusinessInvestment.current_value.label('value'),
+                                                      BusinessInvestment.roi.label('roi'))}
+    for investment in investments:
+        assert in_sql[investment.id].value == pytest.approx(investment.current_value, rel=1e-9, abs=1e-6)
+        assert in_sql[investment.id].roi == pytest.approx(investment.roi, rel=1e-9, abs=1e-6)
+
+
+def test_investments_can_be_ordered_by_value_in_sql(db, investments):
+    ordered = db.session.query(BusinessInvestment).order_by(BusinessInvestment.current_value.desc()).all()
+    values = [investment.current_value for investment in ordered]
+    assert all(a >= b - 1e-6 for a, b in zip(values, values[1:]))
+
+
+@pytest.mark.parametrize('dialect,marker', [(postgresql.dialect(), 'CURRENT_DATE - '), (mysql.dialect(), 'DATEDIFF')])
+def test_expressions_compile_for_production_backends(dialect, marker):
+    compiled = str(select(BusinessInvestment.current_value, BusinessLoan.remaining_balance).compile(dialect=dialect))
+    assert marker in compiled
+    assert 'EXTRACT(YEAR FROM CURRENT_DATE)' in compiled
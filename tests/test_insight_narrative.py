@@ -0,0 +1,122 @@
+import json
+import os
+import subprocess
+import sys
+import urllib.request
+from datetime import date
+
+import pytest
+
+import insight_narrative
+from insight_narrative import generate_narrative, month_payload, request_narrative
+from models import BusinessTransaction, Category, InsightNarrative, db
+
+STUB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts', 'stub_inference_server.py')
+MONTH = (date(2024, 3, 1), date(2024, 3, 31))
+
+
+def start_stub(*args):
+    process = subprocess.Popen([sys.executable, '-u', STUB, '--port', '0', '--delay', '0', *args],
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    banner = process.stdout.readline()
+    if 'http://' not in banner:
+        process.kill()
+        raise RuntimeError(f'stub server did not start: {banner!r}')
+    return process, banner.split()[4]
+
+
+def generations(url):
+    with urllib.request.urlopen(f'{url}/stats', timeout=5) as response:
+        return json.load(response)['generations']
+
+
+@pytest.fixture
+def stub_server():
+    process, url = start_stub()
+    yield url
+    process.kill()
+    process.wait()
+
+
+@pytest.fixture
+def failing_stub_server():
+    process, url = start_stub('--fail-every', '1')
+    yield url
+    process.kill()
+    process.wait()
+
+
+@pytest.fixture
+def business_month(db, user):
+    category = Category(name='Rent', type='expense', user_id=user.id)
+    db.session.add(category)
+    db.session.flush()
+    db.session.add_all([
+        BusinessTransaction(description='invoice', amount=5000.0, type='revenue', date=date(2024, 3, 5),
+                            user_id=user.id, category_id=category.id),
+        BusinessTransaction(description='office rent', amount=1200.0, type='expense', date=date(2024, 3, 7),
+                            user_id=user.id, category_id=category.id),
+    ])
+    db.session.commit()
+    return user.id
+
+
+def generated(narrative_id, url):
+    """Runs the background job against `url` and returns the narrative as stored."""
+    generate_narrative(narrative_id, endpoint=url, timeout=10)
+    db.session.expire_all()
+    return db.session.get(InsightNarrative, narrative_id)
+
+
+def test_narrative_is_generated_by_the_endpoint(db, business_month, stub_server):
+    narrative = request_narrative(business_month, month_payload(business_month, *MONTH))
+    assert narrative.status == 'pending'
+
+    narrative = generated(narrative.id, stub_server)
+    assert narrative.status == 'ready' and narrative.error is None
+    assert '- Total Revenue: 5000.00' in narrative.narrative
+    assert '- Net Profit/Loss: 3800.00' in narrative.narrative
+    assert narrative.completed_at is not None
+    assert generations(stub_server) == 1
+
+
+def test_repeat_requests_are_served_from_the_cache(db, business_month, stub_server):
+    payload = month_payload(business_month, *MONTH)
+    first = generated(request_narrative(business_month, payload).id, stub_server)
+
+    again = request_narrative(business_month, month_payload(business_month, *MONTH))
+    assert again.id == first.id and again.status == 'ready'
+    generate_narrative(again.id, endpoint=stub_server, timeout=10)  # A duplicate job finds nothing to do
+    assert generations(stub_server) == 1
+
+
+def test_prompt_version_or_payload_changes_miss_the_cache(db, business_month, stub_server, monkeypatch):
+    payload = month_payload(business_month, *MONTH)
+    first = generated(request_narrative(business_month, payload).id, stub_server)
+
+    monkeypatch.setattr(insight_narrative, 'PROMPT_VERSION', 'v2')
+    new_prompt = request_narrative(business_month, payload)
+    assert new_prompt.id != first.id and new_prompt.status == 'pending'
+    assert generated(new_prompt.id, stub_server).status == 'ready'
+    monkeypatch.undo()
+
+    db.session.add(BusinessTransaction(description='refund', amount=300.0, type='revenue', date=date(2024, 3, 9),
+                                       user_id=business_month, category_id=Category.query.first().id))
+    db.session.commit()
+    new_payload = request_narrative(business_month, month_payload(business_month, *MONTH))
+    assert new_payload.id not in (first.id, new_prompt.id)
+    assert '- Total Revenue: 5300.00' in generated(new_payload.id, stub_server).narrative
+    assert generations(stub_server) == 3
+
+
+def test_endpoint_failure_marks_the_narrative_failed_and_a_retry_recovers(db, business_month, failing_stub_server,
+                                                                          stub_server):
+    payload = month_payload(business_month, *MONTH)
+    narrative = generated(request_narrative(business_month, payload).id, failing_stub_server)
+    assert narrative.status == 'failed'
+    assert '503' in narrative.error
+    assert narrative.narrative is None
+
+    retry = request_narrative(business_month, payload)
+    assert retry.id == narrative.id and retry.status == 'pending'
+    assert generated(retry.id, stub_server).status == 'ready'
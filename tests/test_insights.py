@@ -0,0 +1,117 @@
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import pytest
+
+import insights
+from insights import compute_insights, load_ledger_frame, personal_insights
+from models import Category, Loan, Transaction, User
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(insights, '_cache', OrderedDict())
+
+
+@pytest.fixture
+def frames_loaded(monkeypatch):
+    """Counts ledger loads, i.e. cache misses."""
+    calls = []
+
+    def counting(user_id):
+        calls.append(user_id)
+        return load_ledger_frame(user_id)
+
+    monkeypatch.setattr(insights, 'load_ledger_frame', counting)
+    return calls
+
+
+def add_transactions(db, user_id, rows):
+    categories = {}
+    for description, amount, type, name in rows:
+        if name not in categories:
+            categories[name] = Category(name=name, type=type, user_id=user_id)
+            db.session.add(categories[name])
+            db.session.flush()
+        db.session.add(Transaction(description=description, amount=amount, type=type, date=date(2024, 1, 1),
+                                   user_id=user_id, category_id=categories[name].id))
+    db.session.commit()
+
+
+@pytest.fixture
+def earner(db, user):
+    add_transactions(db, user.id, [('salary', 1000.0, 'income', 'Salary'), ('groceries', 300.0, 'expense', 'Food'),
+                                   ('cinema', 100.0, 'expense', 'Fun')])
+    return user.id
+
+
+def test_repeat_requests_are_served_from_the_cache(db, earner, frames_loaded):
+    first = personal_insights(earner)
+    assert personal_insights(earner) == first
+    assert frames_loaded == [earner]
+    assert "Next month's largest expense is likely to be 'Food' at around ₹300.00." in first
+
+
+def test_ledger_writes_invalidate_but_derived_scores_do_not(db, earner, frames_loaded):
+    personal_insights(earner)
+    Transaction.query.filter_by(user_id=earner).first().anomaly_score = 0.5
+    db.session.commit()
+    personal_insights(earner)
+    assert len(frames_loaded) == 1
+
+    add_transactions(db, earner, [('rent', 900.0, 'expense', 'Rent')])
+    assert "Next month's largest expense is likely to be 'Rent' at around ₹900.00." in personal_insights(earner)
+    assert len(frames_loaded) == 2
+
+
+def test_loans_are_part_of_the_key(db, earner, frames_loaded):
+    personal_insights(earner)
+    db.session.add(Loan(loan_name='Car', principal=500000.0, interest_rate=9.0, tenure_months=60,
+                        emi_amount=10379.0, start_date=date(2024, 1, 1), user_id=earner))
+    db.session.commit()
+    assert "Next month's largest expense is likely to be 'EMI' at around ₹10379.00." in personal_insights(earner)
+    assert len(frames_loaded) == 2
+
+
+def test_cached_insights_expire_at_midnight(db, earner, frames_loaded, monkeypatch):
+    personal_insights(earner)
+
+    class Tomorrow(date):
+        @classmethod
+        def today(cls):
+            return date.today() + timedelta(days=1)
+
+    monkeypatch.setattr(insights, 'date', Tomorrow)
+    personal_insights(earner)
+    assert len(frames_loaded) == 2
+
+
+def test_users_are_cached_separately_and_the_cache_is_bounded(db, earner, frames_loaded, monkeypatch):
+    monkeypatch.setattr(insights, 'CACHE_MAX_ENTRIES', 2)
+    others = []
+    for name in ('second', 'third'):
+        other = User(username=name, password='x')
+        db.session.add(other)
+        db.session.commit()
+        add_transactions(db, other.id, [('salary', 50.0, 'income', 'Salary')])
+        others.append(other.id)
+
+    assert personal_insights(earner) != personal_insights(others[0])
+    personal_insights(others[1])  # Evicts the least recently used: earner
+    personal_insights(others[0])
+    assert frames_loaded == [earner, others[0], others[1]]
+    personal_insights(earner)
+    assert frames_loaded[-1] == earner
+
+
+def test_user_without_transactions(db, user):
+    assert personal_insights(user.id) == ["No data available to generate insights."]
+
+
+def test_flagged_expense_and_health_from_a_frame(db, earner):
+    expense = Transaction.query.filter_by(user_id=earner, description='cinema').one()
+    expense.anomaly_score = 9.0
+    db.session.commit()
+    result = compute_insights(load_ledger_frame(earner))
+    assert result[0] == "Alert: Unusual spending detected on 01 Jan in Fun (₹100.00)."
+    assert result[-1] == "AI Financial Health: Good."
@@ -0,0 +1,118 @@
+import logging
+import threading
+import time
+
+import pytest
+from flask import Flask, current_app
+
+from job_scheduler import DebouncedJobScheduler
+
+DEBOUNCE = 0.05
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('timed out waiting for background jobs')
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def scheduler():
+    return DebouncedJobScheduler(Flask(__name__), max_workers=2, debounce_seconds=DEBOUNCE)
+
+
+def idle(scheduler):
+    return scheduler.pending() == {'scheduled': 0, 'running': 0}
+
+
+def test_triggers_within_the_debounce_coalesce_into_one_run(scheduler):
+    runs = []
+    scheduler.register('category', lambda user_id: runs.append((user_id, time.monotonic(), current_app.name)))
+
+    marked = time.monotonic()
+    for _ in range(5):
+        scheduler.mark_dirty('category', 1)
+    scheduler.mark_dirty('category', 2)
+    wait_until(lambda: len(runs) == 2 and idle(scheduler))
+    time.sleep(2 * DEBOUNCE)
+
+    assert sorted(user_id for user_id, _, _ in runs) == [1, 2]
+    assert all(ran_at - marked >= DEBOUNCE for _, ran_at, _ in runs)
+    assert runs[0][2] == __name__  # Handlers run inside the application context
+
+
+def test_delay_overrides_the_debounce(scheduler):
+    ran = threading.Event()
+    scheduler.register('report_artifact', lambda artifact_id: ran.set())
+    scheduler.debounce_seconds = 60
+    scheduler.mark_dirty('report_artifact', 7, delay=0)
+    assert ran.wait(5)
+
+
+def test_a_trigger_while_running_causes_one_follow_up_run(scheduler):
+    started, release = threading.Event(), threading.Event()
+    runs = []
+
+    def handler(user_id):
+        runs.append(user_id)
+        started.set()
+        release.wait(5)
+
+    scheduler.register('category', handler)
+    scheduler.mark_dirty('category', 1, delay=0)
+    assert started.wait(5)
+    for _ in range(3):
+        scheduler.mark_dirty('category', 1)
+    release.set()
+
+    wait_until(lambda: len(runs) == 2 and idle(scheduler))
+    time.sleep(2 * DEBOUNCE)
+    assert runs == [1, 1]
+
+
+def test_no_more_than_max_workers_jobs_run_at_once(scheduler):
+    lock = threading.Lock()
+    running, peak, finished = [0], [0], []
+
+    def handler(user_id):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+            finished.append(user_id)
+
+    scheduler.register('forecast_balance', handler)
+    for user_id in range(6):
+        scheduler.mark_dirty('forecast_balance', user_id, delay=0)
+    wait_until(lambda: len(finished) == 6)
+    assert peak[0] == 2
+    assert sorted(finished) == list(range(6))
+
+
+def test_failures_are_logged_and_do_not_stop_the_scheduler(scheduler, caplog):
+    runs = []
+
+    def handler(user_id):
+        runs.append(user_id)
+        if user_id == 1:
+            raise RuntimeError('model store unavailable')
+
+    scheduler.register('category', handler)
+    with caplog.at_level(logging.ERROR):
+        scheduler.mark_dirty('category', 1, delay=0)
+        wait_until(lambda: runs == [1] and idle(scheduler))
+        scheduler.mark_dirty('category', 2, delay=0)
+        wait_until(lambda: runs == [1, 2] and idle(scheduler))
+
+    failures = [record for record in caplog.records if record.exc_info]
+    assert [record.getMessage() for record in failures] == ['Background job category failed for user 1']
+    assert failures[0].exc_info[0] is RuntimeError
+
+
+def test_unregistered_kinds_are_rejected(scheduler):
+    with pytest.raises(KeyError):
+        scheduler.mark_dirty('unknown', 1)
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from light_forecast import (ALPHAS, DAMPING, HOLT_COST_MS_PER_DAY, MAX_HISTORY_DAYS, PROPHET_COST_MS,
+                            PROPHET_MIN_DAYS, SEASON, choose_model, daily_grid, forecast, holt)
+
+
+@pytest.mark.parametrize('n_days, budget_ms, expected', [
+    (0, 5000, None),
+    (1, 5000, None),
+    (2, 10, 'holt'),
+    (2 * SEASON - 1, 10, 'holt'),
+    (2 * SEASON, 10, 'holt_weekly'),
+    (PROPHET_MIN_DAYS - 1, 5000, 'holt_weekly'),
+    (PROPHET_MIN_DAYS, PROPHET_COST_MS, 'prophet'),
+    (PROPHET_MIN_DAYS, 10, 'holt_weekly'),  # Prophet only where the budget allows
+    (MAX_HISTORY_DAYS, MAX_HISTORY_DAYS * HOLT_COST_MS_PER_DAY - 0.01, 'seasonal_naive'),
+    (SEASON - 1, 0.01, 'naive'),
+])
+def test_choose_model(n_days, budget_ms, expected):
+    assert choose_model(n_days, budget_ms) == expected
+
+
+def test_daily_grid_fills_gaps_and_sums_same_day_rows():
+    dates = np.array(['2024-01-01', '2024-01-01', '2024-01-04'], dtype='datetime64[D]')
+    start, grid = daily_grid(dates, [10.0, 5.0, -3.0])
+    assert start == np.datetime64('2024-01-01')
+    assert grid.tolist() == [15.0, 0.0, 0.0, -3.0]
+
+
+def test_daily_grid_keeps_only_recent_history():
+    dates = np.datetime64('2020-01-01') + np.arange(MAX_HISTORY_DAYS + 10)
+    start, grid = daily_grid(dates, np.arange(MAX_HISTORY_DAYS + 10, dtype=float))
+    assert len(grid) == MAX_HISTORY_DAYS
+    assert start == dates[10] and grid[0] == 10.0
+
+
+def test_holt_on_a_constant_series_is_flat_with_no_error():
+    mean, sigma, _ = holt(np.full(30, 42.0), 10)
+    assert mean == pytest.approx(np.full(10, 42.0))
+    assert sigma == 0.0
+
+
+def test_holt_follows_a_trend_but_damps_it():
+    y = 100.0 + 5.0 * np.arange(60)
+    mean, sigma, _ = holt(y, 200)
+    assert mean[0] == pytest.approx(y[-1] + 5.0, rel=0.01)
+    assert np.all(np.diff(mean) > 0)
+    # The damped trend levels off rather than running away: total future growth is bounded
+    assert mean[-1] - y[-1] < 5.0 * DAMPING / (1 - DAMPING) * 1.05
+    assert sigma < 5.0
+
+
+def test_holt_is_not_pulled_around_by_one_spike():
+    y = np.full(90, 50.0)
+    y[60] = 5000.0
+    mean, _, alpha = holt(y, 7)
+    assert alpha == ALPHAS.min()  # Absolute error favours the slowest-moving level
+    assert np.all(mean < 150.0)
+
+
+def test_weekly_model_repeats_the_weekly_pattern():
+    week = np.array([500.0, -40, -40, -40, -40, -40, -100])
+    y = np.tile(week, 12)
+    mean, lower, upper = forecast('holt_weekly', y, 14)
+    assert mean == pytest.approx(np.tile(week, 2), abs=1.0)
+    assert np.all(lower <= mean) and np.all(mean <= upper)
+
+
+def test_naive_models_and_widening_bounds():
+    y = np.tile(np.array([1.0, 2, 3, 4, 5, 6, 7]), 3) + np.arange(21) * 0.1
+    mean, lower, upper = forecast('seasonal_naive', y, 10)
+    assert mean.tolist() == np.resize(y[-SEASON:], 10).tolist()
+    assert np.all(upper[SEASON:] - lower[SEASON:] > upper[0] - lower[0])
+
+    mean, lower, upper = forecast('naive', np.array([1.0, 3.0, 2.0]), 4)
+    assert mean.tolist() == [2.0] * 4
+    assert np.all(np.diff(upper - lower) > 0)
+
+
+@pytest.mark.parametrize('model', ['naive', 'seasonal_naive', 'holt', 'holt_weekly'])
+def test_every_model_returns_the_horizon(model):
+    rng = np.random.default_rng(0)
+    mean, lower, upper = forecast(model, rng.normal(0, 10, 60), 45)
+    assert mean.shape == lower.shape == upper.shape == (45,)
+    assert np.all(lower <= upper)
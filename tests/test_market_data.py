@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from market_data import (DEFAULT_USD_TO_INR_RATE, USD_INR_SYMBOL, LiveMarketData, MarketDataProvider,
+                         RecordedMarketData, RecordingMarketData, SyntheticMarketData, provider_from_config)
+
+SYMBOLS = [('Stock', 'RELIANCE.NS'), ('Crypto', 'bitcoin'), USD_INR_SYMBOL]
+
+
+def test_synthetic_prices_are_deterministic_per_seed():
+    first, second = SyntheticMarketData(seed=3), SyntheticMarketData(seed=3)
+    walk = [first.get_quotes(SYMBOLS) for _ in range(5)]
+    assert walk == [second.get_quotes(SYMBOLS) for _ in range(5)]
+    assert walk[0] != walk[1]  # The walk advances a step per call
+    assert walk[0][USD_INR_SYMBOL] == DEFAULT_USD_TO_INR_RATE
+    assert SyntheticMarketData(seed=4).get_quotes(SYMBOLS) != walk[0]
+
+
+def test_synthetic_walk_is_per_symbol():
+    provider = SyntheticMarketData(seed=1)
+    provider.get_quotes(SYMBOLS[:1])
+    provider.get_quotes(SYMBOLS[:1])
+    # A symbol first asked for later still starts at its base price
+    assert provider.get_quotes(SYMBOLS[1:2]) == SyntheticMarketData(seed=1).get_quotes(SYMBOLS[1:2])
+
+
+def test_recorded_session_replays_identically(tmp_path):
+    fixture = str(tmp_path / 'session.json')
+    recorder = RecordingMarketData(fixture, upstream=SyntheticMarketData(seed=9))
+    recorded = recorder.get_quotes(SYMBOLS)
+
+    saved = json.loads(open(fixture).read())
+    assert len(saved['latencies_ms']) == 1
+    replay = RecordedMarketData(fixture)
+    assert replay.get_quotes(SYMBOLS) == recorded
+    assert replay.get_quotes(SYMBOLS) == recorded
+    # Symbols that were never recorded are left out, as an unpriceable symbol would be
+    assert replay.get_quotes([('Stock', 'UNSEEN')]) == {}
+
+
+def test_recording_appends_to_an_existing_fixture(tmp_path):
+    fixture = str(tmp_path / 'session.json')
+    RecordingMarketData(fixture, upstream=SyntheticMarketData()).get_quotes(SYMBOLS[:1])
+    RecordingMarketData(fixture, upstream=SyntheticMarketData()).get_quotes(SYMBOLS[1:])
+    assert RecordedMarketData(fixture).get_quotes(SYMBOLS).keys() == set(SYMBOLS)
+
+
+def test_replay_sleeps_through_recorded_latency(tmp_path, monkeypatch):
+    fixture = tmp_path / 'session.json'
+    fixture.write_text(json.dumps({'quotes': {'Stock:A': 1.0}, 'latencies_ms': [5, 20]}))
+    slept = []
+    monkeypatch.setattr('market_data.time.sleep', slept.append)
+
+    replay = RecordedMarketData(str(fixture), replay_latency=True)
+    for _ in range(3):
+        replay.get_quotes([('Stock', 'A')])
+    assert slept == [0.005, 0.02, 0.005]
+
+
+def test_provider_from_config(tmp_path):
+    fixture = str(tmp_path / 'fixture.json')
+    RecordingMarketData(fixture, upstream=SyntheticMarketData()).get_quotes(SYMBOLS)
+
+    assert isinstance(provider_from_config({}), LiveMarketData)
+    assert isinstance(provider_from_config({'MARKET_DATA_PROVIDER': 'record', 'MARKET_DATA_FIXTURE': fixture}),
+                      RecordingMarketData)
+    replay = provider_from_config({'MARKET_DATA_PROVIDER': 'replay', 'MARKET_DATA_FIXTURE': fixture})
+    assert isinstance(replay, RecordedMarketData) and not replay.replay_latency
+    synthetic = provider_from_config({'MARKET_DATA_PROVIDER': 'Synthetic', 'MARKET_DATA_SEED': '5'})
+    assert synthetic.get_quotes(SYMBOLS) == SyntheticMarketData(seed=5).get_quotes(SYMBOLS)
+    with pytest.raises(ValueError):
+        provider_from_config({'MARKET_DATA_PROVIDER': 'bogus'})
+
+
+def test_providers_must_implement_get_quotes():
+    class Incomplete(MarketDataProvider):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
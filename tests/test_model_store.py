@@ -0,0 +1,158 @@
+import os
+
+import pytest
+
+from category_model import OnlineCategoryClassifier
+from model_store import ModelStore, OnlineModels
+
+
+def payload_size(store, key):
+    return os.path.getsize(store._version_path(key, store.current_version(key)))
+
+
+def versions_on_disk(store, key):
+    return sorted(name for name in os.listdir(store._key_dir(key)) if name.endswith('.pkl'))
+
+
+def test_save_and_load_round_trip(tmp_path):
+    store = ModelStore(str(tmp_path))
+    assert store.load('user_1/category') is None
+    assert store.current_version('user_1/category') is None
+
+    version = store.save('user_1/category', {'weights': [1, 2, 3]})
+    assert store.current_version('user_1/category') == version
+    assert store.load('user_1/category') == {'weights': [1, 2, 3]}
+    assert os.path.isdir(tmp_path / 'user_1' / 'category')
+
+
+def test_write_leaves_no_temp_files_and_failure_keeps_the_current_version(tmp_path, monkeypatch):
+    store = ModelStore(str(tmp_path))
+    store.save('global/personal', 'first')
+    assert not [name for name in os.listdir(store._key_dir('global/personal')) if name.endswith('.tmp')]
+
+    def crash(*args):
+        raise OSError('disk full')
+
+    monkeypatch.setattr('model_store.os.replace', crash)
+    with pytest.raises(OSError):
+        store.save('global/personal', 'second')
+    monkeypatch.undo()
+
+    store.invalidate('global/personal')
+    assert ModelStore(str(tmp_path)).load('global/personal') == 'first'
+    assert store.load('global/personal') == 'first'
+
+
+def test_prune_keeps_the_newest_versions(tmp_path):
+    store = ModelStore(str(tmp_path), keep_versions=2)
+    versions = [store.save('user_1/category', n) for n in range(5)]
+    assert versions_on_disk(store, 'user_1/category') == [f'v{v}.pkl' for v in versions[-2:]]
+    assert store.load('user_1/category') == 4
+
+
+def test_loads_are_served_from_memory_until_another_worker_saves(tmp_path):
+    store, other_worker = ModelStore(str(tmp_path)), ModelStore(str(tmp_path))
+    store.save('user_1/category', ['old'])
+    cached = store.load('user_1/category')
+    assert store.load('user_1/category') is cached
+
+    other_worker.save('user_1/category', ['new'])
+    pointer = store._pointer_path('user_1/category')
+    stat = os.stat(pointer)
+    os.utime(pointer, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))  # Coarse clocks can repeat an mtime
+    assert store.load('user_1/category') == ['new']
+
+
+def test_cache_evicts_least_recently_used_to_stay_under_budget(tmp_path):
+    probe = ModelStore(str(tmp_path / 'probe'))
+    probe.save('k', 'a' * 1000)
+    size = payload_size(probe, 'k')
+
+    store = ModelStore(str(tmp_path / 'store'), cache_max_bytes=2 * size)
+    for key in ('a', 'b'):
+        store.save(key, key * 1000)
+    assert store.cache_stats() == {'entries': 2, 'bytes': 2 * size, 'max_bytes': 2 * size}
+
+    held_a = store.load('a')  # 'a' becomes the most recently used, so 'b' is evicted next
+    store.save('c', 'c' * 1000)
+    assert store.cache_stats()['entries'] == 2
+    assert store.load('a') is held_a
+    assert store.load('b') == 'b' * 1000  # Reloaded from disk after eviction
+    assert store.cache_stats()['bytes'] <= 2 * size
+
+
+def test_models_larger_than_the_cache_are_not_cached(tmp_path):
+    store = ModelStore(str(tmp_path), cache_max_bytes=10)
+    store.save('big', list(range(1000)))
+    assert store.cache_stats()['entries'] == 0
+    assert store.load('big') == list(range(1000))
+    assert store.cache_stats()['bytes'] == 0
+
+
+def test_invalidate_drops_the_cached_entry(tmp_path):
+    store = ModelStore(str(tmp_path))
+    store.save('k', [1])
+    cached = store.load('k')
+    store.invalidate('k')
+    assert store.cache_stats()['entries'] == 0
+    assert store.load('k') is not cached
+
+
+def test_delete_removes_every_version(tmp_path):
+    store = ModelStore(str(tmp_path))
+    store.save('user_1/category', [1])
+    store.save('user_1/category', [2])
+    assert store.delete('user_1/category')
+    assert store.load('user_1/category') is None
+    assert store.cache_stats()['entries'] == 0
+    assert not store.delete('user_1/category')
+
+
+def trained_store(tmp_path):
+    store = ModelStore(str(tmp_path))
+    store.save('user_1/category', OnlineCategoryClassifier.fit(['uber ride', 'swiggy order'], ['Transport', 'Food']))
+    return store
+
+
+def test_online_updates_stay_in_memory_until_flushed(tmp_path):
+    store = trained_store(tmp_path)
+    saved_version = store.current_version('user_1/category')
+    online = OnlineModels(store)
+
+    for _ in range(3):
+        assert online.update('user_1/category', lambda model: model.learn_one('metro card', 'Transport'))
+    assert store.current_version('user_1/category') == saved_version
+    assert store.load('user_1/category').n_samples == 2  # The shared cached instance is never changed
+    assert online.load('user_1/category').n_samples == 5
+
+    assert online.flush('user_1/category')
+    assert not online.flush('user_1/category')
+    assert online.pending() == 0
+    assert store.current_version('user_1/category') != saved_version
+    assert ModelStore(str(tmp_path)).load('user_1/category').online_updates == 3
+
+
+def test_rejected_or_missing_models_are_not_kept(tmp_path):
+    online = OnlineModels(trained_store(tmp_path))
+    assert not online.update('user_1/category', lambda model: model.learn_one('rent', 'Housing'))
+    assert not online.update('user_2/category', lambda model: True)
+    assert online.pending() == 0
+
+
+def test_saving_a_rebuild_discards_pending_updates(tmp_path):
+    store = trained_store(tmp_path)
+    online = OnlineModels(store)
+    online.update('user_1/category', lambda model: model.learn_one('metro card', 'Transport'))
+
+    online.save('user_1/category', OnlineCategoryClassifier.fit(['rent'], ['Housing']))
+    assert online.pending() == 0
+    assert not online.flush('user_1/category')
+    assert list(online.load('user_1/category').classes) == ['Housing']
+
+
+def test_deleting_drops_pending_updates_too(tmp_path):
+    online = OnlineModels(trained_store(tmp_path))
+    online.update('user_1/category', lambda model: model.learn_one('metro card', 'Transport'))
+    assert online.delete('user_1/category')
+    assert online.pending() == 0
+    assert online.load('user_1/category') is None
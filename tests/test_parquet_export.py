@@ -0,0 +1,86 @@
+import os
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from parquet_export import EXPORTS, export_all, export_table
+from models import Budget, Category, SoldInvestment, Transaction, User
+
+
+@pytest.fixture
+def ledgers(db, user):
+    other = User(username='other', password='x')
+    db.session.add(other)
+    db.session.flush()
+    food = Category(name='Food', type='expense', user_id=user.id)
+    db.session.add(food)
+    db.session.flush()
+    rows = [(other.id, date(2024, 1, 3), 30.0, food.id), (user.id, date(2024, 1, 2), 20.0, food.id),
+            (user.id, date(2024, 1, 1), 10.0, food.id), (other.id, date(2024, 1, 1), 40.0, food.id),
+            (user.id, date(2024, 1, 5), 50.0, 999)]  # A category that no longer exists
+    for user_id, day, amount, category_id in rows:
+        db.session.add(Transaction(description=f'spend {amount:.0f}', amount=amount, type='expense', date=day,
+                                   user_id=user_id, category_id=category_id))
+    db.session.add(SoldInvestment(asset_type='Stock', ticker_symbol='AAA', quantity=2, purchase_price=10.0,
+                                  purchase_date=date(2023, 1, 1), sell_price=15.0, sell_date=date(2024, 2, 1),
+                                  capital_gain=10.0, gain_type='LTCG', user_id=user.id))
+    db.session.add(Budget(category_id=food.id, user_id=user.id, amount=500.0, month=1, year=2024))
+    db.session.commit()
+    return user.id, other.id
+
+
+@pytest.mark.parametrize('table', sorted(EXPORTS))
+def test_file_schema_matches_the_export_definition(ledgers, tmp_path, table):
+    path = str(tmp_path / f'{table}.parquet')
+    export_table(table, path)
+    expected = pa.schema([(name, arrow_type) for name, _, arrow_type in EXPORTS[table][1]])
+    assert pq.read_schema(path).remove_metadata() == expected
+
+
+def test_rows_are_written_in_row_groups_ordered_by_user(ledgers, tmp_path):
+    user_id, other_id = ledgers
+    path = str(tmp_path / 'transactions.parquet')
+    assert export_table('transactions', path, row_group_size=2) == 5
+
+    metadata = pq.ParquetFile(path).metadata
+    assert [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)] == [2, 2, 1]
+    table = pq.read_table(path)
+    assert table.column('user_id').to_pylist() == [user_id] * 3 + [other_id] * 2
+    assert table.column('date').to_pylist() == [date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 5),
+                                                 date(2024, 1, 1), date(2024, 1, 3)]
+    # Sorted by user, so each row group's user_id statistics only span the users it holds
+    user_stats = [metadata.row_group(i).column(1).statistics for i in range(metadata.num_row_groups)]
+    assert [(s.min, s.max) for s in user_stats] == [(user_id, user_id), (user_id, other_id), (other_id, other_id)]
+
+
+def test_category_names_are_denormalized_and_nulls_kept(ledgers, tmp_path):
+    path = str(tmp_path / 'transactions.parquet')
+    export_table('transactions', path, user_id=ledgers[0])
+    table = pq.read_table(path)
+    assert table.column('category').to_pylist() == ['Food', 'Food', None]
+    assert table.column('anomaly_score').null_count == 3
+    assert table.column('amount').to_pylist() == [10.0, 20.0, 50.0]
+
+
+def test_export_all_writes_one_file_per_table(ledgers, tmp_path):
+    _, other_id = ledgers
+    reported = []
+    written = export_all(str(tmp_path / 'out'), user_id=other_id, progress=lambda *args: reported.append(args))
+
+    assert set(written) == set(EXPORTS)
+    assert written['transactions'] == (str(tmp_path / 'out' / f'transactions_user_{other_id}.parquet'), 2)
+    assert written['budgets'][1] == written['sold_investments'][1] == 0
+    assert pq.read_table(written['budgets'][0]).num_rows == 0  # Empty tables still get a typed file
+    assert reported == [(table, *written[table]) for table in EXPORTS]
+
+
+def test_failed_export_leaves_no_partial_file(ledgers, tmp_path, monkeypatch):
+    model, columns, order_by = EXPORTS['transactions']
+    # Descriptions can't be written as integers: the writer fails on the first batch, after opening its file
+    columns = [(name, column, pa.int64() if name == 'description' else arrow_type) for name, column, arrow_type in columns]
+    monkeypatch.setitem(EXPORTS, 'transactions', (model, columns, order_by))
+    with pytest.raises(pa.ArrowException):
+        export_table('transactions', str(tmp_path / 'transactions.parquet'))
+    assert os.listdir(tmp_path) == []
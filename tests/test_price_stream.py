@@ -0,0 +1,99 @@
+import queue
+import threading
+
+import pytest
+
+from price_stream import PriceStreamHub, _offer
+
+
+class ScriptedQuotes:
+    """fetch_quotes stand-in: returns one scripted response per call, then repeats the last."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, symbols):
+        with self.lock:
+            self.calls.append(sorted(symbols))
+            response = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        return {s: p for s, p in response.items() if s in symbols}
+
+
+def test_first_poll_is_delivered_even_when_empty():
+    hub = PriceStreamHub(ScriptedQuotes({}, {'A': 1.0}), interval=0.05)
+    feed, subscriber = hub.subscribe({'A'})
+    try:
+        assert subscriber.get(timeout=1) == {}
+        assert subscriber.get(timeout=1) == {'A': 1.0}
+    finally:
+        hub.unsubscribe(feed, subscriber)
+
+
+def test_only_changed_quotes_are_pushed():
+    hub = PriceStreamHub(ScriptedQuotes({'A': 1.0, 'B': 2.0}, {'A': 1.0, 'B': 2.5}), interval=0.05)
+    feed, subscriber = hub.subscribe({'A', 'B'})
+    try:
+        assert subscriber.get(timeout=1) == {'A': 1.0, 'B': 2.0}
+        assert subscriber.get(timeout=1) == {'B': 2.5}
+        with pytest.raises(queue.Empty):
+            subscriber.get(timeout=0.2)
+    finally:
+        hub.unsubscribe(feed, subscriber)
+
+
+def test_tabs_with_the_same_holdings_share_one_feed():
+    fetch = ScriptedQuotes({'A': 1.0})
+    hub = PriceStreamHub(fetch, interval=0.05)
+    first = hub.subscribe({'A'})
+    first[1].get(timeout=1)
+    second = hub.subscribe({'A'})
+
+    assert first[0] is second[0]
+    assert hub.active_feeds() == 1
+    # The late joiner gets the feed's quotes straight away
+    assert second[1].get(timeout=1) == {'A': 1.0}
+
+    hub.unsubscribe(*first)
+    assert hub.active_feeds() == 1
+    hub.unsubscribe(*second)
+    assert hub.active_feeds() == 0
+
+
+def test_overlapping_feeds_share_cached_quotes():
+    fetch = ScriptedQuotes({'A': 1.0, 'B': 2.0, 'C': 3.0})
+    hub = PriceStreamHub(fetch, interval=10)
+    first = hub.subscribe({'A', 'B'})
+    first[1].get(timeout=1)
+    second = hub.subscribe({'B', 'C'})
+    try:
+        assert second[1].get(timeout=1) == {'B': 2.0, 'C': 3.0}
+        # B was fresh in the cache, so the second feed only asked for C
+        assert fetch.calls == [['A', 'B'], ['C']]
+    finally:
+        hub.unsubscribe(*first)
+        hub.unsubscribe(*second)
+
+
+def test_failed_refresh_marks_the_feed_stale():
+    def failing(symbols):
+        raise RuntimeError('provider down')
+
+    hub = PriceStreamHub(failing, interval=0.05)
+    feed, subscriber = hub.subscribe({'A'})
+    try:
+        assert subscriber.get(timeout=1) == {}
+        assert hub.is_stale(feed)
+    finally:
+        hub.unsubscribe(feed, subscriber)
+
+
+def test_slow_subscriber_updates_are_merged_not_lost():
+    subscriber = queue.Queue(maxsize=2)
+    _offer(subscriber, {'A': 1.0})
+    _offer(subscriber, {'B': 2.0})
+    _offer(subscriber, {'A': 1.5, 'C': 3.0})
+
+    assert subscriber.get_nowait() == {'B': 2.0}
+    assert subscriber.get_nowait() == {'A': 1.5, 'C': 3.0}
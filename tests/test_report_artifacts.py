@@ -0,0 +1,231 @@
+import json
+import os
+from datetime import date
+
+import pytest
+
+import report_artifacts as ra
+from models import BusinessTransaction, Category, ReportArtifact, Transaction, User
+
+
+@pytest.fixture
+def business_ledger(db, user):
+    sales = Category(name='Sales', type='revenue', user_id=user.id)
+    rent = Category(name='Rent', type='expense', user_id=user.id)
+    db.session.add_all([sales, rent])
+    db.session.flush()
+    entries = [
+        (date(2025, 12, 9), 'expense', rent, 70),
+        (date(2026, 7, 5), 'revenue', sales, 1000), (date(2026, 7, 9), 'expense', rent, 300),
+        (date(2026, 8, 5), 'revenue', sales, 1500), (date(2026, 8, 9), 'expense', rent, 200),
+        (date(2026, 10, 5), 'revenue', sales, 900), (date(2026, 10, 9), 'expense', rent, 450),
+    ]
+    for day, ttype, category, amount in entries:
+        db.session.add(BusinessTransaction(user_id=user.id, description='x', amount=amount, type=ttype, date=day,
+                                           category_id=category.id))
+    db.session.commit()
+    return user
+
+
+def test_period_keys_cross_year_boundaries():
+    assert ra.period_keys(date(2025, 11, 3), date(2026, 2, 1), 'month') == [(2025, 11), (2025, 12), (2026, 1), (2026, 2)]
+    assert ra.period_keys(date(2025, 11, 3), date(2026, 4, 1), 'quarter') == [(2025, 4), (2026, 1), (2026, 2)]
+    assert ra.period_keys(date(2024, 6, 1), date(2026, 1, 1), 'year') == [(2024,), (2025,), (2026,)]
+
+
+def test_month_over_month(business_ledger):
+    data = ra.comparative_data('business', business_ledger.id, date(2026, 7, 1), date(2026, 10, 31), 'month')
+    assert data['periods'] == ['Jul 2026', 'Aug 2026', 'Sep 2026', 'Oct 2026']
+    assert data['net']['values'] == [700, 1300, 0, 450]
+    assert data['net']['change'] == 450
+    assert data['net']['change_pct'] is None  # No base to compare with
+
+
+def test_quarter_over_quarter(business_ledger):
+    data = ra.comparative_data('business', business_ledger.id, date(2025, 10, 1), date(2026, 12, 31), 'quarter')
+    assert data['periods'] == ['Q4 2025', 'Q1 2026', 'Q2 2026', 'Q3 2026', 'Q4 2026']
+    assert data['net']['values'] == [-70, 0, 0, 2000, 450]
+    assert data['net']['change_pct'] == -77.5
+
+
+def test_year_over_year(business_ledger):
+    data = ra.comparative_data('business', business_ledger.id, date(2025, 1, 1), date(2026, 12, 31), 'year')
+    revenue, expenses = data['sections']
+    assert revenue['total']['values'] == [0, 3400]
+    assert expenses['total']['values'] == [70, 950]
+
+
+def test_validate_report():
+    assert ra.validate_report('mom', 'pdf', date(2026, 1, 1), date(2026, 12, 31)) is None
+    assert ra.validate_report('mom', 'pdf', date(2025, 1, 1), date(2026, 1, 1)) is not None
+    assert ra.validate_report('summary', 'pdf', date(2026, 2, 1), date(2026, 1, 1)) is not None
+    assert ra.validate_report('summary', 'xls', date(2026, 1, 1), date(2026, 2, 1)) is not None
+
+
+@pytest.mark.parametrize('report_type,ledger,report_format', sorted(ra.REPORTS))
+def test_every_report_renders(business_ledger, tmp_path, report_type, ledger, report_format):
+    artifact = ra.request_report(str(tmp_path), business_ledger.id, ledger, date(2026, 7, 1), date(2026, 10, 31),
+                                 report_format, report_type)
+    ra.render_artifact(artifact.id, str(tmp_path))
+
+    assert artifact.status == 'ready', artifact.error
+    path = ra.artifact_path(str(tmp_path), artifact)
+    assert os.path.getsize(path) == artifact.size > 0
+    if report_format == 'json':
+        json.loads(open(path).read())
+
+
+def test_artifact_reused_until_the_ledger_changes(db, business_ledger, tmp_path):
+    directory = str(tmp_path)
+    request = dict(directory=directory, user_id=business_ledger.id, ledger='business', start_date=date(2026, 7, 1),
+                   end_date=date(2026, 7, 31), report_format='csv')
+    first = ra.request_report(**request)
+    ra.render_artifact(first.id, directory)
+    first_path = ra.artifact_path(directory, first)
+
+    assert ra.request_report(**request).id == first.id
+    # Other formats, report types and ledgers are separate artifacts
+    assert ra.request_report(**{**request, 'report_format': 'pdf'}).id != first.id
+    assert ra.request_report(**request, report_type='mom').id != first.id
+    assert ra.request_report(**{**request, 'ledger': 'personal'}).id != first.id
+
+    db.session.add(BusinessTransaction(user_id=business_ledger.id, description='x', amount=5, type='expense',
+                                       date=date(2026, 7, 20), category_id=Category.query.first().id))
+    db.session.commit()
+    second = ra.request_report(**request)
+
+    assert second.id != first.id and second.status == 'pending'
+    assert second.ledger_version > first.ledger_version
+    assert db.session.get(ReportArtifact, first.id) is None
+    assert not os.path.exists(first_path)
+
+
+def test_failed_artifact_is_retried(db, business_ledger, tmp_path):
+    artifact = ra.request_report(str(tmp_path), business_ledger.id, 'business', date(2026, 7, 1), date(2026, 7, 31), 'pdf')
+    artifact.status, artifact.error = 'failed', 'boom'
+    db.session.commit()
+
+    retried = ra.request_report(str(tmp_path), business_ledger.id, 'business', date(2026, 7, 1), date(2026, 7, 31), 'pdf')
+    assert retried.id == artifact.id
+    assert (retried.status, retried.error) == ('pending', None)
+
+
+JULY = dict(ledger='business', start_date=date(2026, 7, 1), end_date=date(2026, 7, 31))
+
+
+def test_rendered_file_holds_the_report(business_ledger, tmp_path):
+    artifact = ra.request_report(str(tmp_path), business_ledger.id, report_format='csv', **JULY)
+    ra.render_artifact(artifact.id, str(tmp_path))
+
+    content = open(ra.artifact_path(str(tmp_path), artifact)).read()
+    assert 'Total Revenue,1000' in content and 'Net Profit / (Loss),700' in content
+    assert ra.download_name(artifact) == 'business_summary_20260701_20260731.csv'
+    assert ra.artifact_path(str(tmp_path), artifact) == os.path.join(str(tmp_path), f'user_{business_ledger.id}',
+                                                                     f'{artifact.id}.csv')
+
+
+def test_ready_artifacts_are_not_rendered_again(business_ledger, tmp_path, monkeypatch):
+    artifact = ra.request_report(str(tmp_path), business_ledger.id, report_format='json', **JULY)
+    ra.render_artifact(artifact.id, str(tmp_path))
+    monkeypatch.setitem(ra.REPORTS, ('summary', 'business', 'json'), (None, None))  # Would fail if called
+
+    ra.render_artifact(artifact.id, str(tmp_path))
+    assert artifact.status == 'ready'
+    ra.render_artifact(12345, str(tmp_path))  # Deleted meanwhile
+
+
+def test_render_failure_is_recorded(business_ledger, tmp_path, monkeypatch):
+    def broken(data):
+        raise ValueError('font missing')
+
+    monkeypatch.setitem(ra.REPORTS, ('summary', 'business', 'pdf'), (ra.summary_data, broken))
+    artifact = ra.request_report(str(tmp_path), business_ledger.id, report_format='pdf', **JULY)
+    ra.render_artifact(artifact.id, str(tmp_path))
+
+    assert (artifact.status, artifact.error) == ('failed', 'font missing')
+    assert artifact.completed_at is not None
+    assert not os.path.exists(ra.artifact_path(str(tmp_path), artifact))
+
+
+def test_artifacts_are_per_user_and_per_ledger_version(db, business_ledger, tmp_path):
+    other = User(username='other', password='x')
+    db.session.add(other)
+    db.session.commit()
+    mine = ra.request_report(str(tmp_path), business_ledger.id, report_format='csv', **JULY)
+    theirs = ra.request_report(str(tmp_path), other.id, report_format='csv', **JULY)
+    assert mine.id != theirs.id
+    assert ra.artifact_path(str(tmp_path), theirs).startswith(os.path.join(str(tmp_path), f'user_{other.id}', ''))
+
+    # A personal ledger write leaves the business artifact current
+    category = Category.query.first()
+    db.session.add(Transaction(description='coffee', amount=3, type='expense', date=date(2026, 7, 2),
+                               user_id=business_ledger.id, category_id=category.id))
+    db.session.commit()
+    assert ra.request_report(str(tmp_path), business_ledger.id, report_format='csv', **JULY).id == mine.id
+
+
+@pytest.fixture
+def july_customers(db, business_ledger):
+    """The owner plus two more users with July business activity."""
+    users = [business_ledger]
+    for name in ('second', 'third'):
+        other = User(username=name, password='x')
+        db.session.add(other)
+        db.session.flush()
+        sales = Category(name='Sales', type='revenue', user_id=other.id)
+        db.session.add(sales)
+        db.session.flush()
+        db.session.add(BusinessTransaction(user_id=other.id, description='x', amount=100, type='revenue',
+                                           date=date(2026, 7, 3), category_id=sales.id))
+        users.append(other)
+    db.session.commit()
+    return users
+
+
+class Interrupted(Exception):
+    pass
+
+
+def statements(tmp_path, progress=None):
+    return ra.month_end_statements(str(tmp_path), 2026, 7, workers=1, ledgers=['business'], formats=('csv', 'json'),
+                                   progress=progress, commit_every=2)
+
+
+def test_interrupted_month_end_run_resumes_where_it_stopped(db, july_customers, tmp_path):
+    def stop_after_three(stats, elapsed):
+        if stats['rendered'] == 3:
+            raise Interrupted
+
+    with pytest.raises(Interrupted):
+        statements(tmp_path, stop_after_three)
+    db.session.rollback()  # The third render was never committed
+    assert ReportArtifact.query.filter_by(status='ready').count() == 2
+
+    reported = []
+    stats = statements(tmp_path, lambda stats, elapsed: reported.append(dict(stats)))
+    assert (stats['rendered'], stats['skipped'], stats['errors']) == (4, 2, 0)
+    assert [r['rendered'] for r in reported] == [1, 2, 3, 4]
+    artifacts = ReportArtifact.query.all()
+    assert len(artifacts) == 6 and {a.status for a in artifacts} == {'ready'}
+    assert {(a.user_id, a.format) for a in artifacts} == {(u.id, f) for u in july_customers for f in ('csv', 'json')}
+    assert all(os.path.exists(ra.artifact_path(str(tmp_path), a)) for a in artifacts)
+
+
+def test_month_end_run_replaces_statements_of_older_ledger_versions(db, july_customers, tmp_path):
+    statements(tmp_path)
+    owner = july_customers[0]
+    old = ReportArtifact.query.filter_by(user_id=owner.id).all()
+    old_paths = [ra.artifact_path(str(tmp_path), a) for a in old]
+    old_ids = {a.id for a in old}
+    db.session.add(BusinessTransaction(user_id=owner.id, description='x', amount=5, type='expense',
+                                       date=date(2026, 7, 20), category_id=Category.query.first().id))
+    db.session.commit()
+
+    stats = statements(tmp_path)
+    assert (stats['rendered'], stats['skipped']) == (2, 4)
+    db.session.expire_all()
+    current = ReportArtifact.query.filter_by(user_id=owner.id).all()
+    assert len(current) == 2 and not old_ids & {a.id for a in current}
+    assert not any(os.path.exists(path) for path in old_paths)
+    csv_artifact = next(a for a in current if a.format == 'csv')
+    assert 'Total Expenses,305' in open(ra.artifact_path(str(tmp_path), csv_artifact)).read()
@@ -0,0 +1,86 @@
+from datetime import date
+
+import pytest
+
+import scheme_valuation
+from models import FixedScheme
+from scheme_valuation import DAYS_PER_YEAR, interest_for_fy, load_scheme_rows, scheme_rows, value_schemes
+
+# (id, principal, rate %, tenure months, start, penalty %)
+DEPOSIT = (1, 100000.0, 8.0, 12, date(2024, 1, 1), 1.0)
+BOND = (2, 50000.0, 7.0, 36, date(2023, 4, 1), 2.0)
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    scheme_valuation._valuation.cache_clear()
+    scheme_valuation._fy_interest.cache_clear()
+
+
+def test_values_before_start_during_and_after_maturity():
+    rows = (DEPOSIT,)
+    assert value_schemes(rows, date(2023, 12, 1))['current_value'] == (100000.0,)
+
+    midway = value_schemes(rows, date(2024, 7, 1))
+    years = 182 / DAYS_PER_YEAR
+    assert midway['current_value'][0] == pytest.approx(100000 * 1.08 ** years)
+    assert midway['early_withdrawal_value'][0] == pytest.approx(100000 * 1.07 ** years)  # Rate less the penalty
+    assert midway['maturity_amount'] == pytest.approx((108000,))
+    assert midway['maturity_date'] == (date(2025, 1, 1),)
+    assert midway['matured'] == (False,)
+
+    # Growth stops at maturity and there is no penalty any more
+    matured = value_schemes(rows, date(2026, 6, 1))
+    assert matured['matured'] == (True,)
+    assert matured['current_value'] == matured['early_withdrawal_value'] == pytest.approx((108000,))
+
+
+def test_penalty_never_makes_the_rate_negative():
+    rows = ((3, 1000.0, 1.0, 24, date(2024, 1, 1), 5.0),)
+    assert value_schemes(rows, date(2025, 1, 1))['early_withdrawal_value'] == (1000.0,)
+
+
+def test_totals_and_alignment_with_the_rows():
+    result = value_schemes((BOND, DEPOSIT), date(2024, 7, 1))
+    assert result['ids'] == (2, 1)
+    assert result['total_current_value'] == pytest.approx(sum(result['current_value']))
+    assert result['maturity_date'] == (date(2026, 4, 1), date(2025, 1, 1))
+    assert value_schemes((), date(2024, 7, 1))['total_current_value'] == 0.0
+
+
+def test_valuations_are_memoized_per_rows_and_day():
+    rows = (DEPOSIT, BOND)
+    first = value_schemes(rows, date(2024, 7, 1))
+    assert value_schemes(tuple(rows), date(2024, 7, 1)) is first
+    value_schemes(rows, date(2024, 7, 2))
+    info = scheme_valuation._valuation.cache_info()
+    assert (info.hits, info.misses) == (1, 2)
+
+    # Edited terms are different rows, so a stale valuation is never served
+    edited = ((1, 100000.0, 9.0, 12, date(2024, 1, 1), 1.0), BOND)
+    assert value_schemes(edited, date(2024, 7, 1))['current_value'][0] > first['current_value'][0]
+
+
+def test_interest_accrues_in_the_financial_years_the_scheme_spans():
+    rows = (DEPOSIT,)
+    before_april = interest_for_fy(rows, 2023)[0]
+    assert before_april == pytest.approx(100000 * (1.08 ** (91 / DAYS_PER_YEAR) - 1))
+    assert before_april + interest_for_fy(rows, 2024)[0] == pytest.approx(8000)
+    assert interest_for_fy(rows, 2025) == (0.0,)
+    assert interest_for_fy(rows, 2022) == (0.0,)
+    assert interest_for_fy((), 2024) == ()
+
+    interest_for_fy(rows, 2024)
+    assert scheme_valuation._fy_interest.cache_info().hits == 1
+
+
+def test_rows_from_the_database_match_loaded_objects(db, user):
+    schemes = [FixedScheme(scheme_name=name, principal_amount=principal, interest_rate=rate, tenure_months=tenure,
+                           start_date=start, penalty_rate=penalty, user_id=user.id)
+               for name, (_, principal, rate, tenure, start, penalty) in (('FD', DEPOSIT), ('Bond', BOND))]
+    db.session.add_all(schemes)
+    db.session.commit()
+    rows = load_scheme_rows(user.id)
+    assert rows == scheme_rows(schemes)
+    assert hash(rows) == hash(scheme_rows(schemes))  # Usable as a cache key
+    assert load_scheme_rows(user.id + 1) == ()
@@ -0,0 +1,124 @@
+from datetime import date, timedelta
+
+import pytest
+
+from amortization import balance_at
+from market_data import USD_INR_SYMBOL, MarketDataProvider
+from models import Category, FixedScheme, Investment, Loan, NetWorthSnapshot, Transaction, User
+from scheme_valuation import load_scheme_rows, value_schemes
+from snapshots import compute_net_worth, latest_snapshot, save_snapshot, snapshot_all_users, snapshot_history
+
+START = date(2023, 1, 1)
+
+
+class FixedQuotes(MarketDataProvider):
+    """Fixed prices that remembers which symbols each call asked for."""
+
+    def __init__(self, prices):
+        self.prices = prices
+        self.calls = []
+
+    def get_quotes(self, symbols):
+        self.calls.append(set(symbols))
+        return {symbol: self.prices[symbol] for symbol in symbols if symbol in self.prices}
+
+
+PRICES = {('Stock', 'AAA'): 100.0, ('Stock', 'BBB'): 20.0, ('Crypto', 'bitcoin'): 2.0, USD_INR_SYMBOL: 80.0}
+
+
+def add_user(db, username, holdings=(), income=0.0, expense=0.0, loan=None, scheme=None):
+    user = User(username=username, password='x')
+    db.session.add(user)
+    db.session.flush()
+    for kind, amount in (('income', income), ('expense', expense)):
+        if amount:
+            category = Category(name=kind.title(), type=kind, user_id=user.id)
+            db.session.add(category)
+            db.session.flush()
+            db.session.add(Transaction(description=kind, amount=amount, type=kind, date=START,
+                                       user_id=user.id, category_id=category.id))
+    for asset_type, ticker, quantity in holdings:
+        db.session.add(Investment(asset_type=asset_type, ticker_symbol=ticker, quantity=quantity,
+                                  purchase_price=1.0, purchase_date=START, user_id=user.id))
+    if loan:
+        db.session.add(Loan(loan_name='Home', principal=loan, interest_rate=9.0, tenure_months=240,
+                            emi_amount=0.0, start_date=START, user_id=user.id))
+    if scheme:
+        db.session.add(FixedScheme(scheme_name='FD', principal_amount=scheme, interest_rate=7.0,
+                                   tenure_months=60, start_date=START, user_id=user.id))
+    db.session.commit()
+    return user.id
+
+
+def test_net_worth_adds_up_every_asset_and_liability(db):
+    user_id = add_user(db, 'saver', holdings=[('Stock', 'AAA', 3), ('Crypto', 'bitcoin', 0.5)],
+                       income=5000.0, expense=1200.0, loan=100000.0, scheme=10000.0)
+    breakdown = compute_net_worth(user_id, FixedQuotes(PRICES))
+
+    schemes = value_schemes(load_scheme_rows(user_id))['total_current_value']
+    liabilities = float(balance_at([100000.0], [9.0], [240], [START])[0])
+    assert breakdown['cash'] == 3800.0
+    assert breakdown['schemes'] == pytest.approx(schemes)
+    assert breakdown['investments'] == pytest.approx(3 * 100.0 + 0.5 * 2.0 * 80.0)
+    assert breakdown['liabilities'] == pytest.approx(liabilities)
+    assert breakdown['assets'] == pytest.approx(3800.0 + schemes + 380.0)
+    assert breakdown['net_worth'] == pytest.approx(breakdown['assets'] - liabilities)
+    assert breakdown['loans'] == [{'loan_name': 'Home', 'outstanding': pytest.approx(liabilities)}]
+
+
+def test_net_worth_reuses_quotes_passed_in(db):
+    user_id = add_user(db, 'trader', holdings=[('Stock', 'AAA', 2)])
+    provider = FixedQuotes(PRICES)
+    breakdown = compute_net_worth(user_id, provider, quotes={('Stock', 'AAA'): 50.0})
+    assert provider.calls == []
+    assert breakdown['investments'] == 100.0
+
+
+def test_empty_user_is_worth_nothing(db):
+    user_id = add_user(db, 'empty')
+    breakdown = compute_net_worth(user_id, FixedQuotes(PRICES))
+    assert breakdown['assets'] == breakdown['liabilities'] == breakdown['net_worth'] == 0
+    assert breakdown['loans'] == []
+
+
+def test_saving_twice_a_day_replaces_the_snapshot(db):
+    user_id = add_user(db, 'saver', income=100.0)
+    save_snapshot(user_id, compute_net_worth(user_id, FixedQuotes(PRICES)), START)
+    db.session.commit()
+    income = Transaction.query.filter_by(user_id=user_id).one()
+    income.amount = 250.0
+    save_snapshot(user_id, compute_net_worth(user_id, FixedQuotes(PRICES)), START)
+    db.session.commit()
+
+    rows = NetWorthSnapshot.query.filter_by(user_id=user_id).all()
+    assert len(rows) == 1
+    assert rows[0].cash == rows[0].net_worth == 250.0
+
+
+def test_nightly_job_prices_all_users_in_one_call(db):
+    first = add_user(db, 'first', holdings=[('Stock', 'AAA', 1), ('Stock', 'BBB', 1)])
+    second = add_user(db, 'second', holdings=[('Stock', 'BBB', 2), ('Crypto', 'bitcoin', 1)])
+    provider = FixedQuotes(PRICES)
+    progress = []
+
+    assert snapshot_all_users(provider, START, progress=lambda done, total: progress.append((done, total))) == 2
+    assert provider.calls == [set(PRICES)]
+    assert progress == [(1, 2), (2, 2)]
+    assert latest_snapshot(first).investments == 120.0
+    assert latest_snapshot(second).investments == 40.0 + 160.0
+
+
+def test_latest_snapshot_and_history_window(db):
+    user_id = add_user(db, 'saver')
+    today = date.today()
+    for days_ago, worth in ((400, 1.0), (30, 2.0), (0, 3.0), (10, 4.0)):
+        save_snapshot(user_id, {'cash': worth, 'schemes': 0.0, 'investments': 0.0, 'liabilities': 0.0,
+                                'net_worth': worth}, today - timedelta(days=days_ago))
+    db.session.commit()
+
+    assert latest_snapshot(user_id).net_worth == 3.0
+    history = snapshot_history(user_id)
+    assert history['dates'] == [(today - timedelta(days=d)).strftime('%Y-%m-%d') for d in (30, 10, 0)]
+    assert history['net_worth'] == [2.0, 4.0, 3.0]
+    assert snapshot_history(user_id, days=15)['net_worth'] == [4.0, 3.0]
+    assert latest_snapshot(add_user(db, 'new')) is None
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from gains_ledger import current_financial_year
+from tax_engine import (TAX_TABLES, break_even_deductions, calculate_new_regime_tax, calculate_old_regime_tax,
+                        capital_gains_tax, compare_regimes, regime_tax, table_year, tax_table, valid_fy)
+
+FY = 2023
+
+
+def test_new_regime_slabs():
+    # Taxable 11.5L: 5% of 3L + 10% of 3L + 15% of 2.5L, plus 4% cess
+    assert calculate_new_regime_tax(1200000, FY)['total_tax'] == pytest.approx(85800)
+
+
+def test_old_regime_slabs_and_deductions():
+    # Taxable 9L: 5% of 2.5L + 20% of 4L, plus cess
+    details = calculate_old_regime_tax(1200000, 250000, 30, FY)
+    assert details['taxable_income'] == 900000
+    assert details['total_tax'] == pytest.approx(96200)
+
+
+def test_old_regime_rebate():
+    assert regime_tax('old', 550000, fy=FY)['total_tax'] == 0
+    assert regime_tax('old', 560000, fy=FY)['total_tax'] > 0
+
+
+@pytest.mark.parametrize('age,expected', [(30, 65000), (65, 62400), (85, 52000)])
+def test_old_regime_age_bands(age, expected):
+    assert regime_tax('old', 800000, age=age, fy=FY)['total_tax'] == pytest.approx(expected)
+
+
+def test_age_bands_are_applied_per_scenario():
+    taxes = regime_tax('old', 800000, age=[30, 65, 85], fy=FY)['total_tax']
+    np.testing.assert_allclose(taxes, [65000, 62400, 52000])
+
+
+def test_capital_gains():
+    result = capital_gains_tax(stcg=100000, ltcg=150000, crypto=10000, fy=FY)
+    assert (result['stcg_tax'], result['ltcg_tax'], result['crypto_tax']) == pytest.approx((15000, 5000, 3000))
+    assert capital_gains_tax(ltcg=80000, fy=FY)['ltcg_tax'] == 0
+
+
+def test_compare_regimes_broadcasts_scenarios():
+    result = compare_regimes([1200000, 1200000], deductions=[0, 600000], ltcg=150000, fy=FY)
+    assert result['better_regime'].tolist() == ['new', 'old']
+    np.testing.assert_allclose(result['capital_gains_tax'], [5000, 5000])
+    np.testing.assert_allclose(result['saving'], np.abs(result['new_regime_tax'] - result['old_regime_tax']))
+
+
+def test_break_even_matches_a_dense_search():
+    incomes = np.array([0, 400000, 750000, 1000000, 1234567, 2500000, 8000000])
+    step = 1000
+    expected = []
+    for income in incomes:
+        grid = np.arange(0, income + step, step)
+        old = regime_tax('old', income, grid, age=30, fy=FY)['total_tax']
+        new = regime_tax('new', income, age=30, fy=FY)['total_tax']
+        expected.append(grid[np.argmax(old <= new)])
+    np.testing.assert_array_equal(break_even_deductions(incomes, 30, FY, step), expected)
+
+
+def test_break_even_does_not_grow_with_income():
+    # Bisection keeps memory per income constant; a dense grid at this income would need gigabytes
+    assert np.isfinite(break_even_deductions(10 ** 9, fy=FY)).all()
+
+
+@pytest.mark.parametrize('fy,gross_income,expected', [
+    (2023, 750000, 0),  # Taxable 7L, within the new regime's rebate
+    (2024, 750000, 0),
+    (2024, 1200000, 71500),  # Taxable 11.25L: 5% of 4L + 10% of 3L + 15% of 1.25L, plus cess
+    (2025, 1200000, 0),  # Rebate up to a taxable 12L
+    (2025, 1600000, 113100),  # Taxable 15.25L: 5% of 4L + 10% of 4L + 15% of 3.25L, plus cess
+])
+def test_new_regime_per_financial_year(fy, gross_income, expected):
+    assert calculate_new_regime_tax(gross_income, fy)['total_tax'] == pytest.approx(expected)
+
+
+def test_old_regime_is_unchanged_across_years():
+    for fy in TAX_TABLES:
+        assert calculate_old_regime_tax(1200000, 250000, 30, fy)['total_tax'] == pytest.approx(96200)
+
+
+def test_capital_gains_rates_changed_in_2024():
+    result = capital_gains_tax(stcg=100000, ltcg=150000, crypto=10000, fy=2024)
+    assert (result['stcg_tax'], result['ltcg_tax'], result['crypto_tax']) == pytest.approx((20000, 3125, 3000))
+    assert capital_gains_tax(ltcg=125000, fy=2025)['ltcg_tax'] == 0
+
+
+def test_years_without_their_own_table_use_the_latest_earlier_one():
+    assert table_year(2024) == 2024
+    assert table_year(max(TAX_TABLES) + 1) == max(TAX_TABLES)
+    assert tax_table(max(TAX_TABLES) + 1) is TAX_TABLES[max(TAX_TABLES)]
+
+
+def test_years_before_the_first_table_are_rejected():
+    with pytest.raises(ValueError):
+        tax_table(min(TAX_TABLES) - 1)
+    assert valid_fy(current_financial_year())
+    assert not valid_fy(min(TAX_TABLES) - 1)
+    assert not valid_fy(current_financial_year() + 2)
@@ -0,0 +1,59 @@
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+import pytest
+
+from market_data import USD_INR_SYMBOL
+from valuation import Holdings, fifo_sale, match_fifo, value_portfolio
+
+Lot = namedtuple('Lot', 'id asset_type ticker_symbol quantity purchase_price purchase_currency purchase_date')
+
+
+def test_match_fifo_consumes_oldest_lots_first():
+    np.testing.assert_allclose(match_fifo([5, 3, 4], 7), [5, 2, 0])
+    np.testing.assert_allclose(match_fifo([5, 3, 4], 5), [5, 0, 0])
+    np.testing.assert_allclose(match_fifo([5, 3, 4], 0), [0, 0, 0])
+
+
+def test_match_fifo_never_consumes_more_than_held():
+    np.testing.assert_allclose(match_fifo([1.5, 2.5], 10), [1.5, 2.5])
+
+
+def test_fifo_sale_gains_and_holding_period():
+    consumed, gain, gain_type = fifo_sale(
+        purchase_prices=[100, 150, 200], purchase_dates=[date(2022, 1, 1), date(2023, 6, 1), date(2024, 1, 1)],
+        lot_quantities=[10, 10, 10], asset_type='Stock', sell_quantity=15, sell_price=180, sell_date=date(2024, 3, 1))
+    np.testing.assert_allclose(consumed, [10, 5, 0])
+    np.testing.assert_allclose(gain, [800, 150, 0])
+    assert gain_type.tolist() == ['LTCG', 'STCG', 'STCG']
+
+
+def test_fifo_sale_boundary_is_more_than_365_days():
+    _, _, gain_type = fifo_sale([10, 10], [date(2023, 3, 1), date(2023, 2, 28)], [1, 1], 'Stock', 2, 20,
+                                date(2024, 2, 29))
+    # 365 days held is still short term; 366 is long term
+    assert gain_type.tolist() == ['STCG', 'LTCG']
+
+
+def test_fifo_sale_crypto_is_always_short_term():
+    _, gain, gain_type = fifo_sale([100], [date(2015, 1, 1)], [2], 'Crypto', 1, 50, date(2024, 1, 1))
+    np.testing.assert_allclose(gain, [-50])
+    assert gain_type.tolist() == ['STCG']
+
+
+def test_value_portfolio_converts_crypto_and_leaves_unquoted_lots_at_zero():
+    holdings = Holdings([
+        Lot(1, 'Stock', 'abc', 2, 10, 'INR', date(2024, 1, 1)),
+        Lot(2, 'Stock', 'abc', 3, 12, 'INR', date(2024, 2, 1)),
+        Lot(3, 'Crypto', 'btc', 0.5, 80, 'USD', date(2024, 1, 1)),
+        Lot(4, 'Stock', 'xyz', 1, 50, 'INR', date(2024, 1, 1)),
+    ])
+    valuation = value_portfolio(holdings, {('Stock', 'abc'): 11.0, ('Crypto', 'btc'): 100.0, USD_INR_SYMBOL: 80.0})
+
+    np.testing.assert_allclose(valuation.value_inr, [22, 33, 4000, 0])
+    np.testing.assert_allclose(valuation.profit_loss_display, [2, -3, 10, 0])
+    np.testing.assert_allclose(valuation.ticker_quantity, [5, 5, 0.5, 1])
+    assert valuation.total_value_inr == pytest.approx(4055)
+    assert [row['priced'] for row in valuation.rows()] == [True, True, True, False]
+    assert [row['investment']['id'] for row in valuation.rows(valuation.symbol_mask({('Stock', 'abc')}))] == [1, 2]
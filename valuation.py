@@ -0,0 +1,129 @@
+# valuation.py
+
+import numpy as np
+
+from models import db, Investment
+from market_data import USD_INR_SYMBOL, DEFAULT_USD_TO_INR_RATE
+
+
+class Holdings:
+    """
+    A user's investments as parallel NumPy arrays (one element per lot).
+    Plain data only, so it can be used after the request/session is gone.
+    """
+
+    def __init__(self, rows):
+        self.ids = np.array([r.id for r in rows], dtype=np.int64)
+        self.asset_types = np.array([r.asset_type for r in rows], dtype=object)
+        self.tickers = np.array([r.ticker_symbol for r in rows], dtype=object)
+        self.quantity = np.array([r.quantity for r in rows], dtype=np.float64)
+        self.purchase_price = np.array([r.purchase_price for r in rows], dtype=np.float64)
+        self.purchase_currency = np.array([r.purchase_currency for r in rows], dtype=object)
+        self.purchase_dates = np.array([r.purchase_date for r in rows], dtype='datetime64[D]')
+        # Lots of the same ticker share one symbol; quotes are looked up per unique symbol
+        self.symbols = sorted({(r.asset_type, r.ticker_symbol) for r in rows})
+        index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.symbol_index = np.array([index[(r.asset_type, r.ticker_symbol)] for r in rows], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def load_holdings(user_id):
+    rows = db.session.query(
+        Investment.id, Investment.asset_type, Investment.ticker_symbol, Investment.quantity,
+        Investment.purchase_price, Investment.purchase_currency, Investment.purchase_date
+    ).filter(Investment.user_id == user_id).order_by(Investment.purchase_date, Investment.id).all()
+    return Holdings(rows)
+
+
+class PortfolioValuation:
+    """
+    Value, cost basis, P/L and allocation for every lot, computed in one pass.
+
+    Stocks are priced in INR and crypto in USD. `*_display` arrays are in the
+    asset's own quote currency (what the portfolio table shows), `*_inr` arrays
+    are converted at the USD/INR rate. Lots without a quote value at zero.
+    """
+
+    def __init__(self, holdings, quotes):
+        self.holdings = holdings
+        self.exchange_rate = quotes.get(USD_INR_SYMBOL, DEFAULT_USD_TO_INR_RATE)
+        symbol_prices = np.array([quotes.get(s, np.nan) for s in holdings.symbols], dtype=np.float64)
+        price = symbol_prices[holdings.symbol_index] if len(holdings) else np.zeros(0)
+
+        is_crypto = holdings.asset_types == 'Crypto'
+        priced = ~np.isnan(price) & (is_crypto | (holdings.asset_types == 'Stock'))
+        rate = self.exchange_rate
+        qty = holdings.quantity
+
+        self.priced = priced
+        self.price_display = np.where(priced, price, 0.0)
+        value_native = qty * self.price_display
+        cost_native = holdings.purchase_price * qty
+        # Crypto bought in INR is compared against its USD value
+        cost_native = np.where(is_crypto & (holdings.purchase_currency == 'INR'), cost_native / rate, cost_native)
+
+        self.value_inr = np.where(is_crypto, value_native * rate, value_native)
+        self.cost_inr = np.where(is_crypto, cost_native * rate, cost_native)
+        self.profit_loss_display = np.where(priced, value_native - cost_native, 0.0)
+        self.profit_loss_inr = np.where(priced, self.value_inr - self.cost_inr, 0.0)
+
+        self.total_value_inr = float(self.value_inr.sum())
+        self.total_cost_inr = float(self.cost_inr.sum())
+        self.allocation = self.value_inr / self.total_value_inr if self.total_value_inr > 0 else np.zeros(len(holdings))
+        # Total quantity held per ticker across all its lots, broadcast back to each lot
+        self.ticker_quantity = np.bincount(holdings.symbol_index, weights=qty, minlength=len(holdings.symbols))[holdings.symbol_index] if len(holdings) else np.zeros(0)
+
+    def rows(self, mask=None):
+        """Rows in the shape /refresh_prices has always returned, optionally limited by a boolean mask."""
+        h = self.holdings
+        indexes = np.flatnonzero(mask) if mask is not None else range(len(h))
+        return [{
+            'investment': {
+                'id': int(h.ids[i]), 'ticker_symbol': h.tickers[i].upper(), 'asset_type': h.asset_types[i],
+                'quantity': float(h.quantity[i]), 'purchase_price': float(h.purchase_price[i]),
+                'purchase_currency': h.purchase_currency[i]},
+            'current_price_display': float(self.price_display[i]),
+            'priced': bool(self.priced[i]),
+            'total_value_inr': float(self.value_inr[i]),
+            'profit_loss_display': float(self.profit_loss_display[i]),
+            'allocation': float(self.allocation[i]),
+            'ticker_quantity': float(self.ticker_quantity[i]),
+        } for i in indexes]
+
+    def symbol_mask(self, symbols):
+        """Boolean mask of the lots whose symbol is in `symbols`."""
+        wanted = np.array([s in symbols for s in self.holdings.symbols], dtype=bool)
+        return wanted[self.holdings.symbol_index] if len(self.holdings) else np.zeros(0, dtype=bool)
+
+
+def value_portfolio(holdings, quotes):
+    return PortfolioValuation(holdings, quotes)
+
+
+# --- FIFO lot matching ---
+
+def match_fifo(lot_quantities, sell_quantity):
+    """
+    Splits `sell_quantity` across lots (already ordered oldest first).
+    Returns the quantity consumed from each lot.
+    """
+    lot_quantities = np.asarray(lot_quantities, dtype=np.float64)
+    held_before = np.cumsum(lot_quantities) - lot_quantities
+    return np.clip(sell_quantity - held_before, 0.0, lot_quantities)
+
+
+def fifo_sale(purchase_prices, purchase_dates, lot_quantities, asset_type, sell_quantity, sell_price, sell_date):
+    """
+    Matches a sale against lots oldest first and works out the gain on each one.
+    Returns (consumed, capital_gain, gain_type) arrays, one element per lot.
+    Stock held for more than 365 days is LTCG, everything else STCG.
+    """
+    consumed = match_fifo(lot_quantities, sell_quantity)
+    purchase_prices = np.asarray(purchase_prices, dtype=np.float64)
+    holding_days = (np.datetime64(sell_date, 'D') - np.asarray(purchase_dates, dtype='datetime64[D]')).astype(np.int64)
+    capital_gain = (sell_price - purchase_prices) * consumed
+    is_long_term = (asset_type == 'Stock') & (holding_days > 365)
+    gain_type = np.where(is_long_term, 'LTCG', 'STCG')
+    return consumed, capital_gain, gain_type